@@ -0,0 +1,51 @@
+"""Compares the single-pass cleaning engine with the historical chain of Series.apply passes.
+
+Usage:
+    python benchmarks/bench_cleaning.py [n_rows] [n_jobs]
+"""
+import re
+import sys
+import time
+
+import ideo_topic_modeler.utils as ut
+from ideo_topic_modeler.cleaning import clean_series
+
+from synthetic import make_reddit_frame
+
+
+def legacy_clean(series):
+    """The cleaning rules as they were applied before the cleaning engine, one pass per rule."""
+    s = series.apply(lambda x: ut.decode_ascii(x))
+    s = s.apply(lambda x: re.sub(r"http\S+", "", x, flags=re.I))
+    s = s.apply(lambda x: re.sub(r"www.\S+", "", x, flags=re.I))
+    s = s.apply(lambda x: re.sub("&amp", "", x, flags=re.IGNORECASE))
+    s = s.apply(lambda x: re.sub(r"[\|\.:;@$%_\[\]()+*#\"\/]", ' ', x, flags=re.I))
+    s = s.apply(lambda x: re.sub("(?<=[a-z])[’'](?=[a-z])", "", x, flags=re.IGNORECASE))
+    s = s.apply(lambda x: re.sub(r"\s+", ' ', x, flags=re.IGNORECASE))
+    s = s.apply(lambda x: x.strip())
+    return s.apply(lambda x: x.lower())
+
+
+def _timeit(f, *args, **kwargs):
+    start = time.perf_counter()
+    result = f(*args, **kwargs)
+    return result, time.perf_counter() - start
+
+
+if __name__ == "__main__":
+
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100_000
+    n_jobs = int(sys.argv[2]) if len(sys.argv) > 2 else -1
+
+    data = make_reddit_frame(n_rows).dropna(subset=['body'])
+    texts = data['title'] + '.' + data['body']
+
+    expected, t_legacy = _timeit(legacy_clean, texts)
+    serial, t_serial = _timeit(clean_series, texts)
+    parallel, t_parallel = _timeit(clean_series, texts, n_jobs=n_jobs, chunksize=max(1, len(texts) // 16))
+
+    assert serial.tolist() == expected.tolist(), "serial cleaning output differs from legacy output"
+    assert parallel.tolist() == expected.tolist(), "parallel cleaning output differs from legacy output"
+
+    for name, t in [('legacy apply chain', t_legacy), ('single pass', t_serial), (f'single pass, n_jobs={n_jobs}', t_parallel)]:
+        print(f"{name:<28} {t:8.2f}s {len(texts) / t:12,.0f} rows/sec  x{t_legacy / t:.1f}")
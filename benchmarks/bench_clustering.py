@@ -0,0 +1,79 @@
+"""Compares topic fits on a sample of a large corpus, with the other documents assigned batch by batch, to a full fit.
+
+For each configuration, reports the time and peak memory (RSS) of the fit and the agreement of the topics with
+the full fit and with the synthetic groups (adjusted Rand index, 1 is identical), plus the share of the sample
+assigned to its fitted topic, the estimate of the accuracy a large-corpus fit reports when no full fit is possible.
+
+Corpora are synthetic: embeddings grouped around a few directions, and documents made of words of their group.
+Needs bertopic; the 'hdbscan' clustering also needs umap-learn and hdbscan.
+
+Usage:
+    python benchmarks/bench_clustering.py [--rows 50000] [--sample-size 10000] [--clustering minibatch,hdbscan]
+"""
+import argparse
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+from sklearn.metrics import adjusted_rand_score
+
+from ideo_topic_modeler.topics import TopicModel
+from ideo_topic_modeler.clustering import make_topic_model, ASSIGNMENTS
+from ideo_topic_modeler.instrumentation import PeakMemory
+
+from synthetic import make_embeddings
+
+
+N_TOPICS = 20
+
+
+def make_corpus(n_rows, dim=128, seed=0):
+    """Synthetic embeddings and documents of N_TOPICS groups, with the group of each document."""
+    embeddings, groups = make_embeddings(n_rows, dim=dim, n_topics=N_TOPICS, spread=0.8, seed=seed)
+    rng = np.random.default_rng(seed)
+    vocabulary = [[f"topic{group}word{i}" for i in range(40)] for group in range(N_TOPICS)]
+    documents = [" ".join(rng.choice(vocabulary[group], 10)) + " some shared words" for group in groups]
+    return embeddings, documents, groups
+
+
+def fit(embeddings, documents, clustering, sample_size=None, assignment='centroid'):
+    """Fits the topics of a bare TopicModel, returning the topic of each document, the seconds, the peak memory and the report."""
+    with tempfile.TemporaryDirectory() as model_directory:
+        model = TopicModel(pd.DataFrame(), 'body', 'reddit', model_directory)
+        model.text_column, model.modeling_column = 'body', 'body_clean'
+        model.data = pd.DataFrame({'body': documents, 'body_clean': documents, 'keyword': 'synthetic',
+                                   'subreddit': 'synthetic', 'created_utc': '2024-01-01'})
+        model.embeddings = embeddings
+        model.topic_model = make_topic_model(clustering, n_clusters=N_TOPICS)
+
+        with PeakMemory() as memory:
+            start = time.perf_counter()
+            model.enrich_data_and_save_them('bench', sample_size=sample_size, assignment=assignment)
+            seconds = time.perf_counter() - start
+        return model.data['topic'].to_numpy(), seconds, memory.added_bytes / 1024**2, model.fit_report
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--rows', type=int, default=50_000, help="number of documents")
+    parser.add_argument('--sample-size', type=int, default=10_000, help="number of documents of the sample fits")
+    parser.add_argument('--clustering', default='minibatch,hdbscan', help="comma separated clusterings to compare")
+    args = parser.parse_args()
+
+    embeddings, documents, groups = make_corpus(args.rows)
+    print(f"{args.rows:,} documents, {N_TOPICS} synthetic topics, samples of {args.sample_size:,}\n")
+    print(f"{'clustering':<10} {'fit':<17} {'seconds':>8} {'added MB':>9} {'ARI full':>9} {'ARI groups':>11} "
+          f"{'sample agreement':>17} {'outliers':>9}")
+
+    for clustering in args.clustering.split(','):
+        full_topics, seconds, added_mb, _ = fit(embeddings, documents, clustering)
+        print(f"{clustering:<10} {'full':<17} {seconds:8.1f} {added_mb:9.0f} {1:9.3f} "
+              f"{adjusted_rand_score(groups, full_topics):11.3f} {'':>17} {(full_topics == -1).mean():9.1%}")
+
+        for assignment in ASSIGNMENTS:
+            topics, seconds, added_mb, report = fit(embeddings, documents, clustering, args.sample_size, assignment)
+            print(f"{clustering:<10} {'sample+' + assignment:<17} {seconds:8.1f} {added_mb:9.0f} "
+                  f"{adjusted_rand_score(full_topics, topics):9.3f} {adjusted_rand_score(groups, topics):11.3f} "
+                  f"{report['sample_agreement']:17.1%} {report['outlier_rate']:9.1%}")
@@ -0,0 +1,52 @@
+"""Guards the import time of the package: `import ideo_topic_modeler` must not pull in
+the heavy topic modeling and plotting dependencies, and must stay under a time budget.
+
+Usage:
+    python benchmarks/bench_import.py [budget_seconds]
+
+Exits with a non-zero status if the import regressed.
+"""
+import subprocess
+import sys
+
+
+HEAVY_MODULES = ['bertopic', 'umap', 'sentence_transformers', 'torch', 'altair', 'plotly',
+                 'matplotlib', 'streamlit_plotly_events', 'hdbscan', 'sklearn']
+
+N_RUNS = 5
+
+PROBE = f"""
+import sys, time
+start = time.perf_counter()
+import ideo_topic_modeler
+elapsed = time.perf_counter() - start
+loaded = [m for m in {HEAVY_MODULES!r} if m in sys.modules]
+print(elapsed, ','.join(loaded))
+"""
+
+
+def measure_import():
+    """Imports the package in a fresh interpreter.
+
+    Returns:
+        tuple: import time in seconds, list of heavy modules that got imported
+    """
+    out = subprocess.run([sys.executable, '-c', PROBE], capture_output=True, text=True, check=True).stdout
+    elapsed, loaded = out.strip().split(' ', 1) if ' ' in out.strip() else (out.strip(), '')
+    return float(elapsed), [m for m in loaded.split(',') if m]
+
+
+if __name__ == "__main__":
+
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else 1.0
+
+    runs = [measure_import() for _ in range(N_RUNS)]
+    best = min(t for t, _ in runs)
+    loaded = sorted(set(m for _, modules in runs for m in modules))
+
+    print(f"import ideo_topic_modeler: best of {N_RUNS} = {best:.3f}s (budget {budget:.3f}s)")
+    if loaded:
+        print(f"heavy modules imported eagerly: {', '.join(loaded)}")
+
+    if loaded or best > budget:
+        sys.exit(1)
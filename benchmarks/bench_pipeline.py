@@ -0,0 +1,268 @@
+"""End-to-end benchmark of the topic modeling pipeline on synthetic Reddit-shaped corpora.
+
+Every stage is timed separately, with its throughput and the peak memory (RSS) it added:
+transform_data, clean_data, return_sentences_around_keyword, NgramModel.run, embedding, fit_transform,
+_compute_clusters, save and load. Stages needing a package that is not installed (bertopic, umap-learn) are skipped.
+The streaming constructors are also timed end to end on a json lines file: from_jsonl followed by run,
+and from_jsonl_pipelined, which overlaps reading, cleaning, embedding and writing.
+
+Embeddings are computed by a tiny offline hashing model by default, so the benchmark needs no download
+and measures the pipeline around the embedding model. Pass --embedding-model to time a sentence-transformers model.
+
+Results can be stored as a baseline, and later runs compared to it: a stage slower than its baseline
+by more than the tolerance is reported as a regression, with a non-zero exit status.
+
+Usage:
+    python benchmarks/bench_pipeline.py --sizes 10k,100k [--save-baseline NAME | --baseline NAME] [--tolerance 0.25]
+"""
+import argparse
+import json
+import os
+import platform
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ideo_topic_modeler.model import Model
+from ideo_topic_modeler.ngrams import NgramModel
+from ideo_topic_modeler.topics import TopicModel
+from ideo_topic_modeler.embeddings import EmbeddingEngine, save_embeddings, load_embeddings
+from ideo_topic_modeler.instrumentation import PeakMemory
+
+from synthetic import make_reddit_frame
+
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+BASELINES_DIR = BENCHMARKS_DIR / "baselines"
+CACHE_DIR = BENCHMARKS_DIR / ".cache"
+
+SIZES = {'10k': 10_000, '100k': 100_000, '1m': 1_000_000}
+STOPWORDS = ["the", "a", "and", "of", "to", "in", "is", "it", "that", "for", "on", "with"]
+DEFAULT_TOLERANCE = 0.25
+#slowdowns smaller than this are timing noise, whatever the tolerance
+MIN_SLOWDOWN_SECONDS = 0.5
+
+
+class HashingEmbedder:
+    '''
+    A tiny offline embedding model: hashed word counts projected to a few dense dimensions.
+    Same encode interface as EmbeddingEngine, so it can replace the engine of a TopicModel.
+    '''
+    name = 'hashing'
+
+    def __init__(self, dim=64, n_features=2**14, batch_size=1024, seed=0):
+        from sklearn.feature_extraction.text import HashingVectorizer
+
+        self.batch_size = batch_size
+        self.n_jobs = 1
+        self._vectorizer = HashingVectorizer(n_features=n_features, alternate_sign=False, norm='l2')
+        self._projection = np.random.default_rng(seed).standard_normal((n_features, dim)).astype(np.float32)
+
+    def encode(self, corpus, batch_size=None, show_progress_bar=False):
+        embeddings = np.asarray(self._vectorizer.transform(corpus) @ self._projection, dtype=np.float32)
+        return embeddings / np.maximum(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12)
+
+    def close(self):
+        pass
+
+
+class HashingTopicModel(TopicModel):
+    '''
+    TopicModel embedding with a HashingEmbedder, for the constructors that build the model themselves.
+    '''
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.embedding_engine = HashingEmbedder()
+        self.pre_trained_model = self.embedding_engine.name
+
+
+def run_stage(results, name, rows, f, *args, **kwargs):
+    """Runs a stage, recording its wall time, throughput and peak memory in results."""
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        output = f(*args, **kwargs)
+        seconds = time.perf_counter() - start
+    results[name] = {'seconds': seconds, 'rows': rows, 'rows_per_sec': rows / seconds if seconds else None,
+                     'peak_rss_mb': memory.peak / 1024**2, 'added_rss_mb': memory.added_bytes / 1024**2}
+    print(f"  {name:<34} {seconds:9.2f}s {rows / max(seconds, 1e-9):14,.0f} rows/sec {memory.added_bytes / 1024**2:9.1f}MB")
+    return output
+
+
+def skip_stage(results, name, reason):
+    results[name] = {'skipped': reason}
+    print(f"  {name:<34} skipped ({reason})")
+
+
+def synthetic_frame(n_rows, seed=0):
+    """Returns the synthetic frame with n_rows, generated once and then cached as parquet."""
+    path = CACHE_DIR / f"reddit_{n_rows}_{seed}.parquet"
+    if path.exists():
+        return pd.read_parquet(path)
+    data = make_reddit_frame(n_rows, seed=seed)
+    CACHE_DIR.mkdir(exist_ok=True)
+    data.to_parquet(path, index=False)
+    return data
+
+
+def _installed(module):
+    try:
+        __import__(module)
+        return True
+    except ImportError:
+        return False
+
+
+def bench_size(n_rows, embedding_model, cluster_sample, pipeline_workers):
+    results = {}
+    data = synthetic_frame(n_rows)
+
+    #the constructors transform and clean the data, so the stages are run one by one on a bare model
+    model = Model(pd.DataFrame(), 'body', 'reddit')
+    model.text_column = 'body'
+    model.modeling_column = 'body_clean'
+    model.data = data.copy()
+
+    raw = data.dropna(subset=['body'])
+    run_stage(results, 'return_sentences_around_keyword', len(raw),
+              lambda: [Model.return_sentences_around_keyword(body, keyword) for body, keyword in zip(raw['body'], raw['keyword'])])
+    run_stage(results, 'transform_data', len(model.data), model.transform_data)
+    run_stage(results, 'clean_data', len(model.data), model.clean_data)
+    cleaned = model.data
+
+    ngrams = NgramModel(pd.DataFrame(), 'body', n=[1, 2], use_nltk_stopwords=False, custom_stopwords=STOPWORDS)
+    ngrams.text_column, ngrams.modeling_column, ngrams.data = 'body', 'body_clean', cleaned
+    run_stage(results, 'ngrams_run', len(cleaned), ngrams.run)
+
+    has_topic_model = _installed('bertopic')
+    if has_topic_model:
+        with tempfile.TemporaryDirectory() as model_directory:
+            raw_path = Path(model_directory) / "raw.json"
+            data.to_json(raw_path, orient='records', lines=True, date_format='iso')
+            model_class = HashingTopicModel if embedding_model == 'hashing' else TopicModel
+            options = {} if embedding_model == 'hashing' else {'embedding_model': embedding_model}
+
+            def sequential():
+                streamed = model_class.from_jsonl(raw_path, 'body', 'reddit', Path(model_directory) / "cleaned_sequential.json",
+                                                  model_directory=model_directory, **options)
+                streamed.run()
+
+            run_stage(results, 'from_jsonl_and_run', len(data), sequential)
+            run_stage(results, 'from_jsonl_pipelined', len(data), model_class.from_jsonl_pipelined, raw_path, 'body', 'reddit',
+                      Path(model_directory) / "cleaned_pipelined.json", model_directory, clean_workers=pipeline_workers, **options)
+    else:
+        skip_stage(results, 'from_jsonl_and_run', 'bertopic not installed')
+        skip_stage(results, 'from_jsonl_pipelined', 'bertopic not installed')
+
+    with tempfile.TemporaryDirectory() as model_directory:
+        topics = TopicModel(pd.DataFrame(), 'body', 'reddit', model_directory)
+        topics.text_column, topics.modeling_column, topics.data = 'body', 'body_clean', cleaned.copy()
+        if embedding_model == 'hashing':
+            topics.embedding_engine = HashingEmbedder()
+        else:
+            topics.embedding_engine = EmbeddingEngine(embedding_model)
+        topics.pre_trained_model = topics.embedding_engine.name
+
+        topics.embeddings = run_stage(results, 'embedding', len(cleaned), topics._embed, topics._iter_corpus())
+
+        if has_topic_model:
+            from bertopic import BERTopic
+
+            def fit_transform():
+                topics.topic_model = BERTopic()
+                assigned, probs = topics.topic_model.fit_transform(topics._get_corpus(), topics._float_embeddings())
+                topics._enrich(topics.data, assigned, probs, topics._refresh_topic_info())
+
+            run_stage(results, 'fit_transform', len(cleaned), fit_transform)
+        else:
+            skip_stage(results, 'fit_transform', 'bertopic not installed')
+
+        if _installed('umap'):
+            run_stage(results, '_compute_clusters', len(cleaned), topics._compute_clusters,
+                      sample_size=cluster_sample if cluster_sample < len(cleaned) else None)
+        else:
+            skip_stage(results, '_compute_clusters', 'umap-learn not installed')
+
+        #without a topic model, only the data and the embeddings are saved and loaded
+        if has_topic_model:
+            def save():
+                topics.save_model('bench')
+                topics.save_data('bench')
+
+            run_stage(results, 'save', len(cleaned), save)
+            run_stage(results, 'load', len(cleaned), topics.load_saved_model_and_data, 'bench')
+        else:
+            def save():
+                save_embeddings(topics.embeddings, model_directory, 'bench', topics.pre_trained_model)
+                topics.storage.write(topics.data, Path(model_directory)/ f"data_bench.{topics.storage.extension}")
+
+            def load():
+                embeddings, _ = load_embeddings(model_directory, 'bench')
+                return topics.storage.read(Path(model_directory)/ f"data_bench.{topics.storage.extension}"), np.asarray(embeddings)
+
+            run_stage(results, 'save', len(cleaned), save)
+            run_stage(results, 'load', len(cleaned), load)
+
+    return results
+
+
+def compare(results, baseline, tolerance):
+    """Returns the stages slower than their baseline by more than tolerance, as (size, stage, seconds, baseline seconds)."""
+    regressions = []
+    for size, stages in results.items():
+        for stage, measure in stages.items():
+            reference = baseline.get('results', {}).get(size, {}).get(stage, {})
+            if 'seconds' not in measure or 'seconds' not in reference:
+                continue
+            slowdown = measure['seconds'] - reference['seconds']
+            if slowdown > reference['seconds'] * tolerance and slowdown > MIN_SLOWDOWN_SECONDS:
+                regressions.append((size, stage, measure['seconds'], reference['seconds']))
+    return regressions
+
+
+if __name__ == "__main__":
+
+    parser = argparse.ArgumentParser(description=__doc__.split('\n')[0])
+    parser.add_argument('--sizes', default='10k', help=f"comma separated corpus sizes, among {', '.join(SIZES)} or a number of rows")
+    parser.add_argument('--embedding-model', default='hashing', help="'hashing' (offline, default) or a sentence-transformers model")
+    parser.add_argument('--cluster-sample', type=int, default=10_000, help="UMAP sample size of _compute_clusters")
+    parser.add_argument('--pipeline-workers', type=int, default=2, help="cleaning processes of from_jsonl_pipelined")
+    parser.add_argument('--save-baseline', metavar='NAME', help=f"store the results as baseline NAME in {BASELINES_DIR}")
+    parser.add_argument('--baseline', metavar='NAME', help="compare the results to baseline NAME")
+    parser.add_argument('--tolerance', type=float, default=DEFAULT_TOLERANCE, help="allowed slowdown before a regression is reported")
+    parser.add_argument('--output', help="also write the results to this json file")
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes.split(','):
+        n_rows = SIZES.get(size.lower()) or int(size)
+        print(f"{size}: {n_rows:,} rows")
+        results[size] = bench_size(n_rows, args.embedding_model, args.cluster_sample, args.pipeline_workers)
+
+    report = {'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+              'machine': {'platform': platform.platform(), 'python': platform.python_version(), 'cpus': os.cpu_count()},
+              'embedding_model': args.embedding_model,
+              'results': results}
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+    if args.save_baseline:
+        BASELINES_DIR.mkdir(exist_ok=True)
+        with open(BASELINES_DIR / f"{args.save_baseline}.json", 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Baseline saved to {BASELINES_DIR / args.save_baseline}.json")
+
+    if args.baseline:
+        with open(BASELINES_DIR / f"{args.baseline}.json") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        for size, stage, seconds, reference in regressions:
+            print(f"REGRESSION {size} {stage}: {seconds:.2f}s vs {reference:.2f}s in baseline {args.baseline}")
+        if regressions:
+            sys.exit(1)
+        print(f"No regression against baseline {args.baseline} (tolerance {args.tolerance:.0%})")
@@ -0,0 +1,65 @@
+"""Measures the size of float16 and int8 embeddings and the effect of the lower precision on search and topic assignments.
+
+Topics are assigned as BERTopic does by default, UMAP to 5 dimensions then HDBSCAN, on the embeddings of each
+precision, and compared to the float32 assignments with the adjusted Rand index (1 is identical).
+Without umap-learn and hdbscan installed, a PCA and KMeans stand in for them.
+
+Usage:
+    python benchmarks/bench_precision.py [n_rows] [dim]
+"""
+import sys
+import time
+
+import numpy as np
+from sklearn.metrics import adjusted_rand_score
+
+from ideo_topic_modeler.embeddings import EMBEDDING_PRECISIONS, reduce_precision
+
+from synthetic import make_embeddings
+
+
+def assign_topics(embeddings, n_topics, random_state=42):
+    """Clusters the embeddings like BERTopic's default pipeline, or with PCA and KMeans if umap or hdbscan is missing."""
+    try:
+        from umap import UMAP
+        from hdbscan import HDBSCAN
+    except ImportError:
+        from sklearn.decomposition import PCA
+        from sklearn.cluster import KMeans
+        reduced = PCA(n_components=5, random_state=random_state).fit_transform(embeddings)
+        return KMeans(n_clusters=n_topics, n_init=3, random_state=random_state).fit_predict(reduced)
+
+    reduced = UMAP(n_neighbors=15, n_components=5, min_dist=0.0, metric='cosine', random_state=random_state).fit_transform(embeddings)
+    return HDBSCAN(min_cluster_size=10, metric='euclidean', cluster_selection_method='eom').fit_predict(reduced)
+
+
+def neighbors(embeddings, queries, k=10):
+    scores = queries @ embeddings.T
+    return np.argsort(-scores, axis=1)[:, :k], scores
+
+
+if __name__ == "__main__":
+
+    n_rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    dim = int(sys.argv[2]) if len(sys.argv) > 2 else 384
+    n_topics = 20
+
+    embeddings, _ = make_embeddings(n_rows, dim=dim, n_topics=n_topics)
+    queries = embeddings[:100]
+
+    reference_topics = assign_topics(embeddings, n_topics)
+    reference_neighbors, reference_scores = neighbors(embeddings, queries)
+
+    print(f"{'precision':<10} {'size':>10} {'ratio':>6} {'max cos err':>12} {'recall@10':>10} {'topics ARI':>11} {'time':>7}")
+    for precision in EMBEDDING_PRECISIONS:
+        start = time.perf_counter()
+        reduced = reduce_precision(embeddings, precision)
+        dequantized = np.asarray(reduced, dtype=np.float32)
+        topics = assign_topics(dequantized, n_topics)
+        elapsed = time.perf_counter() - start
+
+        found, scores = neighbors(dequantized, queries)
+        recall = np.mean([len(set(a) & set(b)) / len(a) for a, b in zip(found, reference_neighbors)])
+        print(f"{precision:<10} {reduced.nbytes / 1024**2:8.1f}MB {embeddings.nbytes / reduced.nbytes:5.1f}x "
+              f"{np.abs(scores - reference_scores).max():12.2e} {recall:10.3f} "
+              f"{adjusted_rand_score(reference_topics, topics):11.4f} {elapsed:6.1f}s")
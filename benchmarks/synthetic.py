@@ -0,0 +1,95 @@
+import random
+from datetime import datetime, timedelta
+
+import numpy as np
+import pandas as pd
+
+
+WORDS = [
+    "climate", "change", "carbon", "energy", "solar", "wind", "policy", "emissions", "glucose",
+    "monitor", "sensor", "wellness", "goals", "health", "sleep", "diet", "people", "think",
+    "really", "just", "because", "would", "could", "should", "never", "always", "money", "time",
+    "the", "a", "and", "of", "to", "in", "is", "it", "that", "for", "on", "with",
+]
+NOISE = [
+    "https://www.reddit.com/r/climate/comments/abc123", "www.example.com/page?q=1", "&amp;",
+    "don't", "It’s", "(see above)", "#tag", "@user", "100%", "$5", "a/b", "x_y", "[link]",
+    "café", "—", "!!", "??", "\n\n", "\t",
+]
+SUBREDDITS = ["climate", "environment", "science", "diabetes", "fitness", "AskReddit"]
+KEYWORDS = ["climate+change", "wellness goals", "continuous glucose monitoring"]
+
+
+def _sentence(rng, keyword=None):
+    words = rng.choices(WORDS, k=rng.randint(4, 18))
+    if rng.random() < 0.3:
+        words.insert(rng.randrange(len(words)), rng.choice(NOISE))
+    if keyword is not None:
+        words.insert(rng.randrange(len(words)), rng.choice(keyword.split('+')))
+    words[0] = words[0].capitalize()
+    return " ".join(words)
+
+
+def _body(rng, keyword):
+    n_sentences = rng.randint(1, 12)
+    with_keyword = set(rng.sample(range(n_sentences), k=rng.randint(0, min(2, n_sentences))))
+    return ".".join(_sentence(rng, keyword if i in with_keyword else None) for i in range(n_sentences))
+
+
+def make_reddit_frame(n_rows, seed=0, duplicate_rate=0.05, missing_rate=0.01):
+    """Generates a synthetic dataframe shaped like our reddit dumps.
+
+    Args:
+        n_rows (int): number of rows
+        seed (int): seed of the random generator, the same seed always returns the same frame
+        duplicate_rate (float): fraction of rows that repeat the body of an earlier row
+        missing_rate (float): fraction of rows with a missing body
+
+    Returns:
+        pandas DataFrame: with keyword, title, body, subreddit, created_utc and url columns
+    """
+    rng = random.Random(seed)
+    start = datetime(2021, 12, 6)
+
+    rows = []
+    for i in range(n_rows):
+        keyword = rng.choice(KEYWORDS)
+        if rows and rng.random() < duplicate_rate:
+            body = rng.choice(rows)['body']
+        elif rng.random() < missing_rate:
+            body = None
+        else:
+            body = _body(rng, keyword)
+        rows.append({
+            'keyword': keyword,
+            'title': _sentence(rng),
+            'body': body,
+            'subreddit': rng.choice(SUBREDDITS),
+            'created_utc': start + timedelta(seconds=rng.randrange(365 * 24 * 3600)),
+            'url': f"https://www.reddit.com/r/comments/{i:x}",
+        })
+
+    return pd.DataFrame(rows)
+
+
+def make_embeddings(n_rows, dim=384, n_topics=20, spread=0.6, seed=0):
+    """Makes normalized embeddings grouped around n_topics random directions, like sentence embeddings of posts on a few topics.
+
+    Args:
+        n_rows (int): number of embeddings
+        dim (int): dimension of the embeddings
+        n_topics (int): number of groups
+        spread (float): distance of the embeddings to the center of their group, relative to the distance between groups
+        seed (int): seed of the random generator
+
+    Returns:
+        tuple: the float32 embeddings (2D numpy array) and the group of each embedding (1D numpy array)
+    """
+    rng = np.random.default_rng(seed)
+    centers = rng.standard_normal((n_topics, dim))
+    centers /= np.linalg.norm(centers, axis=1, keepdims=True)
+
+    groups = rng.integers(n_topics, size=n_rows)
+    embeddings = centers[groups] + spread * rng.standard_normal((n_rows, dim)) / np.sqrt(dim)
+    embeddings /= np.linalg.norm(embeddings, axis=1, keepdims=True)
+    return embeddings.astype(np.float32), groups
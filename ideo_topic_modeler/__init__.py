@@ -1,5 +1,31 @@
+import importlib
+import logging
+
 from .model import Model
-from .ngrams import NgramModel
-from .sentiment import SentimentModel
-from .topics import TopicModel
-from .directories import DATA_DIR
\ No newline at end of file
+from .directories import DATA_DIR
+
+
+# Progress messages and stage metrics are logged, configure logging (e.g. logging.basicConfig(level=logging.INFO)) to see them.
+logging.getLogger(__name__).addHandler(logging.NullHandler())
+
+# The models pull in heavy dependencies (bertopic, torch, plotting libraries...),
+# so they are only imported the first time they are accessed.
+_LAZY_MODELS = {
+    'NgramModel': '.ngrams',
+    'SentimentModel': '.sentiment',
+    'TopicModel': '.topics',
+}
+
+__all__ = ['Model', 'NgramModel', 'SentimentModel', 'TopicModel', 'DATA_DIR']
+
+
+def __getattr__(name):
+    if name in _LAZY_MODELS:
+        model = getattr(importlib.import_module(_LAZY_MODELS[name], __name__), name)
+        globals()[name] = model
+        return model
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
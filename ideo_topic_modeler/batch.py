@@ -0,0 +1,307 @@
+import hashlib
+import json
+import logging
+import os
+import sys
+import traceback
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from datetime import datetime
+from pathlib import Path
+
+import pandas as pd
+
+from ideo_topic_modeler.model import Model
+from ideo_topic_modeler.utils import process_context, DEFAULT_CHUNKSIZE
+from ideo_topic_modeler.clustering import make_topic_model, DEFAULT_N_CLUSTERS
+from ideo_topic_modeler.embeddings import EmbeddingCache, EmbeddingEngine, save_embeddings, load_embeddings, DEFAULT_MODEL
+
+
+logger = logging.getLogger(__name__)
+
+STATE_FILENAME = "batch_state.json"
+CLEANED_FILENAME = "cleaned.json"
+
+#options of a dataset, and their defaults, when not given in the manifest
+DATASET_DEFAULTS = {
+    'text_column': 'body',
+    'data_source': 'reddit',
+    'language': 'english',
+    'keyword_window': 1,
+    'near_duplicate_threshold': None,
+    'storage': 'parquet',
+    'chunksize': DEFAULT_CHUNKSIZE,
+    'clustering': 'hdbscan',
+    'n_clusters': DEFAULT_N_CLUSTERS,
+    'sample_size': None,
+}
+
+# progress of a dataset through the pipeline, saved in the state file
+CLEANED, EMBEDDED, DONE, FAILED = 'cleaned', 'embedded', 'done', 'failed'
+
+
+def load_manifest(path):
+    """Reads a batch manifest: a json file with the datasets to model and the options shared by all of them.
+
+    {
+        "output_directory": "models",                 # one sub-directory per dataset, relative to the manifest
+        "embedding_model": "paraphrase-mpnet-base-v2",  # loaded once for all the datasets
+        "embedding_cache": "models/cache",            # optional, see TopicModel
+        "defaults": {"text_column": "body", "data_source": "reddit"},
+        "datasets": [
+            {"name": "climate", "path": "reddit_climate+change.json"},
+            {"name": "glucose", "path": "reddit_glucose.json", "keyword_window": 2}
+        ]
+    }
+
+    Each dataset takes the options of DATASET_DEFAULTS, from the dataset itself, then the defaults of the manifest.
+
+    Args:
+        path (str or Path): the manifest
+
+    Returns:
+        dict: the manifest, with the options of every dataset resolved and paths made absolute
+    """
+    path = Path(path).resolve()
+    with open(path) as f:
+        manifest = json.load(f)
+
+    root = path.parent
+    manifest['output_directory'] = str(root / manifest.get('output_directory', 'models'))
+    if manifest.get('embedding_cache'):
+        manifest['embedding_cache'] = str(root / manifest['embedding_cache'])
+    manifest.setdefault('embedding_model', DEFAULT_MODEL)
+
+    datasets = []
+    for dataset in manifest['datasets']:
+        dataset = {**DATASET_DEFAULTS, **manifest.get('defaults', {}), **dataset}
+        dataset['path'] = str(root / dataset['path'])
+        dataset.setdefault('name', Path(dataset['path']).stem)
+        datasets.append(dataset)
+    if len({d['name'] for d in datasets}) != len(datasets):
+        raise ValueError("Dataset names must be unique in a manifest.")
+    manifest['datasets'] = datasets
+    return manifest
+
+
+def dataset_fingerprint(dataset, embedding_model):
+    """Identifies the inputs and config of a dataset: its options, the embedding model and the size and
+    modification time of its file. A dataset whose fingerprint didn't change since its last run is skipped.
+    """
+    stat = os.stat(dataset['path'])
+    config = json.dumps({**dataset, 'embedding_model': embedding_model, 'size': stat.st_size, 'mtime': stat.st_mtime_ns},
+                        sort_keys=True)
+    return hashlib.sha1(config.encode('utf-8')).hexdigest()
+
+
+def _topic_model(dataset, model_directory, cleaned_path, **kwargs):
+    """A TopicModel on the cleaned corpus of a dataset, without cleaning it again (see Model.from_jsonl)."""
+    from ideo_topic_modeler.topics import TopicModel
+
+    model = TopicModel(pd.DataFrame(), dataset['text_column'], dataset['data_source'], model_directory,
+                       language=dataset['language'], storage=dataset['storage'], **kwargs)
+    model.text_column = dataset['text_column']
+    model.modeling_column = f"{dataset['text_column']}_clean"
+    model.corpus_path = Path(cleaned_path)
+    model.data = None
+    return model
+
+
+def _clean_dataset(dataset, cleaned_path):
+    """Worker task: transforms and cleans a dataset, streaming it chunk by chunk to a json lines file."""
+    model = Model.from_jsonl(dataset['path'], dataset['text_column'], dataset['data_source'], cleaned_path,
+                             chunksize=dataset['chunksize'], language=dataset['language'],
+                             keyword_window=dataset['keyword_window'],
+                             near_duplicate_threshold=dataset['near_duplicate_threshold'])
+    return model.corpus_path
+
+
+def _fit_dataset(dataset, model_directory, cleaned_path, timestamp):
+    """Worker task: fits the topics of a dataset on its saved embeddings, and saves the model and the enriched data."""
+    model = _topic_model(dataset, model_directory, cleaned_path)
+    model.embeddings, embeddings_info = load_embeddings(model_directory, timestamp)
+    model._set_embedding_model(embeddings_info.get('model_name'))
+    model.topic_model = make_topic_model(dataset['clustering'], dataset['n_clusters'])
+    model.enrich_data_and_save_them(timestamp, sample_size=dataset['sample_size'])
+    model.save_model(timestamp)
+
+
+class BatchRunner:
+
+    def __init__(self, manifest, n_workers=2, max_in_flight=None, batch_size=None, embedding_jobs=1):
+        '''
+        Models many datasets in one process: the embedding model is loaded once, and the datasets are scheduled
+        across a pool of worker processes.
+
+        Cleaning and topic fitting run in the pool while the main process embeds the cleaned datasets with the
+        shared embedding model, so the stages of different datasets overlap. At most max_in_flight datasets are
+        between cleaning and the end of their fit at any time, which bounds the memory used.
+
+        Progress is saved in a state file after every stage: a run resumes datasets where they stopped,
+        retries the failed ones, and skips the datasets whose file and config didn't change since they were modeled.
+
+        Parameters
+        ----------
+        manifest: dict, str or Path
+            The manifest, or its path (see load_manifest).
+        n_workers: int
+            Number of worker processes cleaning and fitting datasets, -1 uses all cpus.
+        max_in_flight: int
+            Maximum number of datasets being processed at the same time. Default is n_workers + 1.
+        batch_size: int
+            Number of documents encoded together. Default depends on the embedding model (see EmbeddingEngine).
+        embedding_jobs: int
+            Number of processes encoding the documents (see EmbeddingEngine).
+        '''
+        self.manifest = manifest if isinstance(manifest, dict) else load_manifest(manifest)
+        self.n_workers = os.cpu_count() if n_workers < 0 else n_workers
+        self.max_in_flight = max_in_flight or self.n_workers + 1
+
+        self.output_directory = Path(self.manifest['output_directory'])
+        self.output_directory.mkdir(parents=True, exist_ok=True)
+        self.state_path = self.output_directory / STATE_FILENAME
+        self.state = json.loads(self.state_path.read_text()) if self.state_path.exists() else {}
+
+        self.embedding_engine = EmbeddingEngine(self.manifest['embedding_model'], batch_size=batch_size, n_jobs=embedding_jobs)
+        embedding_cache = self.manifest.get('embedding_cache')
+        self.embedding_cache = EmbeddingCache(embedding_cache) if embedding_cache else None
+
+    def _save_state(self):
+        #written to a temporary file first, so an interrupted run never leaves a corrupted state
+        tmp_path = self.state_path.with_suffix('.tmp')
+        tmp_path.write_text(json.dumps(self.state, indent=2))
+        tmp_path.replace(self.state_path)
+
+    def _set_status(self, dataset, status, **info):
+        self.state[dataset['name']] = {**self.state.get(dataset['name'], {}), 'status': status,
+                                       'updated': datetime.now().isoformat(timespec='seconds'), **info}
+        self._save_state()
+        logger.info(f"{dataset['name']} --> {status}")
+
+    def _paths(self, dataset):
+        model_directory = self.output_directory / dataset['name']
+        model_directory.mkdir(parents=True, exist_ok=True)
+        return model_directory, model_directory / CLEANED_FILENAME
+
+    def plan(self):
+        '''
+        Returns the datasets to run and the stage each one starts from: 'clean', 'embed' or 'fit'.
+        Datasets already modeled with the same fingerprint are left out.
+        '''
+        plan = []
+        for dataset in self.manifest['datasets']:
+            fingerprint = dataset_fingerprint(dataset, self.embedding_engine.name)
+            previous = self.state.get(dataset['name'], {})
+            if previous.get('fingerprint') != fingerprint:
+                plan.append((dataset, 'clean', fingerprint))
+            elif previous['status'] == DONE:
+                logger.info(f"{dataset['name']} --> unchanged, skipped")
+            elif previous['status'] == CLEANED:
+                plan.append((dataset, 'embed', fingerprint))
+            elif previous['status'] == EMBEDDED:
+                plan.append((dataset, 'fit', fingerprint))
+            else:
+                #failed datasets start over
+                plan.append((dataset, 'clean', fingerprint))
+        return plan
+
+    def _embed(self, dataset):
+        model_directory, cleaned_path = self._paths(dataset)
+        timestamp = self.state[dataset['name']]['timestamp']
+
+        model = _topic_model(dataset, model_directory, cleaned_path, embedding_cache=self.embedding_cache)
+        model.embedding_engine = self.embedding_engine
+        model.pre_trained_model = self.embedding_engine.name
+        with model.instrumentation.stage('embedding'):
+            embeddings = model._embed(model._iter_corpus())
+        save_embeddings(embeddings, model_directory, timestamp, model.pre_trained_model)
+
+    def run(self):
+        '''
+        Runs the batch.
+
+        Returns
+        -------
+        dict mapping the name of each dataset of the manifest to its status: 'done', 'failed' or 'skipped'.
+        '''
+        plan = self.plan()
+        results = {dataset['name']: 'skipped' for dataset in self.manifest['datasets']}
+        timestamp = datetime.now().strftime("%d_%m_%Y_%H%M%S")
+
+        for dataset, stage, fingerprint in plan:
+            if stage == 'clean':
+                self.state[dataset['name']] = {'fingerprint': fingerprint, 'timestamp': timestamp}
+
+        waiting = deque(plan)
+        running = {}
+        in_flight = 0
+
+        def fail(dataset, error):
+            logger.error(f"{dataset['name']} failed:\n{error}")
+            self._set_status(dataset, FAILED, error=error)
+            results[dataset['name']] = FAILED
+
+        #the main process has the embedding model loaded while the pool is live, so the workers are not forked from it
+        with ProcessPoolExecutor(max_workers=self.n_workers, mp_context=process_context()) as executor:
+
+            def submit(dataset, stage):
+                model_directory, cleaned_path = self._paths(dataset)
+                if stage == 'clean':
+                    future = executor.submit(_clean_dataset, dataset, cleaned_path)
+                else:
+                    future = executor.submit(_fit_dataset, dataset, model_directory, cleaned_path,
+                                             self.state[dataset['name']]['timestamp'])
+                running[future] = (dataset, stage)
+
+            def embed_and_fit(dataset):
+                #the embedding model lives in this process, while the pool keeps cleaning and fitting other datasets
+                try:
+                    self._embed(dataset)
+                except Exception:
+                    fail(dataset, traceback.format_exc())
+                    return False
+                self._set_status(dataset, EMBEDDED)
+                submit(dataset, 'fit')
+                return True
+
+            while waiting or running:
+                while waiting and in_flight < self.max_in_flight:
+                    dataset, stage, _ = waiting.popleft()
+                    in_flight += 1
+                    if stage == 'embed' and not embed_and_fit(dataset):
+                        in_flight -= 1
+                    elif stage != 'embed':
+                        submit(dataset, stage)
+
+                if not running:
+                    continue
+
+                done, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in done:
+                    dataset, stage = running.pop(future)
+                    error = future.exception()
+                    if error is not None:
+                        fail(dataset, ''.join(traceback.format_exception(error)))
+                        in_flight -= 1
+                    elif stage == 'clean':
+                        self._set_status(dataset, CLEANED)
+                        if not embed_and_fit(dataset):
+                            in_flight -= 1
+                    else:
+                        self._set_status(dataset, DONE)
+                        results[dataset['name']] = DONE
+                        in_flight -= 1
+
+        self.embedding_engine.close()
+        return results
+
+
+if __name__ == "__main__":
+
+    # python -m ideo_topic_modeler.batch <manifest.json> [n_workers]
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+    results = BatchRunner(sys.argv[1], n_workers=int(sys.argv[2]) if len(sys.argv) > 2 else 2).run()
+    for name, status in results.items():
+        logger.info(f"{name}: {status}")
+    if 'failed' in results.values():
+        sys.exit(1)
@@ -0,0 +1,185 @@
+import hashlib
+import json
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ideo_topic_modeler.embeddings import QuantizedEmbeddings
+from ideo_topic_modeler.storage import ParquetStorage
+
+
+# Bump when the layout of a bundle changes, and keep ModelBundle able to read older versions.
+SCHEMA_VERSION = 1
+
+MANIFEST_FILENAME = "manifest.json"
+DATA_FILENAME = "data.parquet"
+EMBEDDINGS_FILENAME = "embeddings.npy"
+TOPIC_INFO_FILENAME = "topics.json"
+TOPIC_MODEL_FILENAME = "topic_model"
+
+
+def file_checksum(path, block_size=1024**2):
+    """Returns the sha256 of a file, read block by block."""
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+def write_bundle(path, data, embeddings, topic_model, topic_info, embedding_model):
+    """Saves a fitted topic model and its data as a versioned bundle: a directory with a manifest.
+
+    The bundle contains the data in Parquet, the embeddings as .npy, the per-topic table in json lines
+    and the BERTopic model. The manifest records the schema version, the embedding model, the row count
+    and a checksum of every file. It is written last, so a bundle without manifest is incomplete.
+
+    Args:
+        path (Path): directory of the bundle
+        data (pandas DataFrame or iterable): the enriched data, one row per embedding, or chunks of them
+            (e.g. read from disk with a storage's iter_read), so they are never fully loaded
+        embeddings (2D array or QuantizedEmbeddings): the embeddings, saved in their precision
+        topic_model (BERTopic): the fitted model
+        topic_info (pandas DataFrame): the per-topic table
+        embedding_model (str): name of the model that computed the embeddings
+
+    Returns:
+        dict: the manifest
+    """
+    path = Path(path)
+    path.mkdir(parents=True, exist_ok=True)
+
+    if not isinstance(embeddings, QuantizedEmbeddings):
+        embeddings = np.asarray(embeddings)
+
+    if isinstance(data, pd.DataFrame):
+        row_count, columns = len(data), data.columns.tolist()
+        if row_count != len(embeddings):
+            raise ValueError(f"data has {row_count} rows but there are {len(embeddings)} embeddings.")
+        data.to_parquet(path / DATA_FILENAME, index=False)
+    else:
+        row_count, columns = 0, []
+        with ParquetStorage().writer(path / DATA_FILENAME) as writer:
+            for chunk in data:
+                writer.write(chunk)
+                row_count, columns = row_count + len(chunk), chunk.columns.tolist()
+        #the bundle stays incomplete, without manifest
+        if row_count != len(embeddings):
+            raise ValueError(f"data has {row_count} rows but there are {len(embeddings)} embeddings.")
+    if isinstance(embeddings, QuantizedEmbeddings):
+        np.save(path / EMBEDDINGS_FILENAME, embeddings.codes)
+        embeddings_info = {'dtype': embeddings.codes.dtype.str, 'shape': list(embeddings.shape), **embeddings.metadata()}
+    else:
+        np.save(path / EMBEDDINGS_FILENAME, embeddings)
+        embeddings_info = {'dtype': embeddings.dtype.str, 'shape': list(embeddings.shape), 'precision': embeddings.dtype.name}
+    topic_info.to_json(path / TOPIC_INFO_FILENAME, orient='records', lines=True)
+    topic_model.save(path / TOPIC_MODEL_FILENAME)
+
+    manifest = {
+        'schema_version': SCHEMA_VERSION,
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'embedding_model': embedding_model,
+        'row_count': row_count,
+        'columns': columns,
+        'embeddings': embeddings_info,
+        'topic_count': len(topic_info),
+        'files': {filename: file_checksum(path / filename)
+                  for filename in [DATA_FILENAME, EMBEDDINGS_FILENAME, TOPIC_INFO_FILENAME, TOPIC_MODEL_FILENAME]},
+    }
+    with open(path / MANIFEST_FILENAME, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    return manifest
+
+
+class ModelBundle:
+
+    def __init__(self, path):
+        '''
+        Opens a bundle saved with write_bundle. Only the manifest is read: each part of the bundle
+        is loaded when asked for, so e.g. a dashboard can show the topics and their counts
+        without deserializing the embeddings or the text of the documents.
+
+        Parameters
+        ----------
+        path: str or Path
+            Directory of the bundle.
+        '''
+        self.path = Path(path)
+
+        manifest_path = self.path / MANIFEST_FILENAME
+        if not manifest_path.exists():
+            raise ValueError(f'{self.path} is not a complete model bundle, {MANIFEST_FILENAME} is missing.')
+        with open(manifest_path) as f:
+            self.manifest = json.load(f)
+
+        if self.manifest['schema_version'] > SCHEMA_VERSION:
+            raise ValueError(f"Bundle schema version {self.manifest['schema_version']} is newer than the supported version {SCHEMA_VERSION}, "
+                             "upgrade ideo_topic_modeler to open it.")
+
+    @property
+    def row_count(self):
+        return self.manifest['row_count']
+
+    @property
+    def embedding_model(self):
+        return self.manifest['embedding_model']
+
+    def topic_info(self):
+        '''
+        Returns the per-topic table: topic ids, sizes, names and tf_idf words.
+        '''
+        return pd.read_json(self.path / TOPIC_INFO_FILENAME, lines=True)
+
+    def topic_counts(self):
+        '''
+        Returns the number of documents per topic, read from the data's topic column only.
+        '''
+        return self.data(columns=['topic', 'topic_name']).value_counts().reset_index(name='count')
+
+    def data(self, columns=None, filters=None):
+        '''
+        Loads the data, or only some columns and rows of it.
+
+        Parameters
+        ----------
+        columns: list of str
+            Only load these columns. Default is all columns.
+        filters: list of tuples
+            Only load matching rows, e.g. [('topic', '==', 3)], see pandas.read_parquet.
+
+        Returns
+        -------
+        pandas DataFrame
+        '''
+        return pd.read_parquet(self.path / DATA_FILENAME, columns=columns, filters=filters)
+
+    def embeddings(self, mmap=True):
+        '''
+        Loads the embeddings, memory-mapped by default so opening them costs nearly nothing.
+        int8 embeddings are returned as QuantizedEmbeddings.
+        '''
+        embeddings = np.load(self.path / EMBEDDINGS_FILENAME, mmap_mode='r' if mmap else None)
+        if self.manifest['embeddings'].get('precision') == 'int8':
+            return QuantizedEmbeddings.from_metadata(embeddings, self.manifest['embeddings'])
+        return embeddings
+
+    def topic_model(self):
+        '''
+        Loads the fitted BERTopic model.
+        '''
+        from bertopic import BERTopic
+
+        return BERTopic.load(self.path / TOPIC_MODEL_FILENAME)
+
+    def verify(self):
+        '''
+        Checks every file of the bundle against the checksums of the manifest.
+        Raises a ValueError listing the files that don't match.
+        '''
+        corrupted = [filename for filename, checksum in self.manifest['files'].items()
+                     if not (self.path / filename).exists() or file_checksum(self.path / filename) != checksum]
+        if corrupted:
+            raise ValueError(f"Corrupted files in bundle {self.path}: {', '.join(corrupted)}")
@@ -0,0 +1,82 @@
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+import ideo_topic_modeler.utils as ut
+from ideo_topic_modeler.utils import process_context, DEFAULT_CHUNKSIZE
+
+
+# The cleaning rules, compiled once at import time. clean_text applies them in a single pass
+# and returns exactly what the historical sequence of Series.apply passes returned.
+# Text is ascii-decoded and lowercased first, so the patterns don't need to be case insensitive
+# and the typographic apostrophe is already gone.
+URL_PATTERN = re.compile(r"http\S+")
+WWW_PATTERN = re.compile(r"www.\S+")
+APOSTROPHE_PATTERN = re.compile("(?<=[a-z])'(?=[a-z])")
+
+# some specific punctuation, replaced by a space (we want to keep question and exclamation marks)
+PUNCTUATION = '|.:;@$%_[]()+*#"/'
+
+
+def clean_text(text):
+    """Applies all the cleaning rules to a single document in one pass.
+
+    Args:
+        text (str): free text
+
+    Returns:
+        str: the cleaned text
+    """
+    #decode ascii and make text lowercase
+    text = ut.decode_ascii(text).lower()
+
+    #removing https and addresses (the substring checks skip the regex for most documents)
+    if 'http' in text:
+        text = URL_PATTERN.sub("", text)
+    if 'www' in text:
+        text = WWW_PATTERN.sub("", text)
+    text = text.replace("&amp", "")
+
+    #remove some specific punctuation
+    for p in PUNCTUATION:
+        text = text.replace(p, ' ')
+
+    #remove quotes and apostrophes
+    if "'" in text:
+        text = APOSTROPHE_PATTERN.sub("", text)
+
+    #remove line breaks, tabs and trailing spaces
+    return ' '.join(text.split())
+
+
+def _clean_chunk(texts):
+    return [clean_text(t) for t in texts]
+
+
+def clean_series(series, n_jobs=1, chunksize=DEFAULT_CHUNKSIZE):
+    """Cleans a Series of documents, optionally splitting it in chunks cleaned on a process pool.
+
+    Args:
+        series (pandas Series): the documents to clean
+        n_jobs (int): number of worker processes. With 1 (default) everything runs in the current process,
+            with -1 one worker per cpu is used.
+        chunksize (int): number of documents sent to a worker at a time
+
+    Returns:
+        pandas Series: the cleaned documents, with the same index as the input
+    """
+    texts = series.tolist()
+
+    if n_jobs is not None and n_jobs < 0:
+        n_jobs = os.cpu_count()
+
+    if n_jobs is None or n_jobs == 1 or len(texts) <= chunksize:
+        cleaned = _clean_chunk(texts)
+    else:
+        chunks = [texts[i:i + chunksize] for i in range(0, len(texts), chunksize)]
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=process_context()) as executor:
+            cleaned = [t for chunk in executor.map(_clean_chunk, chunks) for t in chunk]
+
+    return pd.Series(cleaned, index=series.index)
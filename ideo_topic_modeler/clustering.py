@@ -0,0 +1,154 @@
+import numpy as np
+
+
+CLUSTERINGS = ['hdbscan', 'minibatch']
+ASSIGNMENTS = ['centroid', 'predict']
+
+DEFAULT_SAMPLE_SIZE = 200_000
+DEFAULT_N_CLUSTERS = 50
+DEFAULT_N_COMPONENTS = 5
+DEFAULT_ASSIGN_BATCH_SIZE = 65_536
+
+
+def make_topic_model(clustering='hdbscan', n_clusters=DEFAULT_N_CLUSTERS, n_components=DEFAULT_N_COMPONENTS, random_state=42):
+    """Builds the BERTopic model of a TopicModel, with the reduction and clustering components of the given clustering.
+
+    'hdbscan' is BERTopic's default pipeline, UMAP then HDBSCAN, which finds the number of topics and the outliers (topic -1)
+    but needs a lot of memory and time above a few hundred thousand documents. 'minibatch' swaps them for an incremental PCA
+    and MiniBatchKMeans, linear in the number of documents and with a bounded memory, but the number of topics must be
+    given and every document gets a topic.
+
+    Args:
+        clustering (str): 'hdbscan' (default) or 'minibatch'
+        n_clusters (int): number of topics of the 'minibatch' clustering
+        n_components (int): number of dimensions of the incremental PCA of the 'minibatch' clustering
+        random_state (int): seed of the 'minibatch' clustering
+
+    Returns:
+        BERTopic: the unfitted topic model
+    """
+    from bertopic import BERTopic
+
+    if clustering == 'hdbscan':
+        return BERTopic()
+    if clustering == 'minibatch':
+        from sklearn.decomposition import IncrementalPCA
+        from sklearn.cluster import MiniBatchKMeans
+
+        return BERTopic(umap_model=IncrementalPCA(n_components=n_components, batch_size=DEFAULT_ASSIGN_BATCH_SIZE),
+                        hdbscan_model=MiniBatchKMeans(n_clusters=n_clusters, batch_size=4096, n_init=3, random_state=random_state))
+    raise ValueError(f"Unrecognized clustering {clustering}. Can be one of {CLUSTERINGS}")
+
+
+def clustering_of(topic_model):
+    """Finds the clustering of a topic model, e.g. a loaded one, to build a new model like it (see make_topic_model).
+
+    Returns:
+        tuple: the clustering ('hdbscan' or 'minibatch') and its number of topics (DEFAULT_N_CLUSTERS for 'hdbscan')
+    """
+    clusterer = getattr(topic_model, 'hdbscan_model', None)
+    if type(clusterer).__name__ == 'MiniBatchKMeans':
+        return 'minibatch', clusterer.n_clusters
+    return 'hdbscan', DEFAULT_N_CLUSTERS
+
+
+def sample_indices(n_rows, sample_size, random_state=42):
+    """Draws a uniform random sample of rows, without replacement.
+
+    Returns:
+        1D numpy array: the sorted indices of the sampled rows
+    """
+    rng = np.random.default_rng(random_state)
+    return np.sort(rng.choice(n_rows, size=sample_size, replace=False))
+
+
+def select_documents(corpora, indices):
+    """Picks the documents at the given indices from chunks of documents, without keeping the other documents in memory.
+
+    Args:
+        corpora (iterable): lists of documents, as yielded by TopicModel._iter_corpus
+        indices (1D array): sorted indices of the documents to pick, over all the chunks
+
+    Returns:
+        list of the picked documents
+    """
+    selected = []
+    start = 0
+    for corpus in corpora:
+        end = start + len(corpus)
+        first, last = np.searchsorted(indices, [start, end])
+        selected.extend(corpus[i - start] for i in indices[first:last])
+        start = end
+    return selected
+
+
+def _normalize(vectors):
+    return vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+
+
+def topic_centroids(embeddings, topics, block_rows=DEFAULT_ASSIGN_BATCH_SIZE):
+    """Mean direction of the embeddings of each topic, the outliers (topic -1) left out.
+    Embeddings are read block by block, so memory-mapped or quantized embeddings are never fully loaded as float32.
+
+    Args:
+        embeddings (2D array): the embeddings of the fitted documents
+        topics (1D array): the topic of each document
+        block_rows (int): number of embeddings read at a time
+
+    Returns:
+        tuple: the topics (1D numpy array) and their normalized centroids (2D numpy array, one row per topic)
+    """
+    topics = np.asarray(topics)
+    topic_ids, inverse = np.unique(topics, return_inverse=True)
+    sums = np.zeros((len(topic_ids), embeddings.shape[1]), dtype=np.float64)
+    for i in range(0, len(topics), block_rows):
+        np.add.at(sums, inverse[i:i + block_rows], _normalize(np.asarray(embeddings[i:i + block_rows], dtype=np.float32)))
+    keep = topic_ids != -1
+    return topic_ids[keep], _normalize(sums[keep]).astype(np.float32)
+
+
+def nearest_centroid(embeddings, topic_ids, centroids):
+    """Assigns embeddings to the topic of their most similar centroid (cosine similarity).
+
+    Args:
+        embeddings (2D array): the embeddings to assign
+        topic_ids (1D array): the topic of each centroid
+        centroids (2D array): the normalized centroids, see topic_centroids
+
+    Returns:
+        tuple: the topic of each embedding and its similarity to the centroid of the topic, clipped to [0, 1].
+        Without centroids, every embedding is an outlier (topic -1) with similarity 0.
+    """
+    if len(topic_ids) == 0:
+        return np.full(len(embeddings), -1), np.zeros(len(embeddings))
+    similarities = _normalize(np.asarray(embeddings, dtype=np.float32)) @ centroids.T
+    best = similarities.argmax(axis=1)
+    return topic_ids[best], np.clip(similarities[np.arange(len(best)), best], 0, 1)
+
+
+def centroid_similarity(embeddings, topics, topic_ids, centroids, block_rows=DEFAULT_ASSIGN_BATCH_SIZE):
+    """Similarity of embeddings to the centroid of their topic (cosine similarity), the topic probability of
+    clusterings that give none. Embeddings are read block by block.
+
+    Args:
+        embeddings (2D array): the embeddings
+        topics (1D array): the topic of each embedding
+        topic_ids (1D array): the topic of each centroid, sorted (see topic_centroids)
+        centroids (2D array): the normalized centroids, see topic_centroids
+        block_rows (int): number of embeddings read at a time
+
+    Returns:
+        1D numpy array: the similarities, clipped to [0, 1]. It is 0 for outliers (topic -1) and topics without centroid.
+    """
+    topics = np.asarray(topics)
+    similarities = np.zeros(len(topics), dtype=np.float64)
+    if len(topic_ids) == 0:
+        return similarities
+    positions = np.minimum(np.searchsorted(topic_ids, topics), len(topic_ids) - 1)
+    known = topic_ids[positions] == topics
+    for i in range(0, len(topics), block_rows):
+        block_known = known[i:i + block_rows]
+        if block_known.any():
+            block = _normalize(np.asarray(embeddings[i:i + block_rows], dtype=np.float32)[block_known])
+            similarities[i:i + block_rows][block_known] = np.einsum('ij,ij->i', block, centroids[positions[i:i + block_rows][block_known]])
+    return np.clip(similarities, 0, 1)
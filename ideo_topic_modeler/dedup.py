@@ -0,0 +1,125 @@
+import zlib
+
+import numpy as np
+import pandas as pd
+
+
+_MERSENNE_PRIME = np.uint64((1 << 61) - 1)
+_MAX_HASH = np.uint64((1 << 32) - 1)
+
+
+def _lsh_bands(threshold, num_perm):
+    """Chooses the number of bands b and rows per band r (b * r = num_perm) so that the similarity
+    at which two documents start sharing a bucket, (1/b)^(1/r), is closest to the threshold.
+    """
+    candidates = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    return min(candidates, key=lambda br: abs((1 / br[0]) ** (1 / br[1]) - threshold))
+
+
+class NearDuplicateFilter:
+
+    def __init__(self, threshold=0.8, num_perm=64, shingle_size=3, seed=1, max_documents=None):
+        '''
+        Finds near-duplicate documents with MinHash signatures and LSH banding, in roughly linear time.
+
+        The filter keeps the documents it has seen, so it can be called on successive chunks
+        of a dataset and still find near duplicates across chunks. Their signatures and buckets take
+        about 2 kB per kept document with the default num_perm, e.g. 2 GB for 1M distinct documents.
+        Give max_documents to bound this memory: the oldest documents are then forgotten, and
+        near duplicates of them are no longer found.
+
+        Parameters
+        ----------
+        threshold: float
+            Estimated Jaccard similarity of the word shingles above which two documents are near duplicates.
+        num_perm: int
+            Number of hash permutations in a signature. More is more accurate, but slower and bigger.
+        shingle_size: int
+            Number of words in a shingle.
+        seed: int
+            Seed of the hash permutations.
+        max_documents: int
+            If given, maximum number of kept documents, the oldest are evicted first. Default is no limit.
+        '''
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.max_documents = max_documents
+        self.bands, self.rows = _lsh_bands(threshold, num_perm)
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=num_perm, dtype=np.uint64)
+
+        # one dict per band, from the band of a signature to the kept documents in that bucket
+        self._buckets = [{} for _ in range(self.bands)]
+        #in insertion order, so the oldest documents come first
+        self._signatures = {}
+
+    def signature(self, text):
+        '''
+        Returns the MinHash signature of a document.
+        '''
+        tokens = text.split()
+        k = min(self.shingle_size, len(tokens))
+        shingles = {' '.join(tokens[i:i + k]) for i in range(len(tokens) - k + 1)} or {''}
+        hashes = np.fromiter((zlib.crc32(s.encode('utf-8')) for s in shingles), dtype=np.uint64, count=len(shingles))
+
+        #integer overflow is part of the hash functions
+        with np.errstate(over='ignore'):
+            permuted = ((np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME) & _MAX_HASH
+        return permuted.min(axis=0).astype(np.uint32)
+
+    def _band_keys(self, signature):
+        return [signature[b * self.rows:(b + 1) * self.rows].tobytes() for b in range(self.bands)]
+
+    def _evict_oldest(self):
+        '''
+        Forgets the oldest kept document.
+        '''
+        idx = next(iter(self._signatures))
+        signature = self._signatures.pop(idx)
+        for band, key in enumerate(self._band_keys(signature)):
+            bucket = self._buckets[band][key]
+            bucket.remove(idx)
+            if not bucket:
+                del self._buckets[band][key]
+
+    def filter(self, texts):
+        '''
+        Finds the near duplicates among texts, and of the texts seen in previous calls.
+        The first occurrence is kept as the representative of its near duplicates.
+
+        Parameters
+        ----------
+        texts: pandas Series
+            The (cleaned) documents, with a unique index.
+
+        Returns
+        -------
+        pandas Series indexed by the near-duplicate rows, with the index of their representative as values.
+        '''
+        duplicates = {}
+        for idx, text in texts.items():
+            signature = self.signature(text)
+            keys = self._band_keys(signature)
+
+            representative = None
+            for band, key in enumerate(keys):
+                for candidate in self._buckets[band].get(key, []):
+                    if np.mean(self._signatures[candidate] == signature) >= self.threshold:
+                        representative = candidate
+                        break
+                if representative is not None:
+                    break
+
+            if representative is None:
+                if self.max_documents is not None and len(self._signatures) >= self.max_documents:
+                    self._evict_oldest()
+                self._signatures[idx] = signature
+                for band, key in enumerate(keys):
+                    self._buckets[band].setdefault(key, []).append(idx)
+            else:
+                duplicates[idx] = representative
+
+        return pd.Series(list(duplicates.values()), index=list(duplicates.keys()), dtype=texts.index.dtype)
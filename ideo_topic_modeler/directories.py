@@ -2,5 +2,4 @@ from pathlib import Path
 
 
 REPO_ROOT_DIR = Path(__file__).parent.parent
-DATA_DIR = REPO_ROOT_DIR / "data"
-DATA_DIR.mkdir(parents=True, exist_ok=True)
\ No newline at end of file
+DATA_DIR = REPO_ROOT_DIR / "data"
\ No newline at end of file
@@ -0,0 +1,582 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import sys
+import tempfile
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from ideo_topic_modeler.utils import text_hash
+
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_BATCH_SIZE = 64
+
+#the model of every data source, unless the embedding_model of the TopicModel (or batch manifest) names another one
+DEFAULT_MODEL = "paraphrase-mpnet-base-v2"
+#a much smaller and faster model, good enough for exploratory runs
+LIGHT_MODEL = "all-MiniLM-L6-v2"
+#the batch size of each model, when none is given. The small model's activations take a fraction of the
+#memory of the larger one, so bigger batches amortize the per-batch overhead. Other models use DEFAULT_BATCH_SIZE.
+BATCH_SIZES_BY_MODEL = {
+    DEFAULT_MODEL: DEFAULT_BATCH_SIZE,
+    LIGHT_MODEL: 128,
+}
+DEFAULT_MAX_SIZE_BYTES = 2 * 1024**3
+
+#precisions in which embeddings can be kept in memory and on disk, see reduce_precision
+EMBEDDING_PRECISIONS = ['float32', 'float16', 'int8']
+
+# sqlite limits the number of host parameters in a single query
+_SQL_CHUNK = 500
+
+# number of batches encoded between two writes to the cache
+_BLOCK_BATCHES = 100
+
+# number of embeddings converted at a time between precisions
+_BLOCK_ROWS = 65536
+
+
+class EmbeddingEngine:
+
+    def __init__(self, model_name=DEFAULT_MODEL, batch_size=None, n_jobs=1, quantize=False):
+        '''
+        Encodes documents with a sentence-transformers model on CPU.
+
+        Documents are sorted by length before being batched, so each batch is padded as little
+        as possible, and the batches can be spread across a pool of processes.
+
+        Parameters
+        ----------
+        model_name: str
+            Name of the sentence-transformers model, e.g. DEFAULT_MODEL or LIGHT_MODEL.
+        batch_size: int
+            Number of documents encoded together. Default depends on the model, see BATCH_SIZES_BY_MODEL.
+        n_jobs: int
+            Number of processes encoding in parallel, -1 uses all cpus.
+        quantize: bool
+            If True, the linear layers of the model are dynamically quantized to int8,
+            which is faster on CPU at a small cost in accuracy.
+        '''
+        self.model_name = model_name
+        self.batch_size = batch_size or BATCH_SIZES_BY_MODEL.get(model_name, DEFAULT_BATCH_SIZE)
+        self.n_jobs = os.cpu_count() if n_jobs < 0 else n_jobs
+        self.quantize = quantize
+
+        self.throughput = None
+        self._model = None
+        self._pool = None
+
+    @property
+    def name(self):
+        """Name identifying the embeddings: quantized models don't give the same vectors."""
+        return f"{self.model_name}-qint8" if self.quantize else self.model_name
+
+    def _get_model(self):
+        if self._model is None:
+            from sentence_transformers import SentenceTransformer
+
+            self._model = SentenceTransformer(self.model_name, device='cpu')
+            if self.quantize:
+                import torch
+                self._model = torch.quantization.quantize_dynamic(self._model, {torch.nn.Linear}, dtype=torch.qint8)
+        return self._model
+
+    def encode(self, corpus, batch_size=None, show_progress_bar=True):
+        '''
+        Encodes documents.
+
+        Parameters
+        ----------
+        corpus: list of str
+            The documents.
+        batch_size: int
+            Overrides the batch size of the engine.
+
+        Returns
+        -------
+        2D numpy array with one embedding per document, in corpus order.
+        '''
+        batch_size = batch_size or self.batch_size
+        model = self._get_model()
+
+        #sort by length, so that documents of similar length are batched together
+        order = np.argsort([len(doc) for doc in corpus], kind='stable')
+        sorted_corpus = [corpus[i] for i in order]
+
+        start = time.perf_counter()
+        if self.n_jobs > 1 and len(corpus) > batch_size * self.n_jobs:
+            if self._pool is None:
+                self._pool = model.start_multi_process_pool(['cpu'] * self.n_jobs)
+            sorted_embeddings = model.encode_multi_process(sorted_corpus, self._pool, batch_size=batch_size)
+        else:
+            sorted_embeddings = model.encode(sorted_corpus, batch_size=batch_size, show_progress_bar=show_progress_bar)
+        elapsed = time.perf_counter() - start
+
+        self.throughput = len(corpus) / elapsed if elapsed > 0 else None
+        if self.throughput is not None:
+            logger.info(f"Embedding --> {len(corpus)} docs in {elapsed:.1f}s ({self.throughput:.0f} docs/sec)")
+
+        embeddings = np.empty_like(sorted_embeddings)
+        embeddings[order] = sorted_embeddings
+        return embeddings
+
+    def close(self):
+        """Stops the pool of processes, if any."""
+        if self._pool is not None:
+            self._model.stop_multi_process_pool(self._pool)
+            self._pool = None
+
+
+def embeddings_paths(model_directory, model_timestamp):
+    """Returns the paths of the binary embeddings file and of its metadata header."""
+    model_directory = Path(model_directory)
+    return (model_directory / f"embeddings_{model_timestamp}.npy",
+            model_directory / f"embeddings_{model_timestamp}.meta.json")
+
+
+def save_embeddings(embeddings, model_directory, model_timestamp, model_name):
+    """Saves embeddings as a .npy file plus a small json header with dtype, shape and model name.
+
+    Quantized embeddings are saved as their int8 codes, the header keeping what is needed to dequantize them.
+
+    Args:
+        embeddings (2D array or QuantizedEmbeddings): the embeddings
+        model_directory (Path): directory where the model is saved
+        model_timestamp (str): timestamp identifying the model
+        model_name (str): name of the model that computed the embeddings
+    """
+    npy_path, meta_path = embeddings_paths(model_directory, model_timestamp)
+
+    if isinstance(embeddings, QuantizedEmbeddings):
+        array = embeddings.codes
+        metadata = {'dtype': embeddings.codes.dtype.str, **embeddings.metadata()}
+    else:
+        array = embeddings = np.asarray(embeddings)
+        metadata = {'dtype': embeddings.dtype.str, 'precision': embeddings.dtype.name}
+
+    #written to a temporary file, then moved in place: the embeddings (or a slice of them) may be memory-mapped
+    #from the very file they replace, e.g. when loaded and saved again with the same timestamp
+    tmp_path = npy_path.with_name(npy_path.name + '.tmp')
+    with open(tmp_path, 'wb') as f:
+        np.save(f, array)
+    os.replace(tmp_path, npy_path)
+
+    tmp_path = meta_path.with_name(meta_path.name + '.tmp')
+    with open(tmp_path, 'w') as f:
+        json.dump({**metadata,
+                   'shape': list(embeddings.shape),
+                   'model_name': model_name}, f)
+    os.replace(tmp_path, meta_path)
+
+
+def load_embeddings(model_directory, model_timestamp):
+    """Loads saved embeddings, memory-mapped so that opening them costs nearly nothing.
+
+    Falls back to the legacy json lines format if no binary file exists.
+
+    Args:
+        model_directory (Path): directory where the model is saved
+        model_timestamp (str): timestamp identifying the model
+
+    Returns:
+        tuple: the embeddings (read-only numpy memmap, QuantizedEmbeddings over a memmap if they were
+        saved quantized, or numpy array for legacy files) and their metadata (dict, empty for legacy files)
+    """
+    npy_path, meta_path = embeddings_paths(model_directory, model_timestamp)
+
+    if npy_path.exists():
+        embeddings = np.load(npy_path, mmap_mode='r')
+        metadata = json.loads(meta_path.read_text()) if meta_path.exists() else {}
+        if metadata.get('precision') == 'int8':
+            embeddings = QuantizedEmbeddings.from_metadata(embeddings, metadata)
+        return embeddings, metadata
+
+    json_path = Path(model_directory) / f"embeddings_{model_timestamp}.json"
+    warnings.warn(f"Loading legacy json embeddings {json_path.name}, convert them with convert_json_embeddings for fast loading.")
+    return _read_json_embeddings(json_path), {}
+
+
+def convert_json_embeddings(model_directory, model_timestamp, model_name=None):
+    """One-off converter of legacy json lines embeddings to the binary format.
+
+    Args:
+        model_directory (Path): directory where the model is saved
+        model_timestamp (str): timestamp identifying the model
+        model_name (str): name of the model that computed the embeddings, if known
+    """
+    json_path = Path(model_directory) / f"embeddings_{model_timestamp}.json"
+    save_embeddings(_read_json_embeddings(json_path), model_directory, model_timestamp, model_name)
+
+
+def embeddings_hash(embeddings, block_rows=65536):
+    """Content hash of an embeddings matrix, read block by block so memory-mapped embeddings are never fully loaded.
+
+    Args:
+        embeddings (2D array): the embeddings
+        block_rows (int): number of rows hashed at a time
+
+    Returns:
+        str: hex digest
+    """
+    if not hasattr(embeddings, 'shape'):
+        embeddings = np.asarray(embeddings)
+    h = hashlib.sha1(f"{embeddings.dtype.str}{embeddings.shape}".encode('utf-8'))
+    for i in range(0, len(embeddings), block_rows):
+        h.update(np.ascontiguousarray(embeddings[i:i + block_rows]).tobytes())
+    return h.hexdigest()
+
+
+def _read_json_embeddings(json_path):
+    # embeddings were float32 before the json round trip, so nothing is lost going back
+    return pd.read_json(json_path, lines=True).to_numpy(dtype=np.float32)
+
+
+def reduce_precision(embeddings, precision='float32'):
+    """Converts embeddings to a lower precision, to divide their size in memory and on disk.
+
+    float16 halves the size, int8 (scalar quantization, see QuantizedEmbeddings) divides it by 4.
+    Both keep cosine similarities within about 1e-3 of the float32 ones.
+
+    Args:
+        embeddings (2D array or QuantizedEmbeddings): the embeddings
+        precision (str): one of EMBEDDING_PRECISIONS
+
+    Returns:
+        2D numpy array, or QuantizedEmbeddings for int8
+    """
+    if precision not in EMBEDDING_PRECISIONS:
+        raise ValueError(f"Unrecognized precision {precision}. Can be one of {EMBEDDING_PRECISIONS}")
+
+    if precision == 'int8':
+        return embeddings if isinstance(embeddings, QuantizedEmbeddings) else QuantizedEmbeddings.quantize(embeddings)
+    if isinstance(embeddings, QuantizedEmbeddings) or embeddings.dtype != precision:
+        return np.asarray(embeddings, dtype=precision)
+    return embeddings
+
+
+def append_embeddings(embeddings, new_embeddings, directory=None, block_rows=_BLOCK_ROWS):
+    """Appends rows to embeddings, keeping their precision and without dequantizing or loading the existing rows.
+
+    Quantized embeddings keep their scale and offset, so the new rows are quantized with them (values out of
+    the range of the existing embeddings are clipped to it). Memory-mapped embeddings are copied block by block
+    to a new memory-mapped file of the directory, named embeddings_appended_*.npy: it replaces the previous
+    appended file, if the embeddings were already one. Save them (see save_embeddings) to keep them.
+
+    Args:
+        embeddings (2D array, memmap or QuantizedEmbeddings): the existing embeddings
+        new_embeddings (2D array): the rows to append
+        directory (str or Path): where memory-mapped embeddings are appended. They are loaded in memory without it
+        block_rows (int): number of rows copied at a time
+
+    Returns:
+        2D numpy array, memmap or QuantizedEmbeddings, with the precision of embeddings
+    """
+    if isinstance(embeddings, QuantizedEmbeddings):
+        block = np.asarray(new_embeddings, dtype=np.float32)
+        new_rows = (np.clip(np.rint((block - embeddings.offset) / embeddings.scale), 0, 255) - 128).astype(np.int8)
+        rows = embeddings.codes
+    else:
+        new_rows = np.asarray(new_embeddings, dtype=embeddings.dtype)
+        rows = embeddings
+
+    if isinstance(rows, np.memmap) and directory is not None:
+        fd, path = tempfile.mkstemp(prefix='embeddings_appended_', suffix='.npy', dir=directory)
+        os.close(fd)
+        appended = np.lib.format.open_memmap(path, mode='w+', dtype=rows.dtype, shape=(len(rows) + len(new_rows), rows.shape[1]))
+        for i in range(0, len(rows), block_rows):
+            end = min(i + block_rows, len(rows))
+            appended[i:end] = rows[i:end]
+        appended[len(rows):] = new_rows
+        appended.flush()
+        #a previous append is not needed anymore, the data are mapped from the new file
+        if rows.filename and Path(rows.filename).name.startswith('embeddings_appended_'):
+            try:
+                os.remove(rows.filename)
+            except OSError:
+                pass
+    else:
+        appended = np.concatenate([rows, new_rows])
+
+    if isinstance(embeddings, QuantizedEmbeddings):
+        return QuantizedEmbeddings(appended, embeddings.scale, embeddings.offset)
+    return appended
+
+
+class QuantizedEmbeddings:
+
+    def __init__(self, codes, scale, offset):
+        '''
+        Embeddings quantized to int8 codes, one scale and offset per dimension:
+        embedding = offset + scale * (code + 128).
+
+        Slicing and indexing keep the embeddings quantized, numpy conversion
+        (e.g. np.asarray(embeddings[:1000])) dequantizes them to float32. So they can be
+        handed to code expecting a numpy array, and only the rows that are used are dequantized.
+
+        Parameters
+        ----------
+        codes: 2D int8 numpy array (or memmap)
+            The quantized embeddings.
+        scale, offset: 1D float32 numpy arrays
+            The quantization of each dimension.
+        '''
+        self.codes = codes
+        self.scale = np.asarray(scale, dtype=np.float32)
+        self.offset = np.asarray(offset, dtype=np.float32)
+
+    @classmethod
+    def quantize(cls, embeddings, block_rows=_BLOCK_ROWS):
+        '''
+        Quantizes embeddings, mapping the range of each dimension to the 256 int8 values.
+        Embeddings are read block by block, so memory-mapped embeddings are never fully loaded.
+        '''
+        low = np.full(embeddings.shape[1], np.inf, dtype=np.float32)
+        high = np.full(embeddings.shape[1], -np.inf, dtype=np.float32)
+        for i in range(0, len(embeddings), block_rows):
+            block = np.asarray(embeddings[i:i + block_rows], dtype=np.float32)
+            low = np.minimum(low, block.min(axis=0))
+            high = np.maximum(high, block.max(axis=0))
+
+        scale = np.maximum(high - low, 1e-12) / 255
+        codes = np.empty(embeddings.shape, dtype=np.int8)
+        for i in range(0, len(embeddings), block_rows):
+            block = np.asarray(embeddings[i:i + block_rows], dtype=np.float32)
+            codes[i:i + block_rows] = np.clip(np.rint((block - low) / scale), 0, 255) - 128
+        return cls(codes, scale, low)
+
+    @classmethod
+    def from_metadata(cls, codes, metadata):
+        return cls(codes, metadata['scale'], metadata['offset'])
+
+    def metadata(self):
+        '''
+        Returns what is needed, besides the codes, to dequantize the embeddings.
+        '''
+        return {'precision': 'int8', 'scale': self.scale.tolist(), 'offset': self.offset.tolist()}
+
+    def dequantize(self, dtype=np.float32):
+        return (self.offset + self.scale * (self.codes.astype(np.float32) + 128)).astype(dtype, copy=False)
+
+    def __array__(self, dtype=None, copy=None):
+        return self.dequantize(dtype or np.float32)
+
+    def __getitem__(self, key):
+        if isinstance(key, tuple):
+            #indexing dimensions: select the rows, then dequantize them
+            rows = self[key[0]]
+            return np.asarray(rows)[(slice(None),) + key[1:]] if isinstance(rows, QuantizedEmbeddings) else rows[key[1:]]
+
+        codes = self.codes[key]
+        if codes.ndim == 1:
+            #a single embedding
+            return self.offset + self.scale * (codes.astype(np.float32) + 128)
+        return QuantizedEmbeddings(codes, self.scale, self.offset)
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def shape(self):
+        return self.codes.shape
+
+    @property
+    def ndim(self):
+        return self.codes.ndim
+
+    @property
+    def dtype(self):
+        #the dtype of the dequantized embeddings
+        return np.dtype(np.float32)
+
+    @property
+    def nbytes(self):
+        return self.codes.nbytes + self.scale.nbytes + self.offset.nbytes
+
+
+class EmbeddingCache:
+
+    def __init__(self, path, max_size_bytes=DEFAULT_MAX_SIZE_BYTES):
+        '''
+        A persistent, content-addressed cache of document embeddings.
+
+        Embeddings are keyed by (model name, hash of the cleaned text), so a rerun on mostly
+        unchanged data only needs to encode the new documents. When the cache grows beyond
+        max_size_bytes the least recently used embeddings are evicted.
+
+        Parameters
+        ----------
+        path: str or Path
+            Directory where the cache is stored. Created if it does not exist.
+        max_size_bytes: int
+            Maximum size of the stored vectors. Default is 2GB.
+        '''
+        self.path = Path(path)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.max_size_bytes = max_size_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._conn = sqlite3.connect(self.path / "embeddings.sqlite")
+        self._conn.execute("""CREATE TABLE IF NOT EXISTS embeddings (
+                                model TEXT NOT NULL,
+                                key TEXT NOT NULL,
+                                dtype TEXT NOT NULL,
+                                vector BLOB NOT NULL,
+                                nbytes INTEGER NOT NULL,
+                                last_used REAL NOT NULL,
+                                PRIMARY KEY (model, key))""")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS last_used_idx ON embeddings (last_used)")
+        self._conn.commit()
+
+    def __len__(self):
+        return self._conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+    def size_bytes(self):
+        '''
+        Returns the total size of the stored vectors.
+        '''
+        return self._conn.execute("SELECT COALESCE(SUM(nbytes), 0) FROM embeddings").fetchone()[0]
+
+    def stats(self):
+        '''
+        Returns the hit/miss/eviction counters of this session plus the current cache size.
+        '''
+        return {'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'entries': len(self),
+                'size_bytes': self.size_bytes()}
+
+    def get(self, model_name, keys):
+        '''
+        Looks up embeddings in the cache.
+
+        Parameters
+        ----------
+        model_name: str
+            Name of the model that computed the embeddings.
+        keys: list of str
+            Content hashes of the documents, see text_hash.
+
+        Returns
+        -------
+        dict mapping each key found in the cache to its embedding.
+        '''
+        found = {}
+        keys = list(set(keys))
+        now = time.time()
+        for i in range(0, len(keys), _SQL_CHUNK):
+            chunk = keys[i:i + _SQL_CHUNK]
+            placeholders = ','.join('?' * len(chunk))
+            rows = self._conn.execute(f"SELECT key, dtype, vector FROM embeddings WHERE model = ? AND key IN ({placeholders})",
+                                      [model_name, *chunk]).fetchall()
+            for key, dtype, vector in rows:
+                found[key] = np.frombuffer(vector, dtype=dtype)
+            self._conn.executemany("UPDATE embeddings SET last_used = ? WHERE model = ? AND key = ?",
+                                   [(now, model_name, key) for key, _, _ in rows])
+        self._conn.commit()
+        return found
+
+    def put(self, model_name, keys, vectors):
+        '''
+        Stores embeddings in the cache, then evicts the least recently used ones if the cache is too big.
+
+        Parameters
+        ----------
+        model_name: str
+            Name of the model that computed the embeddings.
+        keys: list of str
+            Content hashes of the documents, see text_hash.
+        vectors: 2D numpy array
+            The embeddings, one row per key.
+        '''
+        now = time.time()
+        vectors = np.asarray(vectors)
+        self._conn.executemany("INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?, ?, ?, ?)",
+                               [(model_name, key, vector.dtype.str, vector.tobytes(), vector.nbytes, now)
+                                for key, vector in zip(keys, vectors)])
+        self._conn.commit()
+        self._evict()
+
+    def _evict(self):
+        size = self.size_bytes()
+        if size <= self.max_size_bytes:
+            return
+
+        # free a bit more than needed, so we don't evict again on the next put
+        to_free = size - int(0.9 * self.max_size_bytes)
+        freed = 0
+        evicted = []
+        for model, key, nbytes in self._conn.execute("SELECT model, key, nbytes FROM embeddings ORDER BY last_used"):
+            if freed >= to_free:
+                break
+            evicted.append((model, key))
+            freed += nbytes
+
+        self._conn.executemany("DELETE FROM embeddings WHERE model = ? AND key = ?", evicted)
+        self._conn.commit()
+        self.evictions += len(evicted)
+
+    def encode(self, sentence_model, model_name, corpus, batch_size=DEFAULT_BATCH_SIZE, show_progress_bar=True):
+        '''
+        Returns the embeddings of the corpus, encoding only the documents missing from the cache.
+
+        Parameters
+        ----------
+        sentence_model: SentenceTransformer instance
+            The model used to encode the cache misses, or any object with the same encode method
+            (e.g. an EmbeddingEngine, or a sentiment scorer whose scores are cached the same way).
+        model_name: str
+            Name of the model, part of the cache key.
+        corpus: list of str
+            The documents to embed.
+        batch_size: int
+            Batch size used to encode the cache misses.
+
+        Returns
+        -------
+        2D numpy array with one embedding per document, in corpus order.
+        '''
+        keys = [text_hash(doc) for doc in corpus]
+        found = self.get(model_name, keys)
+
+        # encode each missing document once, even if it appears several times in the corpus
+        missing = {}
+        for key, doc in zip(keys, corpus):
+            if key not in found and key not in missing:
+                missing[key] = doc
+
+        n_missing = sum(key not in found for key in keys)
+        self.hits += len(keys) - n_missing
+        self.misses += n_missing
+
+        # encode and store the misses block by block, so an interrupted run keeps what it computed
+        missing_keys = list(missing.keys())
+        block_size = batch_size * _BLOCK_BATCHES
+        for i in range(0, len(missing_keys), block_size):
+            block_keys = missing_keys[i:i + block_size]
+            new_vectors = sentence_model.encode([missing[key] for key in block_keys], batch_size=batch_size,
+                                                show_progress_bar=show_progress_bar)
+            self.put(model_name, block_keys, new_vectors)
+            found.update(zip(block_keys, new_vectors))
+
+        return np.vstack([found[key] for key in keys]) if keys else np.empty((0, 0), dtype=np.float32)
+
+    def close(self):
+        self._conn.close()
+
+
+if __name__ == "__main__":
+
+    # python -m ideo_topic_modeler.embeddings <model_directory> <model_timestamp> [model_name]
+    convert_json_embeddings(*sys.argv[1:])
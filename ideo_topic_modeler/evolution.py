@@ -0,0 +1,104 @@
+import numpy as np
+import pandas as pd
+
+
+DEFAULT_FREQ = 'W'
+DEFAULT_TOP_N_WORDS = 5
+
+# number of documents vectorized at a time
+_CHUNKSIZE = 50_000
+
+
+def time_bins(dates, freq=DEFAULT_FREQ):
+    """Bins dates into time windows.
+
+    Args:
+        dates (pandas Series): the dates, or anything pandas.to_datetime can parse
+        freq (str): the window, as a pandas period alias, e.g. 'D', 'W', 'M' or '2W'
+
+    Returns:
+        pandas Series: the start of the window of each date
+    """
+    dates = pd.to_datetime(dates)
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    return dates.dt.to_period(freq).dt.start_time
+
+
+def class_tfidf(counts, idf=None):
+    """c-TF-IDF weights of the words of each class (here a topic in a time window), as in BERTopic:
+    the word counts of a class normalized by its number of words, times log(1 + average number of words per class / word count).
+
+    Args:
+        counts (scipy sparse matrix): word counts, one row per class
+        idf (1D array): the idf weights to use, e.g. those fitted by the topic model. Computed from counts by default
+
+    Returns:
+        scipy sparse matrix: the weights, one row per class
+    """
+    import scipy.sparse as sp
+
+    counts = sp.csr_matrix(counts, dtype=np.float64)
+    if idf is None:
+        word_counts = np.asarray(counts.sum(axis=0)).ravel()
+        average = counts.sum() / counts.shape[0]
+        idf = np.log(1 + average / np.maximum(word_counts, 1))
+
+    words_per_class = np.asarray(counts.sum(axis=1)).ravel()
+    tf = sp.diags(1 / np.maximum(words_per_class, 1)) @ counts
+    return tf @ sp.diags(idf)
+
+
+def top_words(weights, words, top_n=DEFAULT_TOP_N_WORDS):
+    """Returns the top_n words of each row of weights, with the highest weights first."""
+    top = []
+    for row in weights:
+        row = row.tocoo()
+        order = np.argsort(-row.data, kind='stable')[:top_n]
+        top.append([words[j] for j, weight in zip(row.col[order], row.data[order]) if weight > 0])
+    return top
+
+
+def topics_over_time(documents, topics, dates, vectorizer, freq=DEFAULT_FREQ, top_n_words=DEFAULT_TOP_N_WORDS, idf=None, chunksize=_CHUNKSIZE):
+    """Computes the frequency and the words of each topic in each time window.
+
+    The documents are vectorized with the already fitted vectorizer of the topic model, chunk by chunk, and
+    their word counts summed per (window, topic) with a single sparse product. Nothing is embedded or refitted.
+
+    Args:
+        documents (list of str): the documents, as given to the topic model
+        topics (array): the topic of each document
+        dates (pandas Series): the date of each document
+        vectorizer (CountVectorizer): the fitted vectorizer of the topic model
+        freq (str): the time window, as a pandas period alias, e.g. 'D', 'W', 'M'
+        top_n_words (int): number of words kept per topic and window
+        idf (1D array): idf weights fitted by the topic model, see class_tfidf
+        chunksize (int): number of documents vectorized at a time
+
+    Returns:
+        pandas DataFrame: one row per window and topic with date (start of the window), topic, count,
+        frequency (share of the documents of the window) and words
+    """
+    import scipy.sparse as sp
+
+    groups = pd.DataFrame({'date': time_bins(pd.Series(dates).reset_index(drop=True), freq),
+                           'topic': np.asarray(topics)})
+    group_ids = groups.groupby(['date', 'topic'], sort=True).ngroup().to_numpy()
+    result = groups.groupby(['date', 'topic'], sort=True).size().reset_index(name='count')
+    result['frequency'] = result['count'] / result.groupby('date')['count'].transform('sum')
+
+    #word counts of each group, accumulated over chunks of documents
+    counts = None
+    for start in range(0, len(documents), chunksize):
+        X = vectorizer.transform(documents[start:start + chunksize])
+        ids = group_ids[start:start + X.shape[0]]
+        membership = sp.csr_matrix((np.ones(len(ids)), (ids, np.arange(len(ids)))), shape=(len(result), len(ids)))
+        chunk_counts = membership @ X
+        counts = chunk_counts if counts is None else counts + chunk_counts
+
+    if counts is None:
+        result['words'] = [[] for _ in range(len(result))]
+        return result
+
+    result['words'] = top_words(class_tfidf(counts, idf), vectorizer.get_feature_names_out(), top_n_words)
+    return result
@@ -0,0 +1,166 @@
+import functools
+import json
+import logging
+import os
+import resource
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime
+
+
+logger = logging.getLogger(__name__)
+
+
+def rss_bytes():
+    """Returns the resident memory of the process."""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        #peak of the process instead of current value, in kB on linux and bytes on macos
+        rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return rss if sys.platform == 'darwin' else rss * 1024
+
+
+def cpu_seconds():
+    """Returns the cpu time used by the process and its finished child processes (e.g. process pools)."""
+    children = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return time.process_time() + children.ru_utime + children.ru_stime
+
+
+class PeakMemory:
+    '''
+    Samples the resident memory of the process in a background thread, to measure the peak of a block of code.
+
+    with PeakMemory() as memory:
+        ...
+    memory.peak, memory.added_bytes
+    '''
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.start = self.peak = 0
+        self._stop = threading.Event()
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, rss_bytes())
+
+    def __enter__(self):
+        self.start = self.peak = rss_bytes()
+        self._thread = threading.Thread(target=self._sample, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *args):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, rss_bytes())
+
+    @property
+    def added_bytes(self):
+        return self.peak - self.start
+
+
+class Instrumentation:
+
+    def __init__(self, callback=None, metrics_path=None, log_level=logging.INFO, sample_interval=0.01):
+        '''
+        Records the wall time, cpu time, peak memory and row counts of every pipeline stage.
+
+        Each finished stage is logged on the ideo_topic_modeler.instrumentation logger, passed to the callback
+        and appended to the metrics file if there are any. All the records are kept in self.records,
+        and can be saved with the model artifacts (see save).
+
+        Parameters
+        ----------
+        callback: callable
+            Called with the record (a dict) of each finished stage.
+        metrics_path: str or Path
+            Json lines file where each finished stage is appended, so a crashed run keeps the metrics of its finished stages.
+        log_level: int
+            Logging level of the stage records.
+        sample_interval: float
+            Seconds between two samples of the resident memory.
+        '''
+        self.callback = callback
+        self.metrics_path = metrics_path
+        self.log_level = log_level
+        self.sample_interval = sample_interval
+        self.records = []
+        self._stack = []
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        '''
+        Measures a stage of the pipeline.
+
+        Parameters
+        ----------
+        name: str
+            Name of the stage.
+        rows_in: int
+            Number of rows the stage starts with, if known.
+
+        Yields
+        ------
+        The record of the stage, a dict whose 'rows_out' can be set by the stage.
+        '''
+        record = {'stage': name, 'parent': self._stack[-1] if self._stack else None,
+                  'started': datetime.now().isoformat(timespec='seconds'), 'rows_in': rows_in, 'rows_out': None}
+        self._stack.append(name)
+        start_wall, start_cpu = time.perf_counter(), cpu_seconds()
+        try:
+            with PeakMemory(self.sample_interval) as memory:
+                yield record
+        finally:
+            self._stack.pop()
+            record.update({'wall_seconds': time.perf_counter() - start_wall,
+                           'cpu_seconds': cpu_seconds() - start_cpu,
+                           'peak_rss_mb': memory.peak / 1024**2,
+                           'added_rss_mb': memory.added_bytes / 1024**2})
+            self._emit(record)
+
+    def _emit(self, record):
+        self.records.append(record)
+
+        rows = '' if record['rows_in'] is None and record['rows_out'] is None else f", rows {record['rows_in']} -> {record['rows_out']}"
+        logger.log(self.log_level, f"{record['stage']}: {record['wall_seconds']:.2f}s wall, {record['cpu_seconds']:.2f}s cpu, "
+                                   f"peak rss {record['peak_rss_mb']:.0f}MB{rows}")
+
+        if self.callback is not None:
+            self.callback(record)
+        if self.metrics_path is not None:
+            with open(self.metrics_path, 'a') as f:
+                f.write(json.dumps(record) + '\n')
+
+    def save(self, path):
+        '''
+        Saves all the records as a json list, e.g. next to the model artifacts.
+        '''
+        with open(path, 'w') as f:
+            json.dump(self.records, f, indent=2)
+
+
+def _row_count(model):
+    data = getattr(model, 'data', None)
+    return None if data is None else len(data)
+
+
+def instrumented(name):
+    """Decorator measuring a model method as a pipeline stage, through the instrumentation of the model.
+    The row counts are the length of the model's data before and after the stage.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            instrumentation = getattr(self, 'instrumentation', None)
+            if instrumentation is None:
+                return method(self, *args, **kwargs)
+            with instrumentation.stage(name, rows_in=_row_count(self)) as record:
+                result = method(self, *args, **kwargs)
+                record['rows_out'] = _row_count(self)
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,95 @@
+import os
+import re
+from functools import lru_cache
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from ideo_topic_modeler.utils import process_context, DEFAULT_CHUNKSIZE
+
+
+@lru_cache(maxsize=1024)
+def keyword_pattern(keyword):
+    """Compiles the search pattern of a keyword, once per distinct keyword.
+
+    For a keyword like 'wellness goal', we do an exact search, for a keyword like 'wellness+goal' we search for either words.
+
+    Args:
+        keyword (str): keyword of interest
+
+    Returns:
+        compiled regex, to be searched in lowercase text
+    """
+    return re.compile(re.sub(r'\+', '|', keyword).lower())
+
+
+def sentences_around_keyword(text, keyword, window=1):
+    """Returns the sentences of a text containing the keyword and those around it.
+
+    Args:
+        text (str): free text
+        keyword (str): keyword of interest
+        window (int): number of sentences to keep before and after each sentence with the keyword
+
+    Returns:
+        str: the selected sentences, in their original order and without repetitions, joined by '.'
+    """
+    pattern = keyword_pattern(keyword)
+
+    #split the body in a list of sentences
+    text_list = text.split('.')
+    last = len(text_list) - 1
+
+    #collect the positions of the sentences with the keyword of interest and those around it.
+    #Visiting them in order keeps the sentences in their original order.
+    selected = set()
+    for n, b in enumerate(text_list):
+        if pattern.search(b.lower()):
+            selected.update(range(max(0, n - window), min(last, n + window) + 1))
+
+    #remove duplicated sentences
+    seen = set()
+    body_light = []
+    for n in sorted(selected):
+        if text_list[n] not in seen:
+            seen.add(text_list[n])
+            body_light.append(text_list[n])
+
+    return '.'.join(body_light)
+
+
+def _sentences_around_keywords_chunk(texts, keywords, window):
+    return [sentences_around_keyword(text, keyword, window) for text, keyword in zip(texts, keywords)]
+
+
+def sentences_around_keywords(texts, keywords, window=1, n_jobs=1, chunksize=DEFAULT_CHUNKSIZE):
+    """Applies sentences_around_keyword to every row, optionally on a process pool.
+
+    Args:
+        texts (pandas Series): the texts
+        keywords (pandas Series): the keyword of each text
+        window (int): number of sentences to keep before and after each sentence with the keyword
+        n_jobs (int): number of worker processes, -1 uses all cpus
+        chunksize (int): number of rows sent to a worker at a time
+
+    Returns:
+        pandas Series: the shortened texts, with the same index as texts
+    """
+    texts_list = texts.tolist()
+    keywords_list = keywords.tolist()
+
+    if n_jobs is not None and n_jobs < 0:
+        n_jobs = os.cpu_count()
+
+    if n_jobs is None or n_jobs == 1 or len(texts_list) <= chunksize:
+        shortened = _sentences_around_keywords_chunk(texts_list, keywords_list, window)
+    else:
+        starts = range(0, len(texts_list), chunksize)
+        with ProcessPoolExecutor(max_workers=n_jobs, mp_context=process_context()) as executor:
+            chunks = executor.map(_sentences_around_keywords_chunk,
+                                  [texts_list[i:i + chunksize] for i in starts],
+                                  [keywords_list[i:i + chunksize] for i in starts],
+                                  [window] * len(starts))
+            shortened = [t for chunk in chunks for t in chunk]
+
+    return pd.Series(shortened, index=texts.index)
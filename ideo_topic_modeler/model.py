@@ -1,14 +1,23 @@
-import re
-import warnings
+import logging
+from pathlib import Path
 
 import pandas as pd
 
 import ideo_topic_modeler.utils as ut
+import ideo_topic_modeler.cleaning as cleaning
+import ideo_topic_modeler.keywords as keywords
+from ideo_topic_modeler.utils import DEFAULT_CHUNKSIZE
+from ideo_topic_modeler.dedup import NearDuplicateFilter
+from ideo_topic_modeler.instrumentation import Instrumentation, instrumented
+
+
+logger = logging.getLogger(__name__)
 
 
 class Model:
 
-    def __init__(self, data, text_column, data_source, language='english'):
+    def __init__(self, data, text_column, data_source, language='english', n_jobs=1, keyword_window=1, near_duplicate_threshold=None,
+                 instrumentation=None):
         '''
         Initializes an instance of the Model class.
 
@@ -20,10 +29,36 @@ class Model:
             The name of the column to be used for topic analysis.
         data_source: str
             where the data are coming from
+        n_jobs: int
+            Number of processes used to clean the text. Default is 1, -1 uses all cpus.
+        keyword_window: int
+            For reddit data, number of sentences kept before and after each sentence with the keyword.
+        near_duplicate_threshold: float
+            If given, near-duplicate documents (reposts, bot comments, quote replies...) are removed
+            when their estimated similarity to an earlier document is above this threshold (e.g. 0.8).
+            The removed rows and their representatives are kept in self.near_duplicates.
+            The filter keeps about 2 kB per distinct document, see NearDuplicateFilter and its max_documents.
+        instrumentation: Instrumentation instance
+            Records the time, cpu, memory and row counts of the pipeline stages (see ideo_topic_modeler.instrumentation).
+            Pass one with a callback or a metrics file to collect them. By default they are only logged.
         '''
         
+        self.instrumentation = instrumentation if instrumentation is not None else Instrumentation()
         self.language = language
         self.data_source = data_source
+        self.n_jobs = n_jobs
+        self.keyword_window = keyword_window
+
+        self.near_duplicate_threshold = near_duplicate_threshold
+        self.near_duplicate_filter = None
+        if near_duplicate_threshold is not None:
+            self.near_duplicate_filter = NearDuplicateFilter(near_duplicate_threshold)
+        #index of each removed near-duplicate row -> index of the row representing it
+        self.near_duplicates = pd.Series(dtype=object)
+
+        # set by from_jsonl, when the cleaned data live on disk instead of in self.data
+        self.corpus_path = None
+        self.data = None
 
         if not data.empty:
             
@@ -41,6 +76,107 @@ class Model:
             self.transform_data()
             self.clean_data()
 
+    @classmethod
+    def from_jsonl(cls, path, text_column, data_source, output_path, chunksize=DEFAULT_CHUNKSIZE, **kwargs):
+        '''
+        Streaming constructor, for datasets that don't fit in memory.
+
+        The json lines file is read chunk by chunk: each chunk is transformed and cleaned,
+        duplicates are removed across chunks (keeping the first occurrence) and the cleaned
+        rows are appended to output_path. The full dataset is never loaded: the model reads
+        the cleaned corpus back from disk, chunk by chunk, through iter_data.
+
+        Parameters
+        ----------
+        path: str or Path
+            The json lines file with the raw data.
+        text_column: str
+            The name of the column to be used for modeling.
+        data_source: str
+            where the data are coming from
+        output_path: str or Path
+            The json lines file where the cleaned data are written.
+        chunksize: int
+            Number of rows processed at a time.
+        kwargs:
+            Any other argument of the model constructor (e.g. model_directory for a TopicModel).
+        '''
+        model = cls(pd.DataFrame(), text_column, data_source=data_source, **kwargs)
+        model.text_column = text_column
+        model.modeling_column = f"{text_column}_clean"
+        model.corpus_path = Path(output_path)
+
+        seen = set()
+        n_rows = 0
+        with model.instrumentation.stage('from_jsonl') as record, \
+             open(model.corpus_path, 'w') as f, pd.read_json(path, lines=True, chunksize=chunksize, dtype=False) as reader:
+            for chunk in reader:
+                if text_column not in chunk.columns:
+                    raise ValueError(f'{text_column} is not a column of provided data.')
+
+                model.data = chunk
+                model.transform_data()
+                #duplicates of rows seen in previous chunks are removed too
+                model.clean_data(seen)
+
+                if not model.data.empty:
+                    f.write(model.data.to_json(orient='records', lines=True, date_format='iso').rstrip('\n') + '\n')
+                n_rows += len(model.data)
+            record['rows_out'] = n_rows
+
+        model.data = None
+        logger.info(f"Streamed data after cleaning --> {n_rows} rows written to {model.corpus_path}")
+        return model
+
+    def _drop_seen(self, data, seen):
+        """Removes the rows of a chunk duplicating rows of previous chunks, whose hashes are in seen.
+
+        Args:
+            data (pandas DataFrame): a cleaned chunk
+            seen (set): hashes of the cleaned documents of the previous chunks, updated with the new ones
+
+        Returns:
+            pandas DataFrame: the rows of data not seen before
+        """
+        hashes = data[self.modeling_column].map(ut.text_hash)
+        is_new = ~hashes.isin(seen)
+        seen.update(hashes[is_new])
+        return data[is_new]
+
+    def _drop_near_duplicates(self, data):
+        """Removes the near duplicates of data, and of the documents filtered before (see NearDuplicateFilter)."""
+        duplicates = self.near_duplicate_filter.filter(data[self.modeling_column])
+        if len(duplicates):
+            self.near_duplicates = pd.concat([self.near_duplicates, duplicates]) if len(self.near_duplicates) else duplicates
+        logger.info(f"Removing near duplicates --> {len(duplicates)} rows removed")
+        return data.drop(index=duplicates.index)
+
+    def iter_data(self, chunksize=DEFAULT_CHUNKSIZE, columns=None):
+        '''
+        Iterates over the cleaned data in chunks. The data in memory are used when there are some
+        (e.g. loaded with their topics), otherwise the data of models built with from_jsonl are read from disk.
+
+        Parameters
+        ----------
+        chunksize: int
+            Number of rows in a chunk.
+        columns: list of str
+            Only return these columns. Default is all columns.
+
+        Yields
+        ------
+        pandas DataFrame chunks of the data.
+        '''
+        if self.data is not None:
+            data = self.data if columns is None else self.data[columns]
+            for i in range(0, len(data), chunksize):
+                yield data.iloc[i:i + chunksize]
+        elif self.corpus_path is not None:
+            with pd.read_json(self.corpus_path, lines=True, chunksize=chunksize, dtype=False) as reader:
+                for chunk in reader:
+                    yield chunk if columns is None else chunk[columns]
+
+    @instrumented('transform_data')
     def transform_data(self):
         """This function transforms the data set, including:
         - dropping missing values
@@ -49,101 +185,66 @@ class Model:
         """
         
         # Removing data with missing body
-        print(f"Size initial dataset = {len(self.data)} rows")
+        logger.info(f"Size initial dataset = {len(self.data)} rows")
         self.data = self.data.dropna(subset=[self.text_column]).copy()
-        print(f"Removing missing values --> {len(self.data)} rows")
+        logger.info(f"Removing missing values --> {len(self.data)} rows")
 
         #making a copy of the original text, before cleaning it.
         self.data[f"{self.text_column}_original"] = self.data[self.text_column]
 
         # For long posts (e.g., Reddit), we only consider the sentence with the keyword and those around it. 
         if self.data_source == 'reddit':
-            self.data.loc[:,self.text_column] = self.data[["keyword", self.text_column]].apply(lambda x: Model.return_sentences_around_keyword(x[1], x[0]), 1)
-            print(f"Using reddit --> {self.text_column} shortened...")
+            self.data.loc[:,self.text_column] = keywords.sentences_around_keywords(self.data[self.text_column], self.data["keyword"],
+                                                                                   window=self.keyword_window, n_jobs=self.n_jobs)
+            logger.info(f"Using reddit --> {self.text_column} shortened...")
 
         #add title to body
         if 'title' in self.data.columns:
             self.data.loc[:,self.text_column] = self.data['title'] + '.' + self.data[self.text_column]
 
-    def clean_data(self):
+    @instrumented('clean_data')
+    def clean_data(self, seen=None):
         """This function contains the cleaning rules
-        """
 
-        #decode ascii
-        self.data.loc[:, self.modeling_column] = self.data[self.text_column].apply(lambda x: ut.decode_ascii(x))
-
-        #removing https and addresses:
-        self.data.loc[:, self.modeling_column] = self.data[self.modeling_column].apply(lambda x: re.sub(r"http\S+", "", x, flags=re.I))
-        self.data.loc[:, self.modeling_column] = self.data[self.modeling_column].apply(lambda x: re.sub(r"www.\S+", "", x, flags=re.I))
-        self.data.loc[:, self.modeling_column] = self.data[self.modeling_column].apply(lambda x: re.sub("&amp", "", x, flags=re.IGNORECASE))
-
-        #remove some specific punctuation (we want to keep question and exclamation marks)
-        self.data.loc[:, self.modeling_column] = self.data[self.modeling_column].apply(lambda x: re.sub(r"[\|\.:;@$%_\[\]()+*#\"\/]", ' ', x, flags=re.I))
-        
-        #remove quotes and apostrophes
-        self.data.loc[:, self.modeling_column] = self.data[self.modeling_column].apply(lambda x: re.sub("(?<=[a-z])[’'](?=[a-z])", "", x, flags=re.IGNORECASE))
-
-        #remove line breaks and tabs
-        self.data.loc[:, self.modeling_column] = self.data[self.modeling_column].apply(lambda x: re.sub(r"\s+", ' ', x, flags=re.IGNORECASE))
-
-        #remove trailing spaces
-        self.data.loc[:, self.modeling_column] = self.data[self.modeling_column].apply(lambda x: x.strip())
+        Args:
+            seen (set): when cleaning a chunk of a stream, hashes of the documents of the previous chunks (see _drop_seen).
+                Their duplicates are removed before the near duplicates, like duplicates within the data.
+        """
 
-        #make text lowercase
-        self.data.loc[:, self.modeling_column] = self.data[self.modeling_column].apply(lambda x: x.lower())
+        #decode ascii, remove urls, punctuation, apostrophes and extra spaces, make text lowercase.
+        #All the rules are compiled once and run in a single pass (see ideo_topic_modeler.cleaning)
+        self.data[self.modeling_column] = cleaning.clean_series(self.data[self.text_column], n_jobs=self.n_jobs)
 
         #remove duplicates
         self.data.drop_duplicates(subset=[self.modeling_column], inplace = True)
 
         #remove data if there are now empty strings
         self.data = self.data[self.data[self.modeling_column]!='']
+
+        if seen is not None:
+            self.data = self._drop_seen(self.data, seen)
+
+        #remove near duplicates
+        if self.near_duplicate_filter is not None:
+            self.data = self._drop_near_duplicates(self.data)
         
-        print(f"Data after cleaning --> {len(self.data)} rows")
+        logger.info(f"Data after cleaning --> {len(self.data)} rows")
             
 
     @staticmethod
-    def return_sentences_around_keyword(text, keyword):
+    def return_sentences_around_keyword(text, keyword, window=1):
         """This function takes in input text, and it only 
         returns sentences containing the keyword and those around it. 
         
         Args:
             body (str): free text
             keyword (str): keyword of interest
+            window (int): number of sentences to keep before and after each sentence with the keyword
 
         Returns:
             str: sentences in the original text containing the keyword of interest and the senteces around it
         """
-        
-        #split the body in a list of sentences
-        text_list = text.split('.')  
-
-        #Find the position of the senteces with the keyword of interest
-        #For a keyword like 'wellness goal', we do an exact search, for a keyword like 'wellness+goal' we search for either words.
-        locations = [n for n, b in enumerate(text_list) if re.search(re.sub('\+', '|', keyword).lower(), b.lower())]
-
-        #collecting only the sentences containing the keyword and those around it, keeping their order.
-        body_light = []
-
-        for l in locations:
-
-            #add the sentence before if the keyword is not in the first sentence
-            if l > 0:
-                body_light.append(text_list[l-1])    
-            
-            #add the sentence with the keyword
-            body_light.append(text_list[l])
-
-            #add the sentence after, if the keyword is not in the last sentence
-            if l != len(text_list) - 1:
-                body_light.append(text_list[l+1])
-            
-        #remove duplicates that might have been introduced.
-        body_light_dedoup = []
-        for b in body_light:
-            if b not in body_light_dedoup:
-                body_light_dedoup.append(b)
-
-        return '.'.join(body_light_dedoup)
+        return keywords.sentences_around_keyword(text, keyword, window)
 
 
     def filter_data(self):
@@ -1,7 +1,14 @@
 
+import os
 import warnings
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
 
 from ideo_topic_modeler.model import Model
+from ideo_topic_modeler.utils import process_context
+from ideo_topic_modeler.instrumentation import instrumented
 
 
 try:
@@ -9,11 +16,113 @@ try:
     _use_nltk = True
 except:
     _use_nltk = False 
- 
+
+#number of documents counted by a process at a time
+DEFAULT_SHARD_SIZE = 50_000
+
+
+def document_ngrams(text, ns, stopwords):
+    '''
+    Computes the n-grams of a single document for each n in ns, tokenizing it only once.
+
+    For n = 1 tokens are lowercased before being checked against the stopwords.
+    For n > 1 each n-gram containing a stopword is omitted as a whole - so be mindful with stopwords here!
+
+    Parameters
+    ----------
+    text: str
+        The document.
+    ns: tuple of int
+        The n to compute.
+    stopwords: frozenset
+        Words to omit.
+
+    Returns
+    -------
+    dict mapping each n to the list of n-grams of the document, in order of appearance.
+    '''
+    tokens = str(text).split()
+    lowered = [token.lower() for token in tokens]
+    is_stopword = [token in stopwords for token in tokens] if max(ns) > 1 else None
+
+    ngrams = {}
+    for n in ns:
+        if n == 1:
+            ngrams[n] = [token for token in lowered if token not in stopwords]
+        else:
+            ngrams[n] = ["_".join(lowered[i:i+n]) for i in range(len(tokens)-n+1) if not any(is_stopword[i:i+n])]
+    return ngrams
+
+
+def count_ngrams(texts, ns, stopwords):
+    '''
+    Streams over the documents and accumulates the n-gram counts for each n in ns.
+
+    Parameters
+    ----------
+    texts: iterable of str
+        The documents.
+    ns: tuple of int
+        The n to compute.
+    stopwords: frozenset
+        Words to omit.
+
+    Returns
+    -------
+    dict mapping each n to a Counter of its n-grams.
+    '''
+    counts = {n: Counter() for n in ns}
+    for text in texts:
+        for n, ngrams in document_ngrams(text, ns, stopwords).items():
+            counts[n].update(ngrams)
+    return counts
+
+
+def count_ngrams_parallel(shards, ns, stopwords, n_jobs):
+    '''
+    Counts the n-grams of each shard of documents on a process pool and merges the partial counts.
+
+    At most 2 * n_jobs shards are in flight at any time, so memory stays bounded even when
+    shards are read lazily. Partial counts are merged in shard order, so the result
+    (including the order of ties in most_common) is identical to count_ngrams over all documents.
+
+    Parameters
+    ----------
+    shards: iterable of lists of str
+        The documents, split in shards.
+    ns: tuple of int
+        The n to compute.
+    stopwords: frozenset
+        Words to omit.
+    n_jobs: int
+        Number of worker processes.
+
+    Returns
+    -------
+    dict mapping each n to a Counter of its n-grams.
+    '''
+    counts = {n: Counter() for n in ns}
+
+    def merge(partial_counts):
+        for n, partial in partial_counts.items():
+            counts[n].update(partial)
+
+    with ProcessPoolExecutor(max_workers=n_jobs, mp_context=process_context()) as executor:
+        pending = deque()
+        for shard in shards:
+            pending.append(executor.submit(count_ngrams, shard, ns, stopwords))
+            if len(pending) >= 2 * n_jobs:
+                merge(pending.popleft().result())
+        while pending:
+            merge(pending.popleft().result())
+
+    return counts
+
 
 class NgramModel(Model):
 
-    def __init__(self, data, text_column, n=1, use_nltk_stopwords=True, custom_stopwords=[], language='english'):
+    def __init__(self, data, text_column, n=1, use_nltk_stopwords=True, custom_stopwords=[], language='english', data_source=None,
+                 instrumentation=None):
         '''
         Initializes an instance of the n-gram modeling class.
 
@@ -23,22 +132,28 @@ class NgramModel(Model):
             The dataframe with a column to be used for n-gram analysis.
         text_column: str
             The name of the column to be used for n-gram analysis.
-        n: int
+        n: int or list of int
             Number of words to group in an entity. Default is 1.
+            With a list (e.g. [1, 2, 3]) all the n-grams are computed in a single pass.
         use_nltk_stopwords: bool
             Whether to use nltk default stopwords list for the given language (if available). 
             To use, nltk needs to be installed and the stopwords resource downloaded with nltk.download('stopwords').
         custom_stopwords: list
             A list of user-provided words to skip in n-grams.
+        data_source: str
+            where the data are coming from
         '''
-        super(NgramModel, self).__init__(data, text_column, language)
+        super(NgramModel, self).__init__(data, text_column, data_source, language, instrumentation=instrumentation)
         
-        # check if n is int, if not convert and raise warning
+        # check if n is int (or a list of ints), if not convert and raise warning
         if isinstance(n, int):
             self.n = n
+        elif isinstance(n, (list, tuple)):
+            self.n = [int(n_i) for n_i in n]
         else:
             warnings.warn('Provided n is not an int, converting to nearest int')
             self.n = int(n)
+        self.ns = tuple(self.n) if isinstance(self.n, list) else (self.n,)
         stopwords = []
         # load stopwords from the specified package
         if use_nltk_stopwords:
@@ -52,56 +167,117 @@ class NgramModel(Model):
         if len(custom_stopwords) != 0:
             stopwords.extend(custom_stopwords)
         
-        self.stopwords = stopwords
+        # a frozenset makes every stopword check O(1)
+        self.stopwords = frozenset(stopwords)
 
-    def run(self):
+    @instrumented('ngram_counts')
+    def run(self, n_jobs=None, chunksize=DEFAULT_SHARD_SIZE):
         '''
-        Computes the n-grams, omitting stopwords. 
-        
+        Counts the n-grams, omitting stopwords. All the requested n are computed in a single pass over the data.
+
         For n > 1, if a word in the potential n-gram is a stopword, 
         the entire n-gram will not be considered, therefore an option to not use 
         stopwords or use a custom list might be preferable here. 
 
+        Parameters
+        ----------
+        n_jobs: int
+            Number of processes counting shards of the data in parallel, -1 uses all cpus.
+            Default is the n_jobs the model was initialized with. The result does not depend on it.
+        chunksize: int
+            Number of documents in a shard.
+
+        Returns
+        -------
+        n_grams: Counter, or dict of Counters
+            The n-gram frequencies. In n>1, separate words in an n-gram are joined by an underscore.
+            If the model was initialized with a list of n, a dict mapping each n to its Counter.
+        '''
+        n_jobs = self.n_jobs if n_jobs is None else n_jobs
+        if n_jobs < 0:
+            n_jobs = os.cpu_count()
+
+        # shards are produced lazily, so streamed data (see Model.from_jsonl) are never fully loaded
+        shards = self._iter_shards(chunksize)
+        if n_jobs == 1:
+            self.ngram_counts = count_ngrams((text for shard in shards for text in shard), self.ns, self.stopwords)
+        else:
+            self.ngram_counts = count_ngrams_parallel(shards, self.ns, self.stopwords, n_jobs)
+        self.n_grams = self.ngram_counts[self.ns[0]]
+
+        if isinstance(self.n, int):
+            return self.n_grams
+        return self.ngram_counts
+
+    def top_ngrams(self, k=20, n=None):
+        '''
+        Returns the k most frequent n-grams.
+
+        Parameters
+        ----------
+        k: int
+            Number of n-grams to return.
+        n: int
+            Which n to consider, one of those the model was initialized with. Default is the first one.
+
+        Returns
+        -------
+        list of (n-gram, count) tuples, most frequent first.
+        '''
+        if not hasattr(self, 'ngram_counts'):
+            self.run()
+        return self.ngram_counts[self._check_n(n)].most_common(k)
+
+    def document_frequencies(self, n=None):
+        '''
+        Returns the n-gram frequencies of each document.
+
+        Parameters
+        ----------
+        n: int
+            Which n to consider. Default is the first one the model was initialized with.
+
+        Returns
+        -------
+        pandas Series of Counters, with the same index as the data (rows with missing text are skipped).
+        '''
+        n = self._check_n(n)
+        frequencies = []
+        for chunk in self.iter_data(columns=[self.text_column]):
+            texts = chunk[self.text_column].dropna()
+            frequencies.append(pd.Series([Counter(document_ngrams(text, (n,), self.stopwords)[n]) for text in texts],
+                                         index=texts.index, dtype=object))
+        return pd.concat(frequencies) if frequencies else pd.Series(dtype=object)
+
+    def ngrams_text(self, n=None):
+        '''
+        The n-grams as a single string, as returned by older versions of run.
+
+        Parameters
+        ----------
+        n: int
+            Which n to consider. Default is the first one the model was initialized with.
+
         Returns
         -------
         ngrams_text: str
             A string of all found n-grams separated by empty space. 
             In n>1, separate words in an n-gram are joined by an underscore.
         '''
-        ngrams_text = ""
-        for val in self.data[self.text_column].dropna():
-            # typecaste each val to string
-            val = str(val)
-        
-            # split the value
-            tokens = val.split()
-            
-            if self.n == 1:
-                # only works for unigrams, check if any are stopwords and omit them
-                # before adding to the final ngrams string
-                tokens_clean = []
-                for i in range(len(tokens)):
-                    tokens[i] = tokens[i].lower()
-                    if tokens[i] not in self.stopwords:
-                        tokens_clean.append(tokens[i])
-                    else:
-                        pass
-                ngrams_text += " ".join(tokens_clean)+" "
+        n = self._check_n(n)
+        return "".join(" ".join(document_ngrams(text, (n,), self.stopwords)[n]) + " "
+                       for shard in self._iter_shards() for text in shard)
 
-            else:
-                # for n > 1, we need to make sure that we don't form n-grams with the stopwords
-                # therefore each ngram containing a stopword is omitted as a whole - so be mindful with stopwords here!
-                ngrams = []
-                for i in range(len(tokens)-self.n+1):
-                    tokens_n = tokens[i:i+self.n]
-                    if any([token_n in self.stopwords for token_n in tokens_n]) or any([token_n == ' ' for token_n in tokens_n]):
-                        pass
-                    else:
-                        ngrams.append("_".join([token.lower() for token in tokens_n]))
-                ngrams_text += " ".join(ngrams)+" "
-
-        self.n_grams = ngrams_text 
-        return ngrams_text
+    def _iter_shards(self, chunksize=DEFAULT_SHARD_SIZE):
+        for chunk in self.iter_data(chunksize, columns=[self.text_column]):
+            yield chunk[self.text_column].dropna().tolist()
+
+    def _check_n(self, n):
+        if n is None:
+            return self.ns[0]
+        if n not in self.ns:
+            raise ValueError(f"n-grams were not computed for n={n}, the model was initialized with n={self.ns}")
+        return n
 
     def plot(self, type='bar', **kwargs):
         '''
@@ -0,0 +1,193 @@
+import logging
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import pandas as pd
+
+from ideo_topic_modeler.model import Model
+from ideo_topic_modeler.instrumentation import Instrumentation
+from ideo_topic_modeler.utils import process_context
+
+
+logger = logging.getLogger(__name__)
+
+#number of chunks waiting between two stages: bounds the memory of the pipeline
+DEFAULT_QUEUE_SIZE = 2
+_DONE = object()
+
+
+def _get(items, stop):
+    """Gets an item from a queue, returning _DONE if the pipeline was stopped while waiting for one."""
+    while not stop.is_set():
+        try:
+            return items.get(timeout=0.1)
+        except queue.Empty:
+            pass
+    return _DONE
+
+
+def _put(items, item, stop):
+    """Puts an item in a bounded queue, giving up if the pipeline was stopped while waiting for room."""
+    while not stop.is_set():
+        try:
+            items.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            pass
+    return False
+
+
+class ChunkReader:
+    '''
+    Reads a json lines file chunk by chunk in a background thread, a few chunks ahead of their consumer.
+
+    for chunk in ChunkReader(path, chunksize):
+        ...
+    '''
+    def __init__(self, path, chunksize, queue_size=DEFAULT_QUEUE_SIZE):
+        self.path = path
+        self.chunksize = chunksize
+        self.busy_seconds = 0.0
+        self._chunks = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+
+    def _read(self):
+        try:
+            with pd.read_json(self.path, lines=True, chunksize=self.chunksize, dtype=False) as reader:
+                while True:
+                    start = time.perf_counter()
+                    chunk = next(reader, None)
+                    self.busy_seconds += time.perf_counter() - start
+                    if chunk is None or not _put(self._chunks, chunk, self._stop):
+                        break
+        except Exception as error:
+            #raised again in the consuming thread
+            _put(self._chunks, error, self._stop)
+        _put(self._chunks, _DONE, self._stop)
+
+    def __iter__(self):
+        thread = threading.Thread(target=self._read, daemon=True)
+        thread.start()
+        try:
+            while (chunk := self._chunks.get()) is not _DONE:
+                if isinstance(chunk, Exception):
+                    raise chunk
+                yield chunk
+        finally:
+            self._stop.set()
+            thread.join()
+
+
+class ChunkWriter:
+    '''
+    Appends chunks of data to a json lines file in a background thread, so writing overlaps the other stages.
+    The thread starts with the first chunk written. Errors of the writing thread are raised by close.
+
+    with ChunkWriter(path) as writer:
+        writer.write(chunk)
+    '''
+    def __init__(self, path, queue_size=DEFAULT_QUEUE_SIZE):
+        self.path = path
+        self.busy_seconds = 0.0
+        self._chunks = queue.Queue(maxsize=queue_size)
+        self._stop = threading.Event()
+        self._error = None
+        self._thread = None
+
+    def _write(self):
+        try:
+            with open(self.path, 'w') as f:
+                while (chunk := _get(self._chunks, self._stop)) is not _DONE:
+                    start = time.perf_counter()
+                    f.write(chunk.to_json(orient='records', lines=True, date_format='iso').rstrip('\n') + '\n')
+                    self.busy_seconds += time.perf_counter() - start
+        except Exception as error:
+            self._error = error
+            self._stop.set()
+
+    def __enter__(self):
+        return self
+
+    def write(self, chunk):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._write, daemon=True)
+            self._thread.start()
+        if not chunk.empty and not _put(self._chunks, chunk, self._stop):
+            raise self._error
+
+    def close(self):
+        if self._thread is None:
+            #nothing was written
+            open(self.path, 'w').close()
+            return
+        _put(self._chunks, _DONE, self._stop)
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is None:
+            self.close()
+        elif self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+
+
+def _clean_chunk(chunk, text_column, data_source, language, keyword_window):
+    """Worker task: transforms and cleans a chunk of raw data (see Model.transform_data and Model.clean_data)."""
+    if text_column not in chunk.columns:
+        raise ValueError(f'{text_column} is not a column of provided data.')
+    start = time.perf_counter()
+    #the records of the worker would be lost with it, they are only logged at debug level
+    model = Model(chunk, text_column, data_source, language, keyword_window=keyword_window,
+                  instrumentation=Instrumentation(log_level=logging.DEBUG))
+    data = model.data if not chunk.empty else chunk
+    return data, time.perf_counter() - start
+
+
+def clean_chunks(chunks, text_column, data_source, language='english', keyword_window=1, n_workers=2,
+                 queue_size=DEFAULT_QUEUE_SIZE, timings=None):
+    """Cleans chunks of raw data on a pool of processes, a few chunks ahead of their consumer.
+
+    The chunks are yielded in their original order. At most n_workers + queue_size chunks are being cleaned
+    or waiting to be consumed at any time.
+
+    Args:
+        chunks (iterable): pandas DataFrame chunks of raw data
+        text_column (str): the name of the column to be used for modeling
+        data_source (str): where the data are coming from
+        language (str): language of the documents
+        keyword_window (int): for reddit data, number of sentences kept around each sentence with the keyword
+        n_workers (int): number of cleaning processes
+        queue_size (int): number of cleaned chunks waiting for their consumer
+        timings (dict): if given, 'clean' is incremented by the cleaning time of the workers
+
+    Yields:
+        pandas DataFrame: cleaned chunks, with exact duplicates removed within each chunk only
+    """
+    #the reading and writing threads are running when the workers start, so they are not forked
+    with ProcessPoolExecutor(max_workers=n_workers, mp_context=process_context()) as executor:
+        pending = deque()
+        chunks = iter(chunks)
+        exhausted = False
+        while True:
+            while not exhausted and len(pending) < n_workers + queue_size:
+                chunk = next(chunks, None)
+                if chunk is None:
+                    exhausted = True
+                else:
+                    pending.append(executor.submit(_clean_chunk, chunk, text_column, data_source, language, keyword_window))
+            if not pending:
+                break
+            try:
+                data, seconds = pending.popleft().result()
+            except BaseException:
+                for future in pending:
+                    future.cancel()
+                raise
+            if timings is not None:
+                timings['clean'] = timings.get('clean', 0.0) + seconds
+            yield data
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+
+
+# Bounds on what is sent to the browser, whatever the size of the corpus.
+# Altair refuses datasets above 5000 rows by default.
+DEFAULT_MAX_POINTS = 5000
+DEFAULT_TOOLTIP_CHARS = 200
+DEFAULT_BINS = 40
+
+
+def topic_counts(data):
+    """Pre-aggregates the number of documents per topic, for the topic frequency bar chart.
+
+    Args:
+        data (pandas DataFrame): the enriched data, with topic and topic_name columns
+
+    Returns:
+        pandas DataFrame: one row per topic with topic, topic_name and count, most frequent first
+    """
+    return (data.groupby(['topic', 'topic_name']).size()
+                .reset_index(name='count')
+                .sort_values('count', ascending=False, kind='mergesort')
+                .reset_index(drop=True))
+
+
+def binned_counts(values, bins=DEFAULT_BINS, value_range=None):
+    """Pre-aggregates values into a histogram, for distribution charts of any number of documents.
+
+    Args:
+        values (array-like): the values, e.g. a column of scores
+        bins (int): number of bins of equal width
+        value_range (tuple): lower and upper bounds of the bins. Default is the range of the values
+
+    Returns:
+        pandas DataFrame: one row per bin with bin_start, bin_end and count
+    """
+    counts, edges = np.histogram(np.asarray(values, dtype=np.float64), bins=bins, range=value_range)
+    return pd.DataFrame({'bin_start': edges[:-1], 'bin_end': edges[1:], 'count': counts})
+
+
+def stratified_sample(data, max_points=DEFAULT_MAX_POINTS, by='topic', random_state=42):
+    """Samples at most max_points rows, so that small topics remain visible: every group gets one point,
+    and the other points are allocated to the groups proportionally to their size. When there are more groups
+    than points, only the largest max_points groups get one.
+
+    Args:
+        data (pandas DataFrame): the rows to sample
+        max_points (int): the point budget
+        by (str): column defining the groups
+        random_state (int): seed of the sampling
+
+    Returns:
+        pandas DataFrame: the sampled rows, in their original order
+    """
+    if len(data) <= max_points:
+        return data
+
+    sizes = data[by].value_counts()
+    if len(sizes) >= max_points:
+        #sorted by decreasing size
+        quota = pd.Series(np.arange(len(sizes)) < max_points, index=sizes.index).astype(int)
+    else:
+        #never more than the size of a group, as there are fewer points left than rows
+        spare = max_points - len(sizes)
+        quota = 1 + np.floor((sizes - 1) * spare / (len(data) - len(sizes))).astype(int)
+
+    #shuffle the rows, then keep the first quota rows of each group
+    order = np.random.default_rng(random_state).permutation(len(data))
+    groups = data[by].iloc[order]
+    rank = groups.groupby(groups).cumcount().to_numpy()
+    keep = rank < groups.map(quota).to_numpy()
+
+    return data.iloc[np.sort(order[keep])]
+
+
+def truncate_text(series, max_chars=DEFAULT_TOOLTIP_CHARS):
+    """Truncates texts longer than max_chars, marking the cut with '...'.
+
+    Args:
+        series (pandas Series): the texts
+        max_chars (int): maximum length of the truncated texts
+
+    Returns:
+        pandas Series: the truncated texts
+    """
+    series = series.fillna('').astype(str)
+    too_long = series.str.len() > max_chars
+    return series.where(~too_long, series.str.slice(0, max_chars - 3) + '...')
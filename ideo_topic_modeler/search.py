@@ -0,0 +1,145 @@
+import json
+from pathlib import Path
+
+import numpy as np
+
+try:
+    import hnswlib
+    _use_hnswlib = True
+except ImportError:
+    _use_hnswlib = False
+
+
+#rows of embeddings handled at once by the exact search and the index build
+_BLOCK_ROWS = 65536
+
+
+class EmbeddingIndex:
+
+    def __init__(self, method='auto', ef_construction=200, M=16, ef_search=64, n_jobs=-1):
+        '''
+        Nearest-neighbor index over embeddings, by cosine similarity.
+
+        With method 'hnsw' an approximate HNSW graph (hnswlib) answers queries in milliseconds
+        even over millions of vectors. With method 'exact' queries scan the embeddings block by block.
+
+        Parameters
+        ----------
+        method: str
+            One of ['auto', 'hnsw', 'exact']. 'auto' uses hnsw if hnswlib is installed, exact otherwise.
+        ef_construction, M: int
+            HNSW build parameters: higher values give a better graph but a slower build.
+        ef_search: int
+            HNSW query parameter: higher values give more accurate but slower queries.
+        n_jobs: int
+            Number of threads used to build the HNSW graph, -1 uses all cpus.
+        '''
+        if method == 'auto':
+            method = 'hnsw' if _use_hnswlib else 'exact'
+        if method not in ['hnsw', 'exact']:
+            raise ValueError(f"Unrecognized index method {method}. Can be one of ['auto', 'hnsw', 'exact']")
+        if method == 'hnsw' and not _use_hnswlib:
+            raise ImportError("hnswlib package not installed. Install hnswlib or use method='exact'")
+
+        self.method = method
+        self.ef_construction = ef_construction
+        self.M = M
+        self.ef_search = ef_search
+        self.n_jobs = n_jobs
+
+        self._index = None
+        self._embeddings = None
+        self._norms = None
+
+    def build(self, embeddings):
+        '''
+        Builds the index over the embeddings (one row per document).
+        '''
+        self._embeddings = embeddings
+        if self.method == 'hnsw':
+            self._index = hnswlib.Index(space='cosine', dim=embeddings.shape[1])
+            self._index.init_index(max_elements=len(embeddings), ef_construction=self.ef_construction, M=self.M)
+            self._index.set_num_threads(self.n_jobs)
+            for i in range(0, len(embeddings), _BLOCK_ROWS):
+                block = np.asarray(embeddings[i:i + _BLOCK_ROWS], dtype=np.float32)
+                self._index.add_items(block, np.arange(i, i + len(block)))
+            self._index.set_ef(self.ef_search)
+        else:
+            self._norms = np.concatenate([np.linalg.norm(np.asarray(embeddings[i:i + _BLOCK_ROWS], dtype=np.float32), axis=1)
+                                          for i in range(0, len(embeddings), _BLOCK_ROWS)])
+        return self
+
+    def query(self, vectors, k=10):
+        '''
+        Finds the k nearest documents of each query vector.
+
+        Parameters
+        ----------
+        vectors: 1D or 2D numpy array
+            The query vector(s).
+        k: int
+            Number of neighbors.
+
+        Returns
+        -------
+        indices: 2D numpy array
+            Positions of the neighbors in the embeddings, most similar first, one row per query.
+        scores: 2D numpy array
+            Their cosine similarities, 1 being the most similar.
+        '''
+        vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+        k = min(k, len(self._embeddings))
+
+        if self.method == 'hnsw':
+            self._index.set_ef(max(self.ef_search, k))
+            indices, distances = self._index.knn_query(vectors, k=k)
+            return indices.astype(np.int64), 1 - distances
+
+        vectors = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+        best_scores = np.full((len(vectors), 0), -np.inf, dtype=np.float32)
+        best_indices = np.zeros((len(vectors), 0), dtype=np.int64)
+        for i in range(0, len(self._embeddings), _BLOCK_ROWS):
+            block = np.asarray(self._embeddings[i:i + _BLOCK_ROWS], dtype=np.float32)
+            scores = (vectors @ block.T) / np.maximum(self._norms[i:i + len(block)], 1e-12)
+
+            #keep the k best of the block and of the previous blocks
+            scores = np.hstack([best_scores, scores])
+            indices = np.hstack([best_indices, np.broadcast_to(np.arange(i, i + len(block)), (len(vectors), len(block)))])
+            top = np.argpartition(-scores, min(k, scores.shape[1] - 1), axis=1)[:, :k]
+            best_scores = np.take_along_axis(scores, top, axis=1)
+            best_indices = np.take_along_axis(indices, top, axis=1)
+
+        order = np.argsort(-best_scores, axis=1, kind='stable')
+        return np.take_along_axis(best_indices, order, axis=1), np.take_along_axis(best_scores, order, axis=1)
+
+    def save(self, path):
+        '''
+        Saves the index. The exact index has nothing to save but its settings: it is rebuilt from the embeddings.
+        '''
+        path = Path(path)
+        path.mkdir(parents=True, exist_ok=True)
+        with open(path / "index.json", 'w') as f:
+            json.dump({'method': self.method, 'ef_construction': self.ef_construction, 'M': self.M,
+                       'ef_search': self.ef_search, 'count': len(self._embeddings)}, f)
+        if self.method == 'hnsw':
+            self._index.save_index(str(path / "hnsw.bin"))
+
+    @classmethod
+    def load(cls, path, embeddings):
+        '''
+        Loads an index saved with save, for the same embeddings it was built from.
+        '''
+        path = Path(path)
+        with open(path / "index.json") as f:
+            settings = json.load(f)
+        if settings['count'] != len(embeddings):
+            raise ValueError(f"The index was built over {settings['count']} embeddings, not {len(embeddings)}.")
+
+        index = cls(settings['method'], settings['ef_construction'], settings['M'], settings['ef_search'])
+        if index.method == 'hnsw':
+            index._embeddings = embeddings
+            index._index = hnswlib.Index(space='cosine', dim=embeddings.shape[1])
+            index._index.load_index(str(path / "hnsw.bin"), max_elements=len(embeddings))
+            index._index.set_ef(index.ef_search)
+            return index
+        return index.build(embeddings)
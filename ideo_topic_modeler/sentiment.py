@@ -1,19 +1,340 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
 from ideo_topic_modeler.model import Model
+from ideo_topic_modeler.utils import process_context
+from ideo_topic_modeler.embeddings import EmbeddingCache
+from ideo_topic_modeler.instrumentation import instrumented
+from ideo_topic_modeler.plotting import binned_counts
+
+
+logger = logging.getLogger(__name__)
+
+
+#the scores of a document, the last one being the overall sentiment between -1 (negative) and 1 (positive)
+SCORE_COLUMNS = ['sentiment_negative', 'sentiment_neutral', 'sentiment_positive', 'sentiment']
+#usual thresholds of the overall sentiment for positive and negative documents
+POSITIVE_THRESHOLD = 0.05
+NEGATIVE_THRESHOLD = -0.05
+
+DEFAULT_TRANSFORMER = "distilbert-base-uncased-finetuned-sst-2-english"
+DEFAULT_BATCH_SIZE = 32
+#number of documents scored at a time, smaller than the chunks of the other stages as scoring is slow
+DEFAULT_SCORING_CHUNKSIZE = 10_000
+
+# per-process scorers, loaded once by each worker of a pool. Transformer pipelines are kept per model name,
+# so scorers of different models in the same process don't share one
+_vader_analyzer = None
+_transformer_pipelines = {}
+
+
+def _vader_scores(texts):
+    global _vader_analyzer
+    if _vader_analyzer is None:
+        from vaderSentiment.vaderSentiment import SentimentIntensityAnalyzer
+        _vader_analyzer = SentimentIntensityAnalyzer()
+
+    scores = np.empty((len(texts), len(SCORE_COLUMNS)), dtype=np.float32)
+    for i, text in enumerate(texts):
+        polarity = _vader_analyzer.polarity_scores(text)
+        scores[i] = polarity['neg'], polarity['neu'], polarity['pos'], polarity['compound']
+    return scores
+
+
+def _load_transformer(model_name):
+    if model_name not in _transformer_pipelines:
+        from transformers import pipeline
+        _transformer_pipelines[model_name] = pipeline("sentiment-analysis", model=model_name, device=-1)
+    return _transformer_pipelines[model_name]
+
+
+def _transformer_scores(texts, batch_size, model_name):
+    scores = np.zeros((len(texts), len(SCORE_COLUMNS)), dtype=np.float32)
+    outputs = _load_transformer(model_name)(texts, batch_size=batch_size, truncation=True, top_k=None)
+    for i, labels in enumerate(outputs):
+        for label in labels:
+            name = label['label'].upper()
+            column = 0 if name.startswith('NEG') else 2 if name.startswith('POS') else 1
+            scores[i, column] = label['score']
+    scores[:, 3] = scores[:, 2] - scores[:, 0]
+    return scores
+
+
+def _chunks(texts, chunksize):
+    return [texts[i:i + chunksize] for i in range(0, len(texts), chunksize)]
+
+
+class LexiconScorer:
+
+    name = 'vader'
+
+    def __init__(self, n_jobs=1, chunksize=DEFAULT_SCORING_CHUNKSIZE):
+        '''
+        Lexicon and rule based sentiment scorer (VADER), fully offline and fast on CPU.
+        Needs the vaderSentiment package, which ships its lexicon.
+
+        Parameters
+        ----------
+        n_jobs: int
+            Number of processes scoring chunks of documents in parallel, -1 uses all cpus.
+        chunksize: int
+            Number of documents sent to a process at a time.
+        '''
+        self.n_jobs = os.cpu_count() if n_jobs < 0 else n_jobs
+        self.chunksize = chunksize
+
+    def encode(self, corpus, batch_size=None, show_progress_bar=False):
+        '''
+        Scores documents. Named like SentenceTransformer.encode, so scores can be cached in an EmbeddingCache.
+
+        Returns
+        -------
+        2D numpy array with the SCORE_COLUMNS of each document, in corpus order.
+        '''
+        corpus = list(corpus)
+        if self.n_jobs == 1 or len(corpus) <= self.chunksize:
+            return _vader_scores(corpus)
+
+        with ProcessPoolExecutor(max_workers=self.n_jobs, mp_context=process_context()) as executor:
+            return np.vstack(list(executor.map(_vader_scores, _chunks(corpus, self.chunksize))))
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+class TransformerScorer:
+
+    def __init__(self, model_name=DEFAULT_TRANSFORMER, batch_size=DEFAULT_BATCH_SIZE, n_jobs=1):
+        '''
+        Sentiment classifier based on a transformers model, more accurate than the lexicon but much slower.
+        Documents are classified in batches, optionally on a pool of processes each holding a copy of the model.
+        The pool is kept between calls of encode until close, or the end of a with block.
+
+        Parameters
+        ----------
+        model_name: str
+            A transformers sentiment-analysis model, with NEGATIVE/POSITIVE (and optionally NEUTRAL) labels.
+        batch_size: int
+            Number of documents classified together.
+        n_jobs: int
+            Number of processes, -1 uses all cpus.
+        '''
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.n_jobs = os.cpu_count() if n_jobs < 0 else n_jobs
+        self._executor = None
+
+    @property
+    def name(self):
+        return self.model_name
+
+    def encode(self, corpus, batch_size=None, show_progress_bar=False):
+        '''
+        Scores documents. Named like SentenceTransformer.encode, so scores can be cached in an EmbeddingCache.
+
+        Returns
+        -------
+        2D numpy array with the SCORE_COLUMNS of each document: the probabilities of each label,
+        and the probability of positive minus the probability of negative as overall sentiment.
+        '''
+        corpus = list(corpus)
+        batch_size = batch_size or self.batch_size
+        if not corpus:
+            return np.empty((0, len(SCORE_COLUMNS)), dtype=np.float32)
+
+        if self.n_jobs == 1:
+            return _transformer_scores(corpus, batch_size, self.model_name)
+
+        #the pool is kept between calls so each worker loads the model only once
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.n_jobs, mp_context=process_context(),
+                                                 initializer=_load_transformer, initargs=(self.model_name,))
+        chunks = _chunks(corpus, max(batch_size, -(-len(corpus) // self.n_jobs)))
+        return np.vstack(list(self._executor.map(_transformer_scores, chunks, [batch_size] * len(chunks),
+                                                 [self.model_name] * len(chunks))))
+
+    def close(self):
+        """Shuts down the pool of processes, if any. A later encode starts a new one."""
+        if self._executor is not None:
+            self._executor.shutdown()
+            self._executor = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
 
 
 class SentimentModel(Model):
 
-    def __init__(self, data, text_column, language="english"):
+    def __init__(self, data, text_column, language="english", data_source=None, scorer='lexicon', cache=None, n_jobs=1,
+                 batch_size=DEFAULT_BATCH_SIZE, transformer_model=DEFAULT_TRANSFORMER, instrumentation=None):
         '''
+        Initializes an instance of the SentimentModel class.
+
+        Parameters
+        ----------
+        data: pandas DataFrame instance
+            The dataframe with a column to be used for sentiment analysis.
+        text_column: str
+            The name of the column to be used for sentiment analysis.
+        data_source: str
+            where the data are coming from
+        scorer: str
+            'lexicon' (default) for the offline VADER scorer, or 'transformer' for a transformers classifier.
+        cache: EmbeddingCache instance, str or Path
+            Optional persistent cache of the scores, keyed by the hash of each cleaned document and the scorer.
+            It can be the embedding cache of a TopicModel: a rerun only scores the new documents.
+        n_jobs: int
+            Number of processes used to clean and score the documents, -1 uses all cpus.
+        batch_size: int
+            Number of documents classified together by the transformer scorer.
+        transformer_model: str
+            The model of the transformer scorer.
+        instrumentation: Instrumentation instance
+            Records the time, cpu, memory and row counts of the pipeline stages, see Model.
         '''
-        super(SentimentModel, self).__init__(data, text_column, language)
+        super(SentimentModel, self).__init__(data, text_column, data_source, language, n_jobs=n_jobs, instrumentation=instrumentation)
 
-    def run(self):
+        if scorer == 'lexicon':
+            self.scorer = LexiconScorer(n_jobs=n_jobs)
+        elif scorer == 'transformer':
+            self.scorer = TransformerScorer(transformer_model, batch_size=batch_size, n_jobs=n_jobs)
+        else:
+            raise ValueError(f"Unrecognized scorer {scorer}. Can be one of ['lexicon', 'transformer']")
+
+        if cache is not None and not isinstance(cache, EmbeddingCache):
+            cache = EmbeddingCache(cache)
+        self.cache = cache
+        self.batch_size = batch_size
+        self.scores = None
+
+    @classmethod
+    def from_model(cls, model, **kwargs):
         '''
+        Builds a sentiment model on the already cleaned data of another model (e.g. a fitted TopicModel),
+        without a second pass over the raw data. The data keep their topics, so sentiment_per_topic can be used.
+        The embedding cache of a TopicModel is reused as score cache, and its instrumentation, unless others are given.
+
+        Parameters
+        ----------
+        model: Model instance
+            The model whose data are scored.
+        kwargs:
+            Any other argument of the SentimentModel constructor.
         '''
-        return None
-    
-    def plot(self):
+        kwargs.setdefault('cache', getattr(model, 'embedding_cache', None))
+        kwargs.setdefault('instrumentation', model.instrumentation)
+        sentiment = cls(pd.DataFrame(), model.text_column, language=model.language, data_source=model.data_source, **kwargs)
+        sentiment.text_column = model.text_column
+        sentiment.modeling_column = model.modeling_column
+        sentiment.corpus_path = model.corpus_path
+        sentiment.data = model.data
+        return sentiment
+
+    @instrumented('sentiment_scores')
+    def run(self, chunksize=DEFAULT_SCORING_CHUNKSIZE):
         '''
+        Scores the sentiment of the cleaned documents, chunk by chunk, through the cache if there is one.
+        The processes of the scorer are shut down at the end of the run.
+
+        Parameters
+        ----------
+        chunksize: int
+            Number of documents scored at a time.
+
+        Returns
+        -------
+        scores: pandas DataFrame
+            The SCORE_COLUMNS of each document, with the index of the data. They are also added to the data.
         '''
-        return None 
\ No newline at end of file
+        scores = []
+        with self.scorer:
+            for chunk in self.iter_data(chunksize, columns=[self.modeling_column]):
+                corpus = chunk[self.modeling_column].tolist()
+                if self.cache is None:
+                    scores.append(self.scorer.encode(corpus))
+                else:
+                    scores.append(self.cache.encode(self.scorer, self.scorer.name, corpus, batch_size=self.batch_size,
+                                                    show_progress_bar=False))
+
+        if self.cache is not None:
+            logger.info(f"Sentiment cache --> {self.cache.hits} hits, {self.cache.misses} misses")
+
+        scores = np.vstack(scores) if scores else np.empty((0, len(SCORE_COLUMNS)), dtype=np.float32)
+        self.scores = pd.DataFrame(scores, columns=SCORE_COLUMNS, index=None if self.data is None else self.data.index)
+        if self.data is not None:
+            self.data = self.data.assign(**self.scores)
+        return self.scores
+
+    def sentiment_per_topic(self):
+        '''
+        Summarizes the sentiment of each topic.
+
+        Returns
+        -------
+        pandas DataFrame with one row per topic: its number of documents, mean sentiment,
+        and shares of positive and negative documents.
+        '''
+        if self.scores is None:
+            raise ValueError("No sentiment scores yet, call run first.")
+        if self.data is None or 'topic' not in self.data.columns:
+            raise ValueError("The data have no topics, build the model with SentimentModel.from_model on a fitted TopicModel.")
+
+        by = [c for c in ['topic', 'topic_name'] if c in self.data.columns]
+        data = self.data.assign(positive=self.data['sentiment'] > POSITIVE_THRESHOLD,
+                                negative=self.data['sentiment'] < NEGATIVE_THRESHOLD)
+        return data.groupby(by).agg(count=('sentiment', 'size'),
+                                    sentiment=('sentiment', 'mean'),
+                                    positive_share=('positive', 'mean'),
+                                    negative_share=('negative', 'mean')).reset_index()
+
+    def plot(self, limit_topics=10, **kwargs):
+        '''
+        Plots the mean sentiment of the top topics if the data have topics, or the distribution of the sentiment otherwise
+        (also for streamed data, from the scores of run).
+
+        Parameters
+        ----------
+        limit_topics: int
+            The number of top topics to display.
+
+        Returns
+        -------
+        The altair chart.
+        '''
+        import altair as alt
+
+        width = kwargs.get('width', 400)
+        height = kwargs.get('height', 300)
+
+        if self.data is None or 'topic' not in self.data.columns:
+            if self.scores is None:
+                raise ValueError("No sentiment scores yet, call run first.")
+            #binned here, so the chart has a few rows whatever the number of documents
+            return alt.Chart(binned_counts(self.scores['sentiment'], value_range=(-1, 1))).mark_bar().encode(
+                                                x=alt.X('bin_start:Q', title='sentiment'),
+                                                x2='bin_end:Q',
+                                                y='count:Q'
+                                            ).properties(width=width, height=height)
+
+        per_topic = self.sentiment_per_topic()
+        per_topic = per_topic[(per_topic['topic'] != -1) & (per_topic['topic'] < limit_topics)]
+        label = 'topic_name' if 'topic_name' in per_topic.columns else 'topic'
+        return alt.Chart(per_topic).mark_bar().encode(
+                                                y=alt.Y(f'{label}:N', sort='-x'),
+                                                x=alt.X('sentiment:Q', scale=alt.Scale(domain=[-1, 1])),
+                                                color=alt.condition(alt.datum.sentiment > 0, alt.ColorValue("steelblue"), alt.ColorValue("indianred")),
+                                                tooltip=[label, 'count', 'sentiment', 'positive_share', 'negative_share']
+                                            ).properties(width=width, height=height)
@@ -0,0 +1,158 @@
+import operator
+
+import pandas as pd
+
+
+_OPERATORS = {
+    '==': operator.eq, '=': operator.eq, '!=': operator.ne,
+    '<': operator.lt, '<=': operator.le, '>': operator.gt, '>=': operator.ge,
+    'in': lambda column, values: column.isin(values),
+    'not in': lambda column, values: ~column.isin(values),
+}
+
+
+def filter_mask(data, filters):
+    """Evaluates filters on a dataframe.
+
+    Args:
+        data (pandas DataFrame): the data, with at least the filtered columns
+        filters (list of tuples): (column, operator, value) conditions that must all hold,
+            e.g. [('topic', '==', 3), ('created_utc', '>=', pd.Timestamp('2022-01-01'))].
+            Operators are ==, !=, <, <=, >, >=, in and not in, as in pandas.read_parquet.
+
+    Returns:
+        pandas Series of booleans
+    """
+    mask = pd.Series(True, index=data.index)
+    for column, op, value in filters:
+        if op not in _OPERATORS:
+            raise ValueError(f"Unsupported filter operator {op}. Can be one of {list(_OPERATORS)}")
+        mask &= _OPERATORS[op](data[column], value)
+    return mask
+
+
+def filter_columns(filters):
+    """Returns the columns used by filters."""
+    return list(dict.fromkeys(column for column, _, _ in filters))
+
+
+class ParquetStorage:
+    '''
+    Columnar storage of the data. Keeps dtypes (e.g. dates), and reads only the requested
+    columns and the row groups that can match the filters.
+    '''
+    extension = 'parquet'
+
+    def write(self, data, path):
+        data.to_parquet(path, index=False)
+
+    def read(self, path, columns=None, filters=None):
+        return pd.read_parquet(path, columns=columns, filters=filters or None)
+
+    def iter_read(self, path, chunksize):
+        import pyarrow.parquet as pq
+
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+
+    def writer(self, path):
+        return _ParquetChunkWriter(path)
+
+
+class JsonStorage:
+    '''
+    Json lines storage of the data, as in older versions of the package.
+    The whole file is parsed, then columns and filters are applied.
+    '''
+    extension = 'json'
+
+    def write(self, data, path):
+        data.to_json(path, orient='records', lines=True)
+
+    def read(self, path, columns=None, filters=None):
+        data = pd.read_json(path, lines=True, dtype=False)
+        if filters:
+            data = data[filter_mask(data, filters)]
+        return data if columns is None else data[columns]
+
+    def iter_read(self, path, chunksize):
+        with pd.read_json(path, lines=True, chunksize=chunksize, dtype=False) as reader:
+            yield from reader
+
+    def writer(self, path):
+        return _JsonChunkWriter(path)
+
+
+class _ParquetChunkWriter:
+    '''
+    Writes a dataframe chunk by chunk in a single parquet file.
+
+    The schema of the file is the one of the first chunk, where columns without any value are strings.
+    Later chunks are converted to it: e.g. integers to the floats of a first chunk with missing values,
+    and the other way round (without checking that the values are integers), or any value to a string.
+    '''
+    def __init__(self, path):
+        self.path = path
+        self._writer = None
+
+    def write(self, chunk):
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+
+        if self._writer is None:
+            schema = pa.Schema.from_pandas(chunk, preserve_index=False)
+            #a column with only missing values has no type yet
+            schema = pa.schema([pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field for field in schema],
+                               metadata=schema.metadata)
+            self._writer = pq.ParquetWriter(self.path, schema)
+
+        schema = self._writer.schema
+        strings = [field.name for field in schema
+                   if pa.types.is_string(field.type) and field.name in chunk.columns and chunk[field.name].dtype != object]
+        if strings:
+            chunk = chunk.assign(**{name: chunk[name].astype(str).where(chunk[name].notna(), None) for name in strings})
+        self._writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False, safe=False))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        if self._writer is not None:
+            self._writer.close()
+
+
+class _JsonChunkWriter:
+    '''
+    Writes a dataframe chunk by chunk in a single json lines file.
+    '''
+    def __init__(self, path):
+        self._file = open(path, 'w')
+
+    def write(self, chunk):
+        if not chunk.empty:
+            self._file.write(chunk.to_json(orient='records', lines=True).rstrip('\n') + '\n')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self._file.close()
+
+
+STORAGES = {
+    'parquet': ParquetStorage(),
+    'json': JsonStorage(),
+}
+
+
+def get_storage(storage):
+    """Returns a storage backend from its name ('parquet' or 'json'), or the backend itself.
+
+    Any object with the extension attribute and the write, read, iter_read (chunk by chunk) and writer
+    methods of ParquetStorage can be used as a backend.
+    """
+    if isinstance(storage, str):
+        if storage not in STORAGES:
+            raise ValueError(f"Unrecognized storage {storage}. Can be one of {list(STORAGES)}")
+        return STORAGES[storage]
+    return storage
@@ -1,26 +1,44 @@
-# from pathlib import Path
+# Heavy dependencies (bertopic, umap, sentence_transformers, altair, plotly, matplotlib)
+# are imported inside the methods that need them, so importing this module stays cheap.
+import hashlib
+import logging
+import time
+from pathlib import Path
 from datetime import datetime
 
+import numpy as np
 import pandas as pd
-import altair as alt
-import plotly.express as px
-from umap import UMAP
-from bertopic import BERTopic
-import matplotlib.pyplot as plt
-from sentence_transformers import SentenceTransformer
-import plotly.express as px
-from streamlit_plotly_events import plotly_events
 
 from ideo_topic_modeler import Model
+from ideo_topic_modeler.utils import DEFAULT_CHUNKSIZE
+from ideo_topic_modeler.pipeline import ChunkReader, ChunkWriter, clean_chunks, DEFAULT_QUEUE_SIZE
+from ideo_topic_modeler.embeddings import (EmbeddingCache, EmbeddingEngine, save_embeddings, load_embeddings, embeddings_hash,
+                                           reduce_precision, append_embeddings, DEFAULT_MODEL)
+from ideo_topic_modeler.bundle import ModelBundle, write_bundle
+from ideo_topic_modeler.storage import STORAGES, get_storage, filter_mask, filter_columns
+from ideo_topic_modeler.search import EmbeddingIndex
+from ideo_topic_modeler.clustering import (make_topic_model, clustering_of, sample_indices, select_documents, topic_centroids, nearest_centroid,
+                                           centroid_similarity,
+                                           ASSIGNMENTS, DEFAULT_N_CLUSTERS, DEFAULT_ASSIGN_BATCH_SIZE)
+from ideo_topic_modeler.evolution import topics_over_time, DEFAULT_FREQ, DEFAULT_TOP_N_WORDS
+from ideo_topic_modeler.instrumentation import instrumented
+from ideo_topic_modeler.plotting import topic_counts, stratified_sample, truncate_text, DEFAULT_MAX_POINTS, DEFAULT_TOOLTIP_CHARS
 
 
+logger = logging.getLogger(__name__)
+
 TODAY = datetime.now().strftime("%d_%m_%Y_%H%M%S")
 TODAY_DATE = datetime.now().date().strftime("%d_%m_%Y")
 
+#columns of the data summarized by write_model_info
+MODEL_INFO_COLUMNS = ['keyword', 'subreddit', 'topic_name', 'created_utc']
+
 
 class TopicModel(Model):
 
-    def __init__(self, data, text_column, data_source, model_directory, language="english"):
+    def __init__(self, data, text_column, data_source, model_directory, language="english", embedding_cache=None, storage='parquet',
+                 embedding_model=None, batch_size=None, n_jobs=1, quantize=False, embedding_precision='float32',
+                 keyword_window=1, near_duplicate_threshold=None, instrumentation=None):
         '''
         Initializes an instance of the TopicModel class.
 
@@ -32,84 +50,518 @@ class TopicModel(Model):
             The name of the column to be used for topic analysis.
         data_source: str
             where the data are coming from
+        model_directory: Path
+            Directory where models, embeddings and data are saved.
+        embedding_cache: EmbeddingCache instance, str or Path
+            Optional persistent cache of embeddings (or the directory where to keep it).
+            When provided, run only encodes the documents that are not in the cache yet.
+        storage: str or storage backend
+            Format of the saved data files, 'parquet' (default) or 'json' (see ideo_topic_modeler.storage).
+        embedding_model: str
+            The sentence-transformers model computing the embeddings. Default is ideo_topic_modeler.embeddings.DEFAULT_MODEL,
+            whatever the data_source. LIGHT_MODEL is a good choice for exploratory runs.
+        batch_size: int
+            Number of documents encoded together. Default depends on the embedding model,
+            see ideo_topic_modeler.embeddings.BATCH_SIZES_BY_MODEL.
+        n_jobs: int
+            Number of processes used to clean and embed the documents, -1 uses all cpus.
+        quantize: bool
+            If True, the embedding model is quantized to int8 for faster encoding on CPU.
+        embedding_precision: str
+            Precision in which the embeddings are kept in memory and saved: 'float32' (default), 'float16'
+            or 'int8' (see ideo_topic_modeler.embeddings.reduce_precision), dividing their size by 2 or 4.
+            They are dequantized to float32 only when fitting the topics or projecting them.
+            Loaded embeddings keep the precision they were saved in.
+        keyword_window: int
+            For reddit data, number of sentences kept before and after each sentence with the keyword.
+        near_duplicate_threshold: float
+            If given, near-duplicate documents are removed, see Model.
+        instrumentation: Instrumentation instance
+            Records the time, cpu, memory and row counts of the pipeline stages, see Model.
+            The records are saved with the model artifacts in metrics_<timestamp>.json.
         '''
-        super(TopicModel, self).__init__(data, text_column, data_source, language)
+        super(TopicModel, self).__init__(data, text_column, data_source, language, n_jobs=n_jobs, keyword_window=keyword_window,
+                                         near_duplicate_threshold=near_duplicate_threshold, instrumentation=instrumentation)
 
         # today = datetime.now().strftime("%d_%m_%Y_%H%M%S")
 
-        self.model_directory = model_directory
+        self.model_directory = Path(model_directory)
+        self.model_directory.mkdir(parents=True, exist_ok=True)
         # self.data_filename = self.model_directory/ f"data_{today}.json"        
 
-        #FIXME what's the best way to do this?
-        # if self.data_source == 'reddit':
-        self.pre_trained_model = "paraphrase-mpnet-base-v2"
+        #None lets each embedding model use its own batch size, see _set_embedding_model
+        self.batch_size = batch_size
+        self.embedding_engine = EmbeddingEngine(embedding_model or DEFAULT_MODEL,
+                                                batch_size=batch_size, n_jobs=n_jobs, quantize=quantize)
+        self.pre_trained_model = self.embedding_engine.name
 
+        if embedding_cache is not None and not isinstance(embedding_cache, EmbeddingCache):
+            embedding_cache = EmbeddingCache(embedding_cache)
+        self.embedding_cache = embedding_cache
+        self.topic_info = None
+        self.storage = get_storage(storage)
+        #set when the data are saved or loaded
+        self.data_filename = None
+        self.search_index = None
+        #the embeddings last hashed and their hash, see _embeddings_hash
+        self._hashed_embeddings = None
+        self._embeddings_hash_value = None
+        self.embedding_precision = embedding_precision
+        #set by enrich_data_and_save_them when the topics are fitted on a sample
+        self.fit_report = None
+        #components of the topic model, see run. update refits with the same ones
+        self.clustering = 'hdbscan'
+        self.n_clusters = DEFAULT_N_CLUSTERS
 
-    def run(self):
+
+    @instrumented('embedding')
+    def run(self, clustering='hdbscan', n_clusters=DEFAULT_N_CLUSTERS):
         """This function compute topics and embeddings.
+
+        Args:
+            clustering (str): components of the topic model, 'hdbscan' for BERTopic's default UMAP and HDBSCAN,
+                or 'minibatch' for an incremental PCA and MiniBatchKMeans on large corpora (see clustering.make_topic_model)
+            n_clusters (int): number of topics of the 'minibatch' clustering
+        """
+        #the corpus is consumed chunk by chunk, so streamed data (see Model.from_jsonl) are never fully loaded
+        self.embeddings = reduce_precision(self._embed(self._iter_corpus()), self.embedding_precision)
+        self.search_index = None
+        self.clustering, self.n_clusters = clustering, n_clusters
+        self.topic_model = make_topic_model(clustering, n_clusters)
+
+    @classmethod
+    def from_jsonl_pipelined(cls, path, text_column, data_source, output_path, model_directory, chunksize=DEFAULT_CHUNKSIZE,
+                             clean_workers=2, queue_size=DEFAULT_QUEUE_SIZE, keyword_window=1, near_duplicate_threshold=None,
+                             **kwargs):
+        '''
+        Streaming constructor running the stages of Model.from_jsonl and run concurrently: while a chunk is embedded,
+        the next ones are cleaned on a pool of processes and read in a background thread, and the cleaned chunks are
+        written in another thread. The stages are connected by bounded queues, so memory stays bounded and the wall
+        time of the whole run gets close to the time of the slowest stage (usually the embedding).
+
+        The model is then ready to be fitted, like after run: call enrich_data_and_save_them.
+        For the components of large corpora, replace model.topic_model with clustering.make_topic_model('minibatch').
+        The busy time of each stage is added to the 'pipeline' record of the instrumentation, and logged.
+
+        Parameters
+        ----------
+        path: str or Path
+            The json lines file with the raw data.
+        text_column: str
+            The name of the column to be used for modeling.
+        data_source: str
+            where the data are coming from
+        output_path: str or Path
+            The json lines file where the cleaned data are written.
+        model_directory: Path
+            Directory where models, embeddings and data are saved.
+        chunksize: int
+            Number of rows processed at a time.
+        clean_workers: int
+            Number of processes cleaning chunks, started with utils.process_context (so scripts need a __main__ guard).
+        queue_size: int
+            Number of chunks waiting between two stages.
+        keyword_window: int
+            For reddit data, number of sentences kept before and after each sentence with the keyword.
+        near_duplicate_threshold: float
+            If given, near-duplicate documents are removed, see Model.
+        kwargs:
+            Any other argument of the TopicModel constructor.
+        '''
+        model = cls(pd.DataFrame(), text_column, data_source, model_directory, keyword_window=keyword_window,
+                    near_duplicate_threshold=near_duplicate_threshold, **kwargs)
+        model.text_column = text_column
+        model.modeling_column = f"{text_column}_clean"
+        model.corpus_path = Path(output_path)
+
+        reader = ChunkReader(path, chunksize, queue_size)
+        timings = {'embed': 0.0}
+        n_rows = 0
+
+        def corpora(chunks, writer):
+            #runs in this thread between two encodings: removes duplicates across chunks and hands the chunk to the writer
+            nonlocal n_rows
+            seen = set()
+            for chunk in chunks:
+                chunk = model._drop_seen(chunk, seen)
+                if model.near_duplicate_filter is not None and not chunk.empty:
+                    chunk = model._drop_near_duplicates(chunk)
+                if chunk.empty:
+                    continue
+                writer.write(chunk)
+                n_rows += len(chunk)
+                start = time.perf_counter()
+                yield chunk[model.modeling_column].tolist()
+                timings['embed'] += time.perf_counter() - start
+
+        with model.instrumentation.stage('pipeline') as record:
+            with ChunkWriter(model.corpus_path, queue_size) as writer:
+                chunks = clean_chunks(reader, text_column, data_source, model.language, keyword_window,
+                                      n_workers=clean_workers, queue_size=queue_size, timings=timings)
+                embeddings = model._embed(corpora(chunks, writer))
+            record['rows_out'] = n_rows
+            record['stage_seconds'] = {'read': reader.busy_seconds, 'clean': timings.get('clean', 0.0) / clean_workers,
+                                       'embed': timings['embed'], 'write': writer.busy_seconds}
+
+        busy = record['stage_seconds']
+        logger.info(f"Pipeline --> {n_rows} rows written to {model.corpus_path}, busy time of the stages: read {busy['read']:.2f}s, "
+                    f"clean {busy['clean']:.2f}s per worker, embed {busy['embed']:.2f}s, write {busy['write']:.2f}s")
+        model.embeddings = reduce_precision(embeddings, model.embedding_precision)
+        model.topic_model = make_topic_model()
+        return model
+
+    def _set_embedding_model(self, name):
+        """Switches the embedding engine to the model of loaded embeddings, so new documents are embedded consistently.
+
+        Args:
+            name (str): name of the embeddings' model, as given by EmbeddingEngine.name
+        """
+        if name and name != self.embedding_engine.name:
+            quantize = name.endswith('-qint8')
+            self.embedding_engine = EmbeddingEngine(name[:-len('-qint8')] if quantize else name,
+                                                    batch_size=self.batch_size,
+                                                    n_jobs=self.embedding_engine.n_jobs, quantize=quantize)
+        self.pre_trained_model = self.embedding_engine.name
+
+    def _embed(self, corpora):
+        """Embeds the documents, through the embedding cache if there is one.
+
+        Args:
+            corpora (iterable): lists of documents
+
+        Returns:
+            2D numpy array with one embedding per document
         """
-        sentence_model = SentenceTransformer(self.pre_trained_model)
-        self.embeddings = sentence_model.encode(self._get_corpus(), show_progress_bar=True)
-        self.topic_model = BERTopic()
+        #the embedding engine loads its model once and keeps it for later calls
+        embeddings = []
+        for corpus in corpora:
+            if self.embedding_cache is None:
+                embeddings.append(self.embedding_engine.encode(corpus, show_progress_bar=True))
+            else:
+                embeddings.append(self.embedding_cache.encode(self.embedding_engine, self.embedding_engine.name, corpus,
+                                                              batch_size=self.embedding_engine.batch_size))
+
+        if self.embedding_cache is not None:
+            logger.info(f"Embedding cache --> {self.embedding_cache.hits} hits, {self.embedding_cache.misses} misses")
+        return np.vstack(embeddings)
 
 
     def save_model(self, my_timestamp = TODAY):
-        """This function saves model and embeddings.
+        """This function saves model and embeddings, and the metrics of the pipeline stages so far.
         """
-        pd.DataFrame(self.embeddings).to_json(self.model_directory/ f"embeddings_{my_timestamp}.json", orient='records', lines=True)
-        self.topic_model.save(self.model_directory/ f"model_{my_timestamp}")
+        with self.instrumentation.stage('save_model'):
+            save_embeddings(self.embeddings, self.model_directory, my_timestamp, self.pre_trained_model)
+            self.topic_model.save(self.model_directory/ f"model_{my_timestamp}")
+            if self.search_index is not None:
+                self.search_index.save(self.model_directory/ f"index_{my_timestamp}")
+        self.save_metrics(my_timestamp)
 
         # #FIXME when is this ever called with save_data = True?
         # if save_data:
         #     self.save_data(my_timestamp)
         
+    def save_metrics(self, my_timestamp = TODAY):
+        """Saves the records of the pipeline stages (see ideo_topic_modeler.instrumentation) into a json file."""
+        self.instrumentation.save(self.model_directory/ f"metrics_{my_timestamp}.json")
+
+    @instrumented('save_data')
     def save_data(self, my_timestamp):
-        """Saves the data after any modifications (like clustering)."""
-        self.data_filename = self.model_directory/ f"data_{my_timestamp}.json"
-        self.data.to_json(self.data_filename, orient='records', lines=True)
+        """Saves the data after any modifications (like clustering), and the per-topic table if any."""
+        self.data_filename = self.model_directory/ f"data_{my_timestamp}.{self.storage.extension}"
+        self.storage.write(self.data, self.data_filename)
+        if self.topic_info is not None:
+            self.save_topic_info(my_timestamp)
     
-    def enrich_data_and_save_them(self, my_timestamp = TODAY):
+    @instrumented('enrich_data_and_save_them')
+    def enrich_data_and_save_them(self, my_timestamp = TODAY, sample_size=None, assignment='centroid',
+                                  batch_size=DEFAULT_ASSIGN_BATCH_SIZE, random_state=42):
         """This function adds to the data the topics information and saves them into a json file.
+        The per-topic information (size, name, tf_idf words) is saved once per topic in topics_<timestamp>.json,
+        and the metrics of the pipeline stages so far in metrics_<timestamp>.json.
+
+        For corpora too large for a full fit, give a sample_size: the topic model is fitted on a random sample
+        of the documents, and the other documents are assigned to its topics batch by batch (see _fit_on_sample).
+        The topic names and words then come from the sample, and the topic sizes from all the documents.
+
+        The 'probability' column is the probability of the clustering in a full fit (HDBSCAN's membership strength).
+        Clusterings that give none ('minibatch') and sampled fits use the cosine similarity of each document to the
+        centroid of its topic instead, for every document, and 0 for outliers (see clustering.centroid_similarity).
+
+        Args:
+            my_timestamp (str): timestamp identifying the model
+            sample_size (int): if given, number of documents the topic model is fitted on
+            assignment (str): how the documents out of the sample are assigned, 'centroid' or 'predict'
+            batch_size (int): number of documents assigned at a time
+            random_state (int): seed of the sampling
         """
 
-        topics, probs = self.topic_model.fit_transform(self._get_corpus(), self.embeddings)
+        with self.instrumentation.stage('fit_transform', rows_in=len(self.embeddings)) as record:
+            if sample_size is None or sample_size >= len(self.embeddings):
+                topics, probs = self.topic_model.fit_transform(self._get_corpus(), self._float_embeddings())
+                if probs is None:
+                    probs = self._centroid_probabilities(topics)
+                self.fit_report = None
+            else:
+                topics, probs = self._fit_on_sample(sample_size, assignment, batch_size, random_state)
+                record.update(self.fit_report)
 
-        #enriching the data with the model info and tf_idf
-        self.data.loc[:, 'topic'] = topics        
-        self.data.loc[:, 'probability'] = probs        
-        
-        topic_name_map = dict(zip(self.topic_model.get_topic_info()['Topic'].tolist(), 
-                                  self.topic_model.get_topic_info()['Name'].tolist()))
+        topic_name_map = self._refresh_topic_info()
+        if self.fit_report is not None:
+            #the topic model only counted the documents of the sample
+            counts = pd.Series(topics).value_counts()
+            self.topic_info['Count'] = self.topic_info['Topic'].map(counts).fillna(0).astype(int)
 
-        self.data.loc[:, 'topic_name'] = self.data['topic'].apply(lambda x: topic_name_map[x])        
-        
-        self.data.loc[:, 'tf_idf_words'] = self.data['topic'].apply(lambda x: self.topic_model.get_topic(x))
-        
-        self.data_filename = self.model_directory/ f"data_{my_timestamp}.json"
-        self.data.to_json(self.data_filename, orient='records', lines=True)      
+        self.data_filename = self.model_directory/ f"data_{my_timestamp}.{self.storage.extension}"
+        self.save_topic_info(my_timestamp)
+
+        if self.data is not None:
+            self._enrich(self.data, topics, probs, topic_name_map)
+            self.storage.write(self.data, self.data_filename)
+            self.write_model_info(my_timestamp)
+        else:
+            #streamed data are enriched and written chunk by chunk, only the columns for the model info are kept
+            info_data = []
+            start = 0
+            with self.storage.writer(self.data_filename) as writer:
+                for chunk in self.iter_data():
+                    end = start + len(chunk)
+                    chunk = self._enrich(chunk.copy(), topics[start:end], probs[start:end], topic_name_map)
+                    writer.write(chunk)
+                    info_data.append(chunk[[c for c in MODEL_INFO_COLUMNS if c in chunk.columns]])
+                    start = end
+            self.write_model_info(my_timestamp, data=pd.concat(info_data))
+        self.save_metrics(my_timestamp)
+
+    @instrumented('update')
+    def update(self, new_data, model_timestamp=None, drift_threshold=0.1, max_incremental_share=0.5, refit='auto'):
+        """Adds a batch of new data to the model without a full refit.
+
+        Only the new documents are embedded, and they are assigned to the existing topics with
+        the model's transform. Documents already in the model are skipped. Rows assigned this way
+        are flagged in the 'incremental' column, so drift keeps building up across updates until
+        the next full fit.
+
+        A full refit is recommended when the share of new documents that don't fit any topic (topic -1)
+        grew by more than drift_threshold compared to the fitted data, or when more than
+        max_incremental_share of the data were never part of a fit.
+
+        The new embeddings are appended in the precision of the existing ones; memory-mapped embeddings are
+        appended to a new file of the model directory (see embeddings.append_embeddings), not loaded in memory.
+        A refit uses the clustering of the fitted model (see run). The data must be in memory: streamed
+        models (see Model.from_jsonl) are updated from their saved model and data, given by model_timestamp.
+
+        Call save_model and save_data afterwards to persist the update.
+
+        Args:
+            new_data (pandas DataFrame): the new raw data, with the same columns as the data of the model
+            model_timestamp (string): if given, the saved model and data to start from (see load_saved_model_and_data)
+            drift_threshold (float): maximum increase of the outlier rate before a refit is recommended
+            max_incremental_share (float): maximum share of incrementally assigned rows before a refit is recommended
+            refit (string or bool): 'auto' refits when recommended, True always refits, False never does
+
+        Returns:
+            dict: the drift report, with the number of new documents, the outlier rates, the incremental share,
+            whether a refit was recommended and whether it was done
+        """
+        if model_timestamp is not None:
+            self.load_saved_model_and_data(model_timestamp)
+        if self.data is None:
+            raise ValueError("update needs the data of the model in memory, streamed data (see Model.from_jsonl) are not supported. "
+                             "Save the model and load it with load_saved_model_and_data first.")
+
+        report = {'new_documents': 0, 'refit_recommended': False, 'refit': False}
+        if new_data.empty:
+            return report
+
+        #transform and clean the new data like the data of the model, and skip documents we already have
+        new = Model(new_data, self.text_column, self.data_source, self.language, n_jobs=self.n_jobs,
+                    keyword_window=self.keyword_window, near_duplicate_threshold=self.near_duplicate_threshold,
+                    instrumentation=self.instrumentation).data
+        new = new[~new[self.modeling_column].isin(set(self.data[self.modeling_column]))].copy()
+        logger.info(f"New data not in the model --> {len(new)} rows")
+
+        report['new_documents'] = len(new)
+        if new.empty:
+            return report
 
-        self.write_model_info(my_timestamp)
+        new_corpus = new[self.modeling_column].tolist()
+        new_embeddings = self._embed([new_corpus])
+        topics, probs = self.topic_model.transform(new_corpus, new_embeddings)
+        if probs is None:
+            #the clustering gives no probabilities, use the similarity to the centroids of the fitted topics
+            topic_ids, centroids = topic_centroids(self.embeddings, self.data['topic'].to_numpy())
+            probs = centroid_similarity(new_embeddings, topics, topic_ids, centroids)
+        self._enrich(new, topics, probs, self._refresh_topic_info())
+        new['incremental'] = True
 
-    def write_model_info(self, my_timestamp = TODAY):
+        #drift: how much worse the documents never fitted match the existing topics, and how many there are
+        if 'incremental' in self.data.columns:
+            fitted = ~self.data['incremental'].astype('boolean').fillna(False).astype(bool)
+        else:
+            fitted = pd.Series(True, index=self.data.index)
+        fitted_outliers = (self.data.loc[fitted, 'topic'] == -1).mean() if fitted.any() else 0.0
+
+        self.data = pd.concat([self.data, new], ignore_index=True)
+        self.data['incremental'] = self.data['incremental'].astype('boolean').fillna(False).astype(bool)
+        self.embeddings = append_embeddings(self.embeddings, new_embeddings, self.model_directory)
+        self.search_index = None
+
+        incremental_outliers = (self.data.loc[self.data['incremental'], 'topic'] == -1).mean()
+        report.update({'fitted_outlier_rate': float(fitted_outliers),
+                       'incremental_outlier_rate': float(incremental_outliers),
+                       'incremental_share': float(self.data['incremental'].mean())})
+        report['refit_recommended'] = bool(incremental_outliers - fitted_outliers > drift_threshold
+                                           or report['incremental_share'] > max_incremental_share)
+
+        if refit is True or (refit == 'auto' and report['refit_recommended']):
+            logger.info("Refitting the topic model on all the data")
+            self.topic_model = make_topic_model(self.clustering, self.n_clusters)
+            topics, probs = self.topic_model.fit_transform(self._get_corpus(), self._float_embeddings())
+            if probs is None:
+                probs = self._centroid_probabilities(topics)
+            self._enrich(self.data, topics, probs, self._refresh_topic_info())
+            self.data['incremental'] = False
+            report['refit'] = True
+
+        return report
+
+    def _fit_on_sample(self, sample_size, assignment='centroid', batch_size=DEFAULT_ASSIGN_BATCH_SIZE, random_state=42):
+        """Fits the topic model on a random sample of the documents, and assigns all the documents batch by batch,
+        so only the sample and one batch of embeddings are in memory as float32.
+
+        With 'centroid' assignment, a document gets the topic whose centroid (mean embedding of the topic in
+        the sample) is the most similar: cheap, but no document out of the sample is an outlier. With 'predict',
+        the topic model's transform assigns them (approximate prediction of HDBSCAN, or predict of the clustering),
+        which also finds outliers but runs the reduction on every batch.
+
+        Whatever the assignment, the probability of every document, sample included, is its similarity to the
+        centroid of its topic (0 for outliers), so the probabilities of all the documents are comparable.
+
+        The documents of the sample keep their fitted topics. They are also assigned like the others,
+        and the share of them assigned to their fitted topic is reported as an estimate of the accuracy of the
+        assignment, in self.fit_report (also added to the metrics of the fit_transform stage).
+
+        Args:
+            sample_size (int): number of documents the topic model is fitted on
+            assignment (str): 'centroid' or 'predict'
+            batch_size (int): number of documents assigned at a time
+            random_state (int): seed of the sampling
+
+        Returns:
+            tuple: the topic and the probability of each document (1D numpy arrays)
+        """
+        if assignment not in ASSIGNMENTS:
+            raise ValueError(f"Unrecognized assignment {assignment}. Can be one of {ASSIGNMENTS}")
+
+        n_rows = len(self.embeddings)
+        sample = sample_indices(n_rows, sample_size, random_state)
+        sample_embeddings = np.asarray(self.embeddings[sample], dtype=np.float32)
+        sample_topics, _ = self.topic_model.fit_transform(select_documents(self._iter_corpus(), sample), sample_embeddings)
+        sample_topics = np.asarray(sample_topics)
+
+        topic_ids, centroids = topic_centroids(sample_embeddings, sample_topics)
+        sample_probs = centroid_similarity(sample_embeddings, sample_topics, topic_ids, centroids)
+        if assignment == 'centroid':
+            assign = lambda corpus, embeddings: nearest_centroid(embeddings, topic_ids, centroids)
+        else:
+            def assign(corpus, embeddings):
+                batch_topics, _ = self.topic_model.transform(corpus, embeddings)
+                return batch_topics, centroid_similarity(embeddings, batch_topics, topic_ids, centroids)
+        del sample_embeddings
+
+        topics = np.empty(n_rows, dtype=np.int64)
+        probs = np.empty(n_rows, dtype=np.float64)
+        start = 0
+        for corpus in self._iter_corpus(batch_size):
+            end = start + len(corpus)
+            batch_topics, batch_probs = assign(corpus, np.asarray(self.embeddings[start:end], dtype=np.float32))
+            topics[start:end] = batch_topics
+            probs[start:end] = batch_probs
+            start = end
+
+        #centroids can't predict outliers, so the agreement is measured on the documents that have a topic
+        fitted = sample_topics != -1 if assignment == 'centroid' else np.ones(len(sample), dtype=bool)
+        agreement = (topics[sample] == sample_topics)[fitted].mean() if fitted.any() else float('nan')
+        topics[sample] = sample_topics
+        probs[sample] = sample_probs
+
+        self.fit_report = {'sample_size': int(len(sample)), 'assignment': assignment,
+                           'sample_agreement': float(agreement),
+                           'sample_outlier_rate': float((sample_topics == -1).mean()),
+                           'outlier_rate': float((topics == -1).mean())}
+        logger.info(f"Fitted on a sample of {len(sample)} documents out of {n_rows} --> {agreement:.1%} of the sample "
+                    f"assigned to its fitted topic by {assignment}, outlier rate {self.fit_report['sample_outlier_rate']:.1%} "
+                    f"in the sample and {self.fit_report['outlier_rate']:.1%} overall")
+        return topics, probs
+
+    def _centroid_probabilities(self, topics):
+        """Probabilities of topics fitted on all the documents by a clustering that gives none (e.g. 'minibatch'):
+        the similarity of each document to the centroid of its topic, see clustering.centroid_similarity."""
+        topic_ids, centroids = topic_centroids(self.embeddings, topics)
+        return centroid_similarity(self.embeddings, topics, topic_ids, centroids)
+
+    def _float_embeddings(self):
+        """Returns the embeddings as float32, dequantizing them if they are kept in a lower precision."""
+        return np.asarray(self.embeddings, dtype=np.float32)
+
+    def _refresh_topic_info(self):
+        """Refreshes the per-topic table (self.topic_info) from the topic model.
+
+        Returns:
+            dict: topic id to topic name
+        """
+        self.topic_info = self._build_topic_info()
+        return dict(zip(self.topic_info['Topic'].tolist(), self.topic_info['Name'].tolist()))
+
+    def _build_topic_info(self):
+        """One row per topic with its id, size, name and tf_idf words.
+        The tf_idf words are computed once per topic here, instead of being copied in every row of the data.
+        """
+        topic_info = self.topic_model.get_topic_info()
+        topic_info['tf_idf_words'] = [self.topic_model.get_topic(topic) for topic in topic_info['Topic']]
+        return topic_info
+
+    def _enrich(self, data, topics, probs, topic_name_map):
+        """Adds the topics information to a dataframe, in place.
+        The tf_idf words are in the per-topic table self.topic_info, to be joined on 'topic' if needed.
+        """
+
+        #enriching the data with the model info
+        data.loc[:, 'topic'] = topics        
+        data.loc[:, 'probability'] = probs        
+        data.loc[:, 'topic_name'] = data['topic'].map(topic_name_map)
+        return data
+
+    def save_topic_info(self, my_timestamp = TODAY):
+        """Saves the per-topic table (ids, sizes, names and tf_idf words) into a json file."""
+        self.topic_info.to_json(self.model_directory/ f"topics_{my_timestamp}.json", orient='records', lines=True)
+
+    def write_model_info(self, my_timestamp = TODAY, data=None):
         """This function creates a txt file with information about the model.
         For now these include: keywords, subreddits, topics, and date range.
+
+        Args:
+            my_timestamp (string): timestamp of the model
+            data (pandas DataFrame): the enriched data, only the MODEL_INFO_COLUMNS are needed. Default is self.data
         """
+        if data is None:
+            data = self.data
         
         with open(self.model_directory/ f"INFO_{my_timestamp}.txt", 'w') as the_file:
             #write keywords and subreddits
             for k in ['keyword','subreddit']:
-                the_file.write(f"{k.upper()}: {','.join(self.data[k].unique().tolist())}\n")
+                the_file.write(f"{k.upper()}: {','.join(data[k].unique().tolist())}\n")
                 the_file.write('\n')
             
             #topics
             the_file.write(f"TOPICS:\n")
-            for topic in sorted(self.data['topic_name'].unique().tolist()):
+            for topic in sorted(data['topic_name'].unique().tolist()):
                 the_file.write(f"{topic}\n")
             the_file.write('\n')
 
 
             #dates range
-            dates = pd.to_datetime(self.data['created_utc'])
+            dates = pd.to_datetime(data['created_utc'])
             min_date = dates.min().date().strftime('%Y-%m-%d')
             max_date = dates.max().date().strftime('%Y-%m-%d')
             the_file.write(f"DATES: {min_date} to {max_date}\n")
@@ -117,7 +569,7 @@ class TopicModel(Model):
             
     
 
-    def plot(self, limit_topics = 10, text_column='body', **kwargs):
+    def plot(self, limit_topics = 10, text_column='body', max_points=DEFAULT_MAX_POINTS, tooltip_chars=DEFAULT_TOOLTIP_CHARS, **kwargs):
         '''
         Plots the topic frequency bar chart, the UMAP clusters and (optionally) allows for topic selection to read posts.
  
@@ -131,17 +583,23 @@ class TopicModel(Model):
             Column in the dataframe to be used for displaying the post content.
         limit_posts: int
             The number of posts to display in the textbox for selected topic.
+        max_points: int
+            Maximum number of points in the clusters chart, sampled per topic.
+        tooltip_chars: int
+            Texts in the tooltips are truncated to this number of characters.
         Returns
         -------
         altair object of the two charts + (optionally) a text box for display of underlying posts.
         '''
 
+        import altair as alt
+
         #TODO: control stuff like width and height through kwargs passed on from streamlit to make the charts more responsive
-        data_for_plot = self.data[(self.data['topic']!=-1) & (self.data['topic'] < limit_topics)]
+        counts, points = self.plot_data(limit_topics, max_points, tooltip_chars)
         topicSelection = alt.selection(type="single", encodings=['y'])
 
-        topic_bar = self._plot_topic_frequency_altair(data_for_plot, topicSelection)
-        topic_clusters = self._plot_clusters_altair(data_for_plot, topicSelection)
+        topic_bar = self._plot_topic_frequency_altair(counts, topicSelection)
+        topic_clusters = self._plot_clusters_altair(points, topicSelection)
 
         topic_charts = alt.hconcat(topic_bar, topic_clusters)
 
@@ -152,26 +610,161 @@ class TopicModel(Model):
                                         ) 
 
 
+    def plot_data(self, limit_topics = 10, max_points=DEFAULT_MAX_POINTS, tooltip_chars=DEFAULT_TOOLTIP_CHARS):
+        '''
+        Prepares bounded data for the charts, whatever the size of the corpus.
+
+        Parameters
+        ----------
+        limit_topics: int
+            The number of top topics to display.
+        max_points: int
+            Maximum number of points in the clusters chart, sampled per topic.
+        tooltip_chars: int
+            Texts in the tooltips are truncated to this number of characters.
+
+        Returns
+        -------
+        counts: pandas DataFrame
+            The number of documents per topic, for the topic frequency chart.
+        points: pandas DataFrame
+            A stratified sample of the documents with their coordinates and truncated tooltips, for the clusters chart.
+            The full documents of a selected topic can be fetched with documents_for_topic.
+        '''
+        data_for_plot = self.data[(self.data['topic']!=-1) & (self.data['topic'] < limit_topics)]
+        return topic_counts(data_for_plot), self._prepare_points(data_for_plot, max_points, tooltip_chars)
+
+    def documents_for_topic(self, topic, limit_posts=20, columns=('title', 'body', 'url')):
+        '''
+        Returns the documents of a topic, to be displayed on demand when the topic is selected in a chart.
+
+        Parameters
+        ----------
+        topic: int or str
+            The topic id or name.
+        limit_posts: int
+            Maximum number of documents to return, the most probable first. None returns them all.
+        columns: list of str
+            The columns to return (those missing from the data are skipped).
+
+        Returns
+        -------
+        pandas DataFrame with the documents.
+        '''
+        topic_column = 'topic_name' if isinstance(topic, str) else 'topic'
+        documents = self.data[self.data[topic_column] == topic]
+        if 'probability' in documents.columns:
+            documents = documents.sort_values('probability', ascending=False, kind='mergesort')
+        if limit_posts is not None:
+            documents = documents.head(limit_posts)
+        return documents[[c for c in ['topic', 'topic_name', *columns] if c in documents.columns]]
+
+    def _prepare_points(self, data, max_points=DEFAULT_MAX_POINTS, tooltip_chars=DEFAULT_TOOLTIP_CHARS):
+        '''
+        Keeps only the columns needed by the clusters charts, samples the points per topic
+        and truncates the tooltip texts.
+        '''
+        columns = [c for c in ['dim0', 'dim1', 'topic', 'topic_name', 'title', 'body', 'url'] if c in data.columns]
+        points = stratified_sample(data[columns], max_points).copy()
+        for c in ['title', 'body']:
+            if c in points.columns:
+                points[c] = truncate_text(points[c], tooltip_chars)
+        return points
+
     def _get_corpus(self):
         """This function computes the corpus
 
         Returns:
             list of documents
         """
-        return self.data[self.modeling_column].tolist() 
+        return [doc for corpus in self._iter_corpus() for doc in corpus]
+
+    def _iter_corpus(self, chunksize=DEFAULT_CHUNKSIZE):
+        """Iterates over the corpus in chunks, reading only the modeling column.
+
+        Args:
+            chunksize (int): number of documents in a chunk
+
+        Yields:
+            list of documents
+        """
+        for chunk in self.iter_data(chunksize, columns=[self.modeling_column]):
+            yield chunk[self.modeling_column].tolist()
 
 
-    def _compute_clusters(self):
+    @instrumented('compute_clusters')
+    def _compute_clusters(self, sample_size=None, use_reduced_embeddings=False, random_state=42):
         '''
-        Computes the UMAP clustering of topics.
+        Computes the 2D projection of the embeddings used to plot the topic clusters.
+
+        The projection is cached in the model directory, keyed by a hash of the embeddings and of
+        the projection options, so it is computed once and reused when the model is reloaded.
+
+        Parameters
+        ----------
+        sample_size: int
+            If given, UMAP is fitted on a random sample of this many documents and the rest
+            are projected with the fitted model, which is much faster on very large corpora.
+        use_reduced_embeddings: bool
+            If True, reuse the embeddings already reduced by BERTopic's UMAP during the fit
+            (projected to 2D with a PCA) instead of running another UMAP on the full embeddings.
+        random_state: int
+            Seed of the sampling and of UMAP.
         '''
-        # ideally the TopicModel would have the data and embeddings stored as attributes
-        # self.data and self.embeddings so then these methods act directly on them
-        # without the need to load them every single time we call one
-        X_embedded = UMAP().fit_transform(self.embeddings)
+        if self.data is None:
+            raise ValueError("The topic clusters are plotted from the data in memory, load the saved model and data "
+                             "(load_saved_model_and_data, filters keep them small) to plot a streamed model.")
+
+        method = 'reduced' if use_reduced_embeddings else f"umap_{sample_size or 'full'}_{random_state}"
+        projection_filename = self.model_directory/ f"projection_{self._embeddings_hash()[:16]}_{method}.npy"
+
+        if projection_filename.exists():
+            X_embedded = np.load(projection_filename)
+        else:
+            X_embedded = self._project(sample_size, use_reduced_embeddings, random_state)
+            np.save(projection_filename, X_embedded)
+
         self.data['dim0'] = X_embedded[:,0]
         self.data['dim1'] = X_embedded[:,1]
 
+    def _embeddings_hash(self):
+        '''
+        Returns the content hash of the embeddings, computed once per embeddings object: reading all of them
+        for every chart would cost as much as a pass over the data. The embeddings are replaced, never changed
+        in place (run, update, load...), so a new object means a new hash.
+        '''
+        if self._embeddings_hash_value is None or self._hashed_embeddings is not self.embeddings:
+            self._embeddings_hash_value = embeddings_hash(self.embeddings)
+            self._hashed_embeddings = self.embeddings
+        return self._embeddings_hash_value
+
+    def _project(self, sample_size, use_reduced_embeddings, random_state):
+        '''
+        Projects the embeddings to 2D, see _compute_clusters.
+        '''
+        if use_reduced_embeddings:
+            reduced = getattr(self.topic_model.umap_model, 'embedding_', None)
+            if reduced is None or len(reduced) != len(self.embeddings):
+                reduced = self.topic_model.umap_model.transform(self._float_embeddings())
+            #a PCA is enough to go from BERTopic's few dimensions to 2
+            reduced = reduced - reduced.mean(axis=0)
+            _, _, components = np.linalg.svd(reduced, full_matrices=False)
+            return reduced @ components[:2].T
+
+        from umap import UMAP
+
+        if sample_size is None or sample_size >= len(self.embeddings):
+            return UMAP(random_state=random_state).fit_transform(self._float_embeddings())
+
+        rng = np.random.default_rng(random_state)
+        sample = np.sort(rng.choice(len(self.embeddings), size=sample_size, replace=False))
+        umap_model = UMAP(random_state=random_state).fit(np.asarray(self.embeddings[sample], dtype=np.float32))
+
+        #project everything in blocks, to keep memory bounded
+        block_size = max(sample_size, 100_000)
+        return np.vstack([umap_model.transform(np.asarray(self.embeddings[i:i + block_size], dtype=np.float32))
+                          for i in range(0, len(self.embeddings), block_size)])
+
 
     def _plot_clusters_altair(self, data, topic_selector, **kwargs):
         '''
@@ -180,7 +773,7 @@ class TopicModel(Model):
         Parameters
         ----------
         data: pandas DataFrame
-            The dataframe filtered on a subset of the top topics for plotting.
+            The points of the top topics, already sampled and truncated (see plot_data).
         topic_selector: altair selector object
             A selector object that binds this chart to the topic frequency chart.
 
@@ -188,6 +781,8 @@ class TopicModel(Model):
         -------
         The altair clusters chart.
         '''
+        import altair as alt
+
         #TODO: figure out colormaps (default ugly AF)
         return alt.Chart(data).mark_circle(size=6).encode(
                                             x=alt.X('dim0:Q', scale=alt.Scale(zero=False)),
@@ -213,8 +808,11 @@ class TopicModel(Model):
         -------
         The altair clusters chart.
         '''
+        import plotly.express as px
+
         width = kwargs.pop('width', 800)
         height = kwargs.pop('height', 600)
+        data = self._prepare_points(data, kwargs.pop('max_points', DEFAULT_MAX_POINTS), kwargs.pop('tooltip_chars', DEFAULT_TOOLTIP_CHARS))
         return px.scatter(data, x="dim0", y="dim1", color="topic_name", 
                             custom_data=[body_column, title_column, url_column], 
                             width=width, height=height
@@ -237,9 +835,15 @@ class TopicModel(Model):
         -------
         The altair topic frequency chart.
         '''
+        import altair as alt
+
+        #the bars are drawn from pre-aggregated counts, see topic_counts
+        if 'count' not in data.columns:
+            data = topic_counts(data)
+
         return alt.Chart(data).mark_bar().encode(
                                                 y=alt.Y('topic_name:N',sort="-x"),
-                                                x='count()',
+                                                x='count:Q',
                                                 color=alt.condition(selector, alt.ColorValue("steelblue"), alt.ColorValue("grey"))
                                             ).properties(
                                                 width=400,
@@ -260,11 +864,17 @@ class TopicModel(Model):
         -------
         The plotly topic frequency chart.
         '''
+        import plotly.express as px
+
+        #the bars are drawn from pre-aggregated counts, see topic_counts
+        if 'count' not in data.columns:
+            data = topic_counts(data)
+
         # width = kwargs.pop('width', 800)
         # height = kwargs.pop('height', 600)
-        return px.histogram(data, y='topic_name', barmode='group', 
+        return px.bar(data, x='count', y='topic_name', orientation='h',
                             width=width, height=height
-                            ).update_layout(clickmode='event+select')
+                            ).update_layout(clickmode='event+select', yaxis={'categoryorder': 'total ascending'})
 
 
 
@@ -288,6 +898,8 @@ class TopicModel(Model):
         The altair textbox object.
         '''
 
+        import altair as alt
+
         ranked_text = alt.Chart(data).mark_text(align='left',
             dx=-500, size=10).encode(
             y=alt.Y('row_number:O',axis=None)
@@ -303,6 +915,8 @@ class TopicModel(Model):
 
     def _plot_topic_frequency_locally(self, limit=10, suffix=None):
         
+        import matplotlib.pyplot as plt
+
         #FIXME this will become an altair plot?
         plt.rc('xtick', labelsize=8) 
         plt.rc('ytick', labelsize=8) 
@@ -320,20 +934,245 @@ class TopicModel(Model):
 
         plt.savefig(self.model_directory/ f"topics_freq_{suffix}.pdf")
 
-    def _plot_topic_evolution(self, topics=[]):
-        return None
+    @instrumented('build_index')
+    def build_index(self, method='auto', **kwargs):
+        """Builds the nearest-neighbor index over the embeddings used by search.
+        It is saved with the model by save_model, and loaded back by load_saved_model_and_data.
+
+        Args:
+            method (str): 'hnsw' (approximate, needs hnswlib), 'exact', or 'auto' to use hnsw when available
+            **kwargs: other parameters of ideo_topic_modeler.search.EmbeddingIndex
+
+        Returns:
+            EmbeddingIndex: the index
+        """
+        self.search_index = EmbeddingIndex(method, **kwargs)
+        logger.info(f"Building {self.search_index.method} search index over {len(self.embeddings)} embeddings")
+        return self.search_index.build(self.embeddings)
+
+    def search(self, query, k=10):
+        """Finds the documents most similar to a query, building the search index first if needed.
+
+        For streamed data (see Model.from_jsonl) only the rows found are kept while reading the data
+        chunk by chunk, from the enriched data file once it is written.
+
+        Args:
+            query (str or 1D array): a text, embedded with the model of the embeddings, or an embedding
+            k (int): number of documents to return
+
+        Returns:
+            pandas DataFrame: the k most similar rows of the data, most similar first, with their cosine similarity in a score column
+        """
+        if self.search_index is None:
+            self.build_index()
 
-    def load_saved_model_and_data(self, model_timestamp):
+        if isinstance(query, str):
+            query = self.embedding_engine.encode([query], show_progress_bar=False)[0]
+
+        indices, scores = self.search_index.query(query, k=k)
+        if self.data is not None:
+            results = self.data.iloc[indices[0]].copy()
+        else:
+            results = self._streamed_rows(indices[0])
+        results['score'] = scores[0]
+        return results
+
+    def _streamed_rows(self, positions):
+        """Reads the rows at some positions of the streamed data, in the order of the positions.
+
+        Args:
+            positions (1D array of int): positions of the rows, as in the embeddings
+
+        Returns:
+            pandas DataFrame: the rows
+        """
+        if self.data_filename is not None and self.data_filename.exists():
+            chunks = self.storage.iter_read(self.data_filename, DEFAULT_CHUNKSIZE)
+        else:
+            chunks = self.iter_data()
+
+        order = np.argsort(positions, kind='stable')
+        sorted_positions = np.asarray(positions)[order]
+        rows = []
+        start = 0
+        for chunk in chunks:
+            end = start + len(chunk)
+            first, last = np.searchsorted(sorted_positions, [start, end])
+            if last > first:
+                rows.append(chunk.iloc[sorted_positions[first:last] - start])
+            if last == len(sorted_positions):
+                break
+            start = end
+        #back from the order of the data to the order of the positions
+        return pd.concat(rows).iloc[np.argsort(order)].copy()
+
+    @instrumented('topics_over_time')
+    def topics_over_time(self, freq=DEFAULT_FREQ, top_n_words=DEFAULT_TOP_N_WORDS):
+        """Computes the frequency and the c-TF-IDF words of each topic per time window of created_utc
+        (see ideo_topic_modeler.evolution.topics_over_time).
+
+        The fitted topic model and the topic assignments are reused, nothing is embedded again.
+        The result is cached in the model directory, keyed by a hash of the documents, their topics and dates,
+        so the topic evolution chart is instant once computed.
+
+        Args:
+            freq (str): the time window, as a pandas period alias, e.g. 'D', 'W' (default) or 'M'
+            top_n_words (int): number of words per topic and window
+
+        Returns:
+            pandas DataFrame: one row per window and topic with date, topic, topic_name, count, frequency and words
+        """
+        if self.data is None or 'topic' not in self.data.columns:
+            raise ValueError("Topics over time need the data with their topics, run enrich_data_and_save_them or load a saved model first.")
+
+        columns = [self.modeling_column, 'topic', 'created_utc']
+        data_hash = hashlib.sha1(pd.util.hash_pandas_object(self.data[columns], index=False).to_numpy().tobytes()).hexdigest()
+        cache_filename = self.model_directory/ f"topics_over_time_{data_hash[:16]}_{freq}_{top_n_words}.{self.storage.extension}"
+
+        if cache_filename.exists():
+            evolution = self.storage.read(cache_filename)
+        else:
+            logger.info(f"Computing topics over time, per {freq}")
+            ctfidf_model = getattr(self.topic_model, 'ctfidf_model', None)
+            idf = getattr(ctfidf_model, '_idf_diag', None)
+            evolution = topics_over_time(self.data[self.modeling_column].tolist(), self.data['topic'], self.data['created_utc'],
+                                         self.topic_model.vectorizer_model, freq=freq, top_n_words=top_n_words,
+                                         idf=None if idf is None else idf.diagonal())
+            self.storage.write(evolution, cache_filename)
+
+        topic_names = self.data.drop_duplicates('topic').set_index('topic')['topic_name']
+        evolution['topic_name'] = evolution['topic'].map(topic_names)
+        return evolution
+
+    def _plot_topic_evolution(self, topics=[], freq=DEFAULT_FREQ, limit_topics=10, **kwargs):
+        '''
+        Plots the frequency of topics over time, with their words of each time window in the tooltips.
+
+        Parameters
+        ----------
+        topics: list of int
+            The topics to plot. Default is the top limit_topics topics.
+        freq: str
+            The time window, as a pandas period alias, e.g. 'D', 'W' or 'M'.
+        limit_topics: int
+            The number of top topics plotted when no topics are given.
+
+        Returns
+        -------
+        The altair topic evolution chart.
+        '''
+        import altair as alt
+
+        evolution = self.topics_over_time(freq)
+        if len(topics) > 0:
+            evolution = evolution[evolution['topic'].isin(topics)]
+        else:
+            evolution = evolution[(evolution['topic'] != -1) & (evolution['topic'] < limit_topics)]
+        evolution = evolution.assign(words=evolution['words'].map(', '.join))
+
+        return alt.Chart(evolution).mark_line(point=True).encode(
+                                                x=alt.X('date:T', title=None),
+                                                y=alt.Y('frequency:Q', axis=alt.Axis(format='%')),
+                                                color='topic_name:N',
+                                                tooltip=['topic_name', 'date:T', 'count', 'words']
+                                            ).properties(
+                                                width=kwargs.get('width', 800),
+                                                height=kwargs.get('height', 300)
+                                            )
+
+    @instrumented('load_saved_model_and_data')
+    def load_saved_model_and_data(self, model_timestamp, columns=None, filters=None):
         """This function is to load a previously computed model and data
 
         Args:
             model_timestamp (string): timestamp of when model and data were created
+            columns (list): only load these columns of the data. Default is all columns
+            filters (list): only load the rows matching these (column, operator, value) conditions,
+                e.g. [('topic', '==', 3)] (see ideo_topic_modeler.storage.filter_mask).
+                The embeddings are restricted to the same rows.
         """
 
+        from bertopic import BERTopic
+
         model_filename = self.model_directory/ f"model_{model_timestamp}"
-        embeddings_filename = self.model_directory/ f"embeddings_{model_timestamp}.json"
-        self.data_filename = self.model_directory/ f"data_{model_timestamp}.json"
+
+        #data may have been saved in any of the storage formats
+        for storage in [self.storage, *STORAGES.values()]:
+            self.data_filename = self.model_directory/ f"data_{model_timestamp}.{storage.extension}"
+            if self.data_filename.exists():
+                break
 
         self.topic_model = BERTopic.load(model_filename)
-        self.data = pd.read_json(self.data_filename, lines=True)
-        self.embeddings = pd.read_json(embeddings_filename, lines=True)
\ No newline at end of file
+        self.clustering, self.n_clusters = clustering_of(self.topic_model)
+        self.data = storage.read(self.data_filename, columns=columns, filters=filters)
+        #the loaded data replace the streamed corpus, if any
+        self.corpus_path = None
+        self.storage = storage
+
+        #older data files have the tf_idf words in every row instead of a per-topic table
+        topic_info_filename = self.model_directory/ f"topics_{model_timestamp}.json"
+        if topic_info_filename.exists():
+            self.topic_info = pd.read_json(topic_info_filename, lines=True)
+        else:
+            self.topic_info = self._build_topic_info()
+            self.data = self.data.drop(columns=['tf_idf_words'], errors='ignore')
+
+        self.embeddings, embeddings_info = load_embeddings(self.model_directory, model_timestamp)
+        if filters:
+            #find the positions of the selected rows, reading only the filtered columns
+            positions = np.flatnonzero(filter_mask(storage.read(self.data_filename, columns=filter_columns(filters)), filters).to_numpy())
+            self.embeddings = self.embeddings[positions]
+        self._set_embedding_model(embeddings_info.get('model_name'))
+
+        #a saved index covers all the embeddings, with filters it is rebuilt on demand over the selected rows
+        index_directory = self.model_directory/ f"index_{model_timestamp}"
+        self.search_index = EmbeddingIndex.load(index_directory, self.embeddings) if index_directory.exists() and not filters else None
+
+    @instrumented('save_bundle')
+    def save_bundle(self, my_timestamp = TODAY):
+        """This function saves model, embeddings, data and topics as a single versioned bundle
+        (see ideo_topic_modeler.bundle), in the bundle_<timestamp> directory.
+
+        Streamed data (see Model.from_jsonl) are copied chunk by chunk from the enriched data file
+        written by enrich_data_and_save_them.
+
+        Returns:
+            Path: the directory of the bundle
+        """
+        if self.data is not None:
+            data = self.data
+        elif self.data_filename is not None and self.data_filename.exists():
+            data = self.storage.iter_read(self.data_filename, DEFAULT_CHUNKSIZE)
+        else:
+            raise ValueError("The streamed data have no topics yet, call enrich_data_and_save_them before save_bundle.")
+
+        bundle_path = self.model_directory/ f"bundle_{my_timestamp}"
+        write_bundle(bundle_path, data, self.embeddings, self.topic_model, self.topic_info, self.pre_trained_model)
+        return bundle_path
+
+    @instrumented('load_bundle')
+    def load_bundle(self, bundle_path, columns=None, load_embeddings=True, load_model=True):
+        """This function loads a bundle saved with save_bundle, optionally only the parts that are needed.
+
+        Args:
+            bundle_path (Path): directory of the bundle
+            columns (list): only load these columns of the data. Default is all columns
+            load_embeddings (bool): whether to load the embeddings (memory-mapped)
+            load_model (bool): whether to load the BERTopic model
+
+        Returns:
+            ModelBundle: the opened bundle, to load other parts later
+        """
+        bundle = ModelBundle(bundle_path)
+
+        self.data = bundle.data(columns=columns)
+        self.corpus_path = None
+        self.topic_info = bundle.topic_info()
+        self._set_embedding_model(bundle.embedding_model)
+        if load_embeddings:
+            self.embeddings = bundle.embeddings()
+            self.search_index = None
+        if load_model:
+            self.topic_model = bundle.topic_model()
+
+        return bundle
@@ -1,5 +1,28 @@
+import hashlib
+import multiprocessing
+
+
+#number of documents processed at a time by the chunked stages (cleaning, keyword windows, streaming from disk)
+DEFAULT_CHUNKSIZE = 100_000
+
 
 def decode_ascii(x):
   encoded_string = x.encode("ascii", "ignore")
   decode_string = encoded_string.decode()
   return decode_string
+
+
+def text_hash(x):
+  """Content hash of a text, used as its key in caches and to find duplicates."""
+  return hashlib.sha1(x.encode("utf-8")).hexdigest()
+
+
+def process_context():
+  """Start method of the process pools that run while other threads or heavy libraries (torch...) are loaded.
+
+  Forking such a process can deadlock on a lock held by another thread and duplicates its memory,
+  so the workers are started by a fresh server process (forkserver), or spawned where it is not available.
+  Scripts using these pools need the usual if __name__ == "__main__": guard.
+  """
+  methods = multiprocessing.get_all_start_methods()
+  return multiprocessing.get_context('forkserver' if 'forkserver' in methods else 'spawn')
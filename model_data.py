@@ -1,4 +1,5 @@
 # from pathlib import Path
+import logging
 
 import pandas as pd
 
@@ -7,6 +8,8 @@ from ideo_topic_modeler import TopicModel, DATA_DIR
 
 if __name__ == "__main__":
 
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s %(name)s %(message)s")
+
     # Get Data  
     # filename = 'reddit_continuous glucose monitoring_in_all-subreddits_2021-01-01_2022-12-01_complete.json'
     # filename = 'reddit_wellness+goals_in_all-subreddits_2022-08-01_2022-12-02_complete.json'
@@ -11,7 +11,9 @@ setup(
         "sentence-transformers",
         "bertopic",
         "plotly",
-        "streamlit-plotly-events"
+        "streamlit-plotly-events",
+        "pyarrow",
+        "vaderSentiment",
         # "umap",
       ],
     license='Creative Commons Attribution-Noncommercial-Share Alike license',
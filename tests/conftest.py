@@ -0,0 +1,32 @@
+import sys
+from pathlib import Path
+
+import pytest
+
+#the synthetic corpora and legacy implementations of the benchmarks
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / 'benchmarks'))
+
+from synthetic import make_reddit_frame
+
+
+@pytest.fixture(scope='session')
+def reddit_frame():
+    """A small synthetic reddit dump, with urls, punctuation, duplicates and missing bodies."""
+    return make_reddit_frame(2000, seed=1)
+
+
+@pytest.fixture(scope='session')
+def fitted_model(reddit_frame, tmp_path_factory):
+    """A TopicModel of the synthetic dump, fitted with the minibatch clustering on synthetic embeddings and saved
+    with the timestamp 'test'. The embeddings are grouped in 8 topics, unrelated to the words of the documents."""
+    pytest.importorskip('bertopic')
+    from ideo_topic_modeler.topics import TopicModel
+    from ideo_topic_modeler.clustering import make_topic_model
+    from synthetic import make_embeddings
+
+    model = TopicModel(reddit_frame, 'body', 'reddit', tmp_path_factory.mktemp('model'))
+    model.embeddings, _ = make_embeddings(len(model.data), dim=32, n_topics=8, seed=1)
+    model.topic_model = make_topic_model('minibatch', n_clusters=8)
+    model.enrich_data_and_save_them('test')
+    model.save_model('test')
+    return model
@@ -0,0 +1,87 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import ideo_topic_modeler.batch as batch
+from ideo_topic_modeler.batch import BatchRunner, CLEANED, EMBEDDED, DONE, FAILED
+from ideo_topic_modeler.embeddings import EmbeddingEngine
+
+
+pytest.importorskip('bertopic')
+
+
+def fake_encode(self, corpus, batch_size=None, show_progress_bar=True):
+    """Deterministic stand-in for the sentence-transformers model: a few numbers describing each document."""
+    return np.array([[len(text), sum(map(ord, text)) % 997] + [text.count(letter) for letter in ' aeiourst'] for text in corpus],
+                    dtype=np.float32)
+
+
+@pytest.fixture
+def manifest_path(reddit_frame, tmp_path):
+    for name, rows in [('first', reddit_frame.iloc[:1000]), ('second', reddit_frame.iloc[1000:])]:
+        rows.to_json(tmp_path / f"{name}.json", orient='records', lines=True, date_format='iso')
+    manifest = {'output_directory': 'models',
+                'defaults': {'clustering': 'minibatch', 'n_clusters': 4, 'chunksize': 300},
+                'datasets': [{'name': 'first', 'path': 'first.json'}, {'name': 'second', 'path': 'second.json'}]}
+    path = tmp_path / 'manifest.json'
+    path.write_text(json.dumps(manifest))
+    return path
+
+
+@pytest.fixture
+def failing_fit(monkeypatch):
+    """Runs the stages in threads of this process, so the patched functions are used, and makes the first fit
+    of the second dataset fail. Returns the names of the datasets whose fit was called."""
+    monkeypatch.setattr(EmbeddingEngine, 'encode', fake_encode)
+    monkeypatch.setattr(batch, 'ProcessPoolExecutor', lambda max_workers, mp_context: ThreadPoolExecutor(max_workers))
+
+    fit_dataset = batch._fit_dataset
+    calls = []
+
+    def fit_once_failing(dataset, *args):
+        calls.append(dataset['name'])
+        if calls.count('second') == 1 and dataset['name'] == 'second':
+            raise RuntimeError("fit interrupted")
+        return fit_dataset(dataset, *args)
+
+    monkeypatch.setattr(batch, '_fit_dataset', fit_once_failing)
+    return calls
+
+
+def test_failed_datasets_restart_and_unchanged_ones_are_skipped(manifest_path, failing_fit):
+    runner = BatchRunner(manifest_path, n_workers=2)
+    assert [(dataset['name'], stage) for dataset, stage, _ in runner.plan()] == [('first', 'clean'), ('second', 'clean')]
+
+    assert runner.run() == {'first': DONE, 'second': FAILED}
+    state = json.loads(runner.state_path.read_text())
+    assert state['first']['status'] == DONE
+    assert state['second']['status'] == FAILED and 'fit interrupted' in state['second']['error']
+    assert (runner.output_directory / 'first' / f"model_{state['first']['timestamp']}").exists()
+
+    #a new runner reads the state file: the failed dataset starts over, the done one is skipped
+    runner = BatchRunner(manifest_path, n_workers=2)
+    assert [(dataset['name'], stage) for dataset, stage, _ in runner.plan()] == [('second', 'clean')]
+    assert runner.run() == {'first': 'skipped', 'second': DONE}
+    assert sorted(failing_fit) == ['first', 'second', 'second']
+
+
+def test_plan_resumes_datasets_where_they_stopped(manifest_path):
+    runner = BatchRunner(manifest_path, n_workers=2)
+    fingerprints = {dataset['name']: fingerprint for dataset, _, fingerprint in runner.plan()}
+    runner.state = {'first': {'status': CLEANED, 'fingerprint': fingerprints['first']},
+                    'second': {'status': EMBEDDED, 'fingerprint': fingerprints['second']}}
+    assert [(dataset['name'], stage) for dataset, stage, _ in runner.plan()] == [('first', 'embed'), ('second', 'fit')]
+
+    #a dataset whose file or config changed starts over, even if it was done
+    runner.state['second']['status'] = DONE
+    assert [(dataset['name'], stage) for dataset, stage, _ in runner.plan()] == [('first', 'embed')]
+    stat = os.stat(manifest_path.parent / 'second.json')
+    os.utime(manifest_path.parent / 'second.json', ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert [(dataset['name'], stage) for dataset, stage, _ in runner.plan()] == [('first', 'embed'), ('second', 'clean')]
+
+    runner.state['second']['fingerprint'] = batch.dataset_fingerprint(runner.manifest['datasets'][1], runner.embedding_engine.name)
+    runner.manifest['datasets'][1]['n_clusters'] = 5
+    assert [(dataset['name'], stage) for dataset, stage, _ in runner.plan()] == [('first', 'embed'), ('second', 'clean')]
@@ -0,0 +1,73 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from ideo_topic_modeler.bundle import (ModelBundle, write_bundle, MANIFEST_FILENAME, EMBEDDINGS_FILENAME, TOPIC_INFO_FILENAME,
+                                       SCHEMA_VERSION)
+from ideo_topic_modeler.embeddings import QuantizedEmbeddings, reduce_precision
+
+
+pytest.importorskip('bertopic')
+
+
+def _write(model, path, embeddings=None):
+    return write_bundle(path, model.data, model.embeddings if embeddings is None else embeddings, model.topic_model,
+                        model.topic_info, model.pre_trained_model)
+
+
+def test_bundle_round_trip(fitted_model, tmp_path):
+    manifest = _write(fitted_model, tmp_path / 'bundle')
+    bundle = ModelBundle(tmp_path / 'bundle')
+    bundle.verify()
+
+    assert manifest == json.loads((tmp_path / 'bundle' / MANIFEST_FILENAME).read_text())
+    assert bundle.row_count == len(fitted_model.data)
+    assert bundle.embedding_model == fitted_model.pre_trained_model
+    pd.testing.assert_frame_equal(bundle.data(), fitted_model.data.reset_index(drop=True))
+    np.testing.assert_array_equal(bundle.embeddings(), fitted_model.embeddings)
+    assert bundle.topic_info()['Topic'].tolist() == fitted_model.topic_info['Topic'].tolist()
+    assert bundle.topic_counts()['count'].sum() == len(fitted_model.data)
+
+    selected = bundle.data(columns=['topic'], filters=[('topic', '==', 2)])
+    assert len(selected) == (fitted_model.data['topic'] == 2).sum()
+
+
+def test_bundle_keeps_int8_embeddings(fitted_model, tmp_path):
+    quantized = reduce_precision(fitted_model.embeddings, 'int8')
+    _write(fitted_model, tmp_path / 'bundle', embeddings=quantized)
+
+    embeddings = ModelBundle(tmp_path / 'bundle').embeddings()
+    assert isinstance(embeddings, QuantizedEmbeddings)
+    np.testing.assert_array_equal(np.asarray(embeddings), np.asarray(quantized))
+
+
+def test_verify_finds_changed_and_missing_files(fitted_model, tmp_path):
+    _write(fitted_model, tmp_path / 'bundle')
+    bundle = ModelBundle(tmp_path / 'bundle')
+
+    with open(tmp_path / 'bundle' / EMBEDDINGS_FILENAME, 'r+b') as f:
+        f.seek(-1, 2)
+        last = f.read(1)
+        f.seek(-1, 2)
+        f.write(bytes([last[0] ^ 1]))
+    (tmp_path / 'bundle' / TOPIC_INFO_FILENAME).unlink()
+
+    with pytest.raises(ValueError, match=f"{EMBEDDINGS_FILENAME}, {TOPIC_INFO_FILENAME}"):
+        bundle.verify()
+
+
+def test_bundle_with_mismatched_embeddings_is_not_written(fitted_model, tmp_path):
+    with pytest.raises(ValueError, match='rows'):
+        _write(fitted_model, tmp_path / 'bundle', embeddings=np.asarray(fitted_model.embeddings)[:-1])
+    assert not (tmp_path / 'bundle' / MANIFEST_FILENAME).exists()
+
+
+def test_newer_bundles_are_refused(fitted_model, tmp_path):
+    manifest = _write(fitted_model, tmp_path / 'bundle')
+    manifest['schema_version'] = SCHEMA_VERSION + 1
+    (tmp_path / 'bundle' / MANIFEST_FILENAME).write_text(json.dumps(manifest))
+
+    with pytest.raises(ValueError, match='newer'):
+        ModelBundle(tmp_path / 'bundle')
@@ -0,0 +1,47 @@
+import pandas as pd
+import pytest
+
+from ideo_topic_modeler import Model
+from ideo_topic_modeler.cleaning import clean_text, clean_series
+
+from bench_cleaning import legacy_clean
+
+
+EDGE_CASES = [
+    "",
+    "   ",
+    "Plain text",
+    "See HTTPS://Example.com/Path and http://x.org.",
+    "Visit WWW.Example.com/page?q=1 or www.x.y",
+    "Fish &amp; chips &AMP; peas",
+    "Don't panic, it’s fine. O'Neil's 'quoted' words",
+    "a|b.c:d;e@f$g%h_i[j]k(l)m+n*o#p\"q/r",
+    "Keep ? and ! marks!!",
+    "tabs\tand\nline\r\nbreaks   and  spaces ",
+    "café naïve — résumé",
+    "https://only.a/link",
+]
+
+
+@pytest.mark.parametrize('text', EDGE_CASES)
+def test_clean_text_matches_legacy_chain(text):
+    assert clean_text(text) == legacy_clean(pd.Series([text])).iloc[0]
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_clean_series_matches_legacy_chain(reddit_frame, n_jobs):
+    texts = (reddit_frame['title'] + '.' + reddit_frame['body']).dropna()
+    cleaned = clean_series(texts, n_jobs=n_jobs, chunksize=300)
+    pd.testing.assert_series_equal(cleaned, legacy_clean(texts))
+
+
+def test_clean_data_matches_legacy_chain(reddit_frame):
+    model = Model(reddit_frame.drop(columns=['keyword']), 'body', data_source=None)
+
+    expected = reddit_frame.dropna(subset=['body'])
+    expected = legacy_clean(expected['title'] + '.' + expected['body'])
+    expected = expected[~expected.duplicated()]
+    expected = expected[expected != '']
+
+    assert model.data.index.tolist() == expected.index.tolist()
+    assert model.data['body_clean'].tolist() == expected.tolist()
@@ -0,0 +1,68 @@
+import random
+
+import pandas as pd
+
+from ideo_topic_modeler import Model
+from ideo_topic_modeler.dedup import NearDuplicateFilter
+
+
+def _documents(n, seed=0, length=80):
+    rng = random.Random(seed)
+    vocabulary = [f"word{i}" for i in range(2000)]
+    return [" ".join(rng.choices(vocabulary, k=length)) for _ in range(n)]
+
+
+def _edit(text, n_words, seed=0):
+    """Replaces n_words words of a document."""
+    rng = random.Random(seed)
+    tokens = text.split()
+    for i in rng.sample(range(len(tokens)), n_words):
+        tokens[i] = f"edited{i}"
+    return " ".join(tokens)
+
+
+def test_finds_near_duplicates_and_keeps_first_occurrence():
+    originals = _documents(200)
+    texts = pd.Series(originals + [_edit(originals[3], 1), originals[7] + " extra", _edit(originals[11], 1, seed=1)],
+                      index=range(100, 303))
+
+    duplicates = NearDuplicateFilter(threshold=0.8).filter(texts)
+
+    assert duplicates.to_dict() == {300: 103, 301: 107, 302: 111}
+
+
+def test_keeps_distinct_documents():
+    texts = pd.Series(_documents(1000, seed=2))
+    assert NearDuplicateFilter(threshold=0.8).filter(texts).empty
+
+
+def test_finds_near_duplicates_across_calls():
+    originals = _documents(100, seed=3)
+    dedup = NearDuplicateFilter(threshold=0.8)
+
+    assert dedup.filter(pd.Series(originals)).empty
+    duplicates = dedup.filter(pd.Series([_edit(originals[50], 1), "something else entirely"], index=[100, 101]))
+
+    assert duplicates.to_dict() == {100: 50}
+
+
+def test_clean_data_drops_near_duplicates():
+    originals = _documents(50, seed=4)
+    texts = originals + [_edit(originals[0], 1), originals[1]]
+    model = Model(pd.DataFrame({'body': texts}), 'body', data_source=None, near_duplicate_threshold=0.8)
+
+    #the exact duplicate is removed before the near duplicates
+    assert model.data.index.tolist() == list(range(50))
+    assert model.near_duplicates.to_dict() == {50: 0}
+
+
+def test_max_documents_forgets_the_oldest_documents():
+    originals = _documents(100, seed=5)
+    dedup = NearDuplicateFilter(threshold=0.8, max_documents=60)
+
+    assert dedup.filter(pd.Series(originals)).empty
+    assert list(dedup._signatures) == list(range(40, 100))
+    assert sum(len(bucket) for buckets in dedup._buckets for bucket in buckets.values()) == 60 * dedup.bands
+
+    duplicates = dedup.filter(pd.Series([_edit(originals[10], 1), _edit(originals[90], 1)], index=[100, 101]))
+    assert duplicates.to_dict() == {101: 90}
@@ -0,0 +1,174 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ideo_topic_modeler.embeddings import (QuantizedEmbeddings, EmbeddingEngine, EmbeddingCache, save_embeddings, load_embeddings,
+                                           convert_json_embeddings, reduce_precision, append_embeddings, EMBEDDING_PRECISIONS,
+                                           BATCH_SIZES_BY_MODEL, DEFAULT_BATCH_SIZE, LIGHT_MODEL)
+from ideo_topic_modeler.utils import text_hash
+
+from synthetic import make_embeddings
+
+
+@pytest.fixture(scope='module')
+def embeddings():
+    return make_embeddings(2000, dim=48, seed=3)[0]
+
+
+def _cosine(a, b):
+    a = a / np.linalg.norm(a, axis=1, keepdims=True)
+    b = b / np.linalg.norm(b, axis=1, keepdims=True)
+    return a @ b.T
+
+
+def test_quantization_error_is_within_half_a_step(embeddings):
+    quantized = QuantizedEmbeddings.quantize(embeddings, block_rows=300)
+    assert quantized.codes.dtype == np.int8
+    assert np.all(np.abs(np.asarray(quantized) - embeddings) <= quantized.scale / 2 + 1e-6)
+
+
+@pytest.mark.parametrize('precision', ['float16', 'int8'])
+def test_reduced_precision_keeps_cosine_similarities(embeddings, precision):
+    reduced = np.asarray(reduce_precision(embeddings, precision), dtype=np.float32)
+    np.testing.assert_allclose(_cosine(reduced[:200], reduced), _cosine(embeddings[:200], embeddings), atol=1e-2)
+
+
+def test_quantized_indexing_dequantizes_only_the_rows(embeddings):
+    quantized = QuantizedEmbeddings.quantize(embeddings)
+    dequantized = np.asarray(quantized)
+
+    assert isinstance(quantized[10:20], QuantizedEmbeddings)
+    np.testing.assert_array_equal(np.asarray(quantized[10:20]), dequantized[10:20])
+    np.testing.assert_array_equal(np.asarray(quantized[[3, 1, 4]]), dequantized[[3, 1, 4]])
+    np.testing.assert_array_equal(quantized[7], dequantized[7])
+    np.testing.assert_array_equal(quantized[:, 5], dequantized[:, 5])
+
+
+@pytest.mark.parametrize('precision', EMBEDDING_PRECISIONS)
+def test_saved_embeddings_load_unchanged(embeddings, tmp_path, precision):
+    reduced = reduce_precision(embeddings, precision)
+    save_embeddings(reduced, tmp_path, 't', 'some-model')
+    loaded, metadata = load_embeddings(tmp_path, 't')
+
+    assert metadata['precision'] == precision
+    assert metadata['model_name'] == 'some-model'
+    assert metadata['shape'] == list(embeddings.shape)
+    assert type(loaded) is type(reduced) or isinstance(loaded, np.memmap)
+    np.testing.assert_array_equal(np.asarray(loaded), np.asarray(reduced))
+
+
+@pytest.mark.parametrize('precision', EMBEDDING_PRECISIONS)
+def test_saving_over_the_loaded_file(embeddings, tmp_path, precision):
+    save_embeddings(reduce_precision(embeddings, precision), tmp_path, 't', 'm')
+    loaded, _ = load_embeddings(tmp_path, 't')
+    expected = np.asarray(loaded)
+
+    #the loaded embeddings are memory-mapped from the file they are saved to
+    save_embeddings(loaded, tmp_path, 't', 'm')
+    np.testing.assert_array_equal(np.asarray(load_embeddings(tmp_path, 't')[0]), expected)
+
+    save_embeddings(loaded[100:300], tmp_path, 't', 'm')
+    sliced, metadata = load_embeddings(tmp_path, 't')
+    assert metadata['shape'] == [200, embeddings.shape[1]]
+    np.testing.assert_array_equal(np.asarray(sliced), expected[100:300])
+
+
+def test_legacy_json_embeddings_convert_exactly(embeddings, tmp_path):
+    pd.DataFrame(embeddings[:50]).to_json(tmp_path / "embeddings_t.json", orient='records', lines=True)
+    with pytest.warns(UserWarning):
+        legacy, _ = load_embeddings(tmp_path, 't')
+
+    convert_json_embeddings(tmp_path, 't', 'm')
+    loaded, _ = load_embeddings(tmp_path, 't')
+    np.testing.assert_array_equal(np.asarray(loaded), legacy)
+    np.testing.assert_allclose(np.asarray(loaded), embeddings[:50], rtol=1e-6)
+
+
+@pytest.mark.parametrize('precision', EMBEDDING_PRECISIONS)
+@pytest.mark.parametrize('memory_mapped', [False, True])
+def test_appended_embeddings_keep_their_precision(embeddings, tmp_path, precision, memory_mapped):
+    existing = reduce_precision(embeddings[:1500], precision)
+    if memory_mapped:
+        save_embeddings(existing, tmp_path, 't', 'm')
+        existing, _ = load_embeddings(tmp_path, 't')
+
+    appended = append_embeddings(existing, embeddings[1500:], tmp_path, block_rows=400)
+
+    assert type(appended) is type(existing)
+    assert appended.shape == embeddings.shape
+    np.testing.assert_array_equal(np.asarray(appended[:1500]), np.asarray(existing))
+    #the appended rows are converted like the existing ones, or quantized with their scale and offset,
+    #values out of the range of the existing embeddings being clipped to it
+    if precision == 'int8':
+        expected = np.clip(embeddings[1500:], existing.offset, existing.offset + 255 * existing.scale)
+        assert np.all(np.abs(np.asarray(appended[1500:]) - expected) <= existing.scale / 2 + 1e-6)
+    else:
+        np.testing.assert_allclose(np.asarray(appended[1500:]), embeddings[1500:], atol=1e-3)
+
+
+def test_batch_size_depends_on_the_model():
+    assert EmbeddingEngine(LIGHT_MODEL).batch_size == BATCH_SIZES_BY_MODEL[LIGHT_MODEL]
+    assert EmbeddingEngine('some-other-model').batch_size == DEFAULT_BATCH_SIZE
+    assert EmbeddingEngine(LIGHT_MODEL, batch_size=8).batch_size == 8
+
+
+class CountingEncoder:
+    """Stand-in for the embedding model: a few numbers describing each document, and the documents it encoded."""
+
+    def __init__(self):
+        self.encoded = []
+
+    def encode(self, corpus, batch_size=None, show_progress_bar=True):
+        self.encoded.extend(corpus)
+        return np.array([[len(text), text.count(' '), sum(map(ord, text)) % 997, 1.0] for text in corpus], dtype=np.float32)
+
+
+def test_cache_only_encodes_the_misses(tmp_path):
+    encoder = CountingEncoder()
+    cache = EmbeddingCache(tmp_path)
+    corpus = ['a first document', 'a second one', 'a first document', 'the third']
+
+    np.testing.assert_array_equal(cache.encode(encoder, 'model', corpus), CountingEncoder().encode(corpus))
+    #the duplicate is encoded once, but counted as a miss
+    assert encoder.encoded == ['a first document', 'a second one', 'the third']
+    assert (cache.hits, cache.misses, len(cache)) == (0, 4, 3)
+
+    corpus = ['the third', 'something new', 'a second one']
+    np.testing.assert_array_equal(cache.encode(encoder, 'model', corpus), CountingEncoder().encode(corpus))
+    assert encoder.encoded[3:] == ['something new']
+    assert (cache.hits, cache.misses) == (2, 5)
+
+
+def test_cache_is_keyed_by_model_and_content(tmp_path):
+    encoder = CountingEncoder()
+    cache = EmbeddingCache(tmp_path)
+    cache.encode(encoder, 'model', ['some text'])
+    cache.close()
+
+    #the cache persists, and a text is found whatever its position in the corpus
+    cache = EmbeddingCache(tmp_path)
+    cache.encode(encoder, 'model', ['other text', 'some text'])
+    assert encoder.encoded == ['some text', 'other text']
+
+    #another model doesn't reuse the embeddings of the first one
+    cache.encode(encoder, 'other-model', ['some text'])
+    assert encoder.encoded[2:] == ['some text']
+    assert len(cache) == 3
+
+
+def test_cache_evicts_the_least_recently_used(tmp_path):
+    encoder = CountingEncoder()
+    #each embedding takes 16 bytes: 10 fit, and 15 are trimmed to 90% of the bound by evicting 5
+    cache = EmbeddingCache(tmp_path, max_size_bytes=180)
+    old = [f"old document {i}" for i in range(10)]
+    new = [f"new document {i}" for i in range(5)]
+
+    cache.encode(encoder, 'model', old)
+    #used again, so more recent than the other old documents
+    cache.encode(encoder, 'model', old[5:])
+    cache.encode(encoder, 'model', new)
+
+    assert cache.evictions == 5
+    assert cache.size_bytes() == 160
+    kept = cache.get('model', [text_hash(text) for text in old + new])
+    assert set(kept) == {text_hash(text) for text in old[5:] + new}
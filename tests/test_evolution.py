@@ -0,0 +1,70 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ideo_topic_modeler.evolution import topics_over_time
+
+
+sklearn = pytest.importorskip('sklearn')
+from sklearn.feature_extraction.text import CountVectorizer
+
+
+@pytest.fixture(scope='module')
+def documents(reddit_frame):
+    data = reddit_frame.dropna(subset=['body'])
+    rng = np.random.default_rng(4)
+    return pd.DataFrame({'document': (data['title'] + '. ' + data['body']).str.lower().tolist(),
+                         'topic': rng.integers(-1, 6, size=len(data)),
+                         'created_utc': data['created_utc'].tolist()})
+
+
+def naive_topics_over_time(documents, vectorizer, freq, top_n_words, idf=None):
+    """Groups the documents of each window and topic with pandas, and computes the c-TF-IDF of their dense word counts."""
+    documents = documents.assign(date=documents['created_utc'].dt.to_period(freq).dt.start_time)
+    rows = []
+    for (date, topic), group in documents.groupby(['date', 'topic']):
+        rows.append({'date': date, 'topic': topic, 'count': len(group),
+                     'counts': np.asarray(vectorizer.transform(group['document']).sum(axis=0)).ravel()})
+    result = pd.DataFrame(rows)
+    result['frequency'] = result['count'] / result.groupby('date')['count'].transform('sum')
+
+    counts = np.vstack(result.pop('counts').tolist()).astype(np.float64)
+    if idf is None:
+        idf = np.log(1 + counts.sum() / len(counts) / np.maximum(counts.sum(axis=0), 1))
+    weights = counts / np.maximum(counts.sum(axis=1, keepdims=True), 1) * idf
+    words = vectorizer.get_feature_names_out()
+    result['words'] = [[words[j] for j in np.argsort(-row, kind='stable')[:top_n_words] if row[j] > 0] for row in weights]
+    return result
+
+
+@pytest.mark.parametrize('freq', ['D', 'W', 'M'])
+@pytest.mark.parametrize('chunksize', [97, 100_000])
+def test_matches_naive_groupby(documents, freq, chunksize):
+    vectorizer = CountVectorizer().fit(documents['document'])
+
+    result = topics_over_time(documents['document'].tolist(), documents['topic'], documents['created_utc'], vectorizer,
+                              freq=freq, top_n_words=5, chunksize=chunksize)
+    expected = naive_topics_over_time(documents, vectorizer, freq, 5)
+
+    pd.testing.assert_frame_equal(result[['date', 'topic', 'count', 'frequency']],
+                                  expected[['date', 'topic', 'count', 'frequency']], check_dtype=False)
+    assert result['words'].tolist() == expected['words'].tolist()
+
+
+def test_uses_the_given_idf(documents):
+    vectorizer = CountVectorizer().fit(documents['document'])
+    idf = np.random.default_rng(5).random(len(vectorizer.get_feature_names_out()))
+
+    result = topics_over_time(documents['document'].tolist(), documents['topic'], documents['created_utc'], vectorizer,
+                              freq='W', top_n_words=3, idf=idf)
+    assert result['words'].tolist() == naive_topics_over_time(documents, vectorizer, 'W', 3, idf=idf)['words'].tolist()
+
+
+def test_topic_model_caches_topics_over_time(fitted_model):
+    computed = fitted_model.topics_over_time(freq='M')
+    cached = fitted_model.topics_over_time(freq='M')
+
+    assert computed['count'].sum() == len(fitted_model.data)
+    np.testing.assert_allclose(computed.groupby('date')['frequency'].sum(), 1)
+    pd.testing.assert_frame_equal(cached[['topic', 'count', 'topic_name']], computed[['topic', 'count', 'topic_name']])
+    assert cached['words'].map(list).tolist() == computed['words'].map(list).tolist()
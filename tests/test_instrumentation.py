@@ -0,0 +1,57 @@
+import json
+
+import numpy as np
+import pytest
+
+from ideo_topic_modeler import Model
+from ideo_topic_modeler.instrumentation import Instrumentation, PeakMemory
+
+
+def test_stages_are_recorded_with_their_parent(tmp_path):
+    received = []
+    instrumentation = Instrumentation(callback=received.append, metrics_path=tmp_path / 'metrics.json')
+
+    with instrumentation.stage('outer', rows_in=10) as outer:
+        with instrumentation.stage('inner'):
+            pass
+        outer['rows_out'] = 7
+
+    #records are emitted when a stage finishes, so the inner stage comes first
+    assert [(r['stage'], r['parent'], r['rows_in'], r['rows_out']) for r in instrumentation.records] == \
+           [('inner', 'outer', None, None), ('outer', None, 10, 7)]
+    assert received == instrumentation.records
+    assert [json.loads(line) for line in (tmp_path / 'metrics.json').read_text().splitlines()] == instrumentation.records
+    assert all(r['wall_seconds'] >= 0 and r['cpu_seconds'] >= 0 and r['peak_rss_mb'] > 0 for r in instrumentation.records)
+
+
+def test_failed_stages_are_recorded():
+    instrumentation = Instrumentation()
+    with pytest.raises(RuntimeError):
+        with instrumentation.stage('failing'):
+            raise RuntimeError("stage failed")
+
+    assert [r['stage'] for r in instrumentation.records] == ['failing']
+    #the stack is unwound, so later stages have no parent
+    with instrumentation.stage('next'):
+        pass
+    assert instrumentation.records[-1]['parent'] is None
+
+
+def test_peak_memory_sees_temporary_allocations():
+    with PeakMemory(interval=0.001) as memory:
+        block = np.ones(64 * 1024**2 // 8)
+        del block
+
+    #sampled while the block was alive, although it is freed before the end
+    assert memory.added_bytes >= 48 * 1024**2
+
+
+def test_model_stages_count_rows(reddit_frame):
+    instrumentation = Instrumentation()
+    model = Model(reddit_frame, 'body', data_source=None, instrumentation=instrumentation)
+
+    records = {r['stage']: r for r in instrumentation.records}
+    assert records['transform_data']['rows_in'] == len(reddit_frame)
+    assert records['transform_data']['rows_out'] == reddit_frame['body'].notna().sum()
+    assert records['clean_data']['rows_in'] == records['transform_data']['rows_out']
+    assert records['clean_data']['rows_out'] == len(model.data)
@@ -0,0 +1,68 @@
+import re
+
+import pandas as pd
+import pytest
+
+from ideo_topic_modeler import Model
+from ideo_topic_modeler.keywords import sentences_around_keyword, sentences_around_keywords
+
+
+def legacy_sentences_around_keyword(text, keyword):
+    """Model.return_sentences_around_keyword as it was before the keyword engine."""
+    text_list = text.split('.')
+    locations = [n for n, b in enumerate(text_list) if re.search(re.sub(r'\+', '|', keyword).lower(), b.lower())]
+    body_light = []
+    for l in locations:
+        if l > 0:
+            body_light.append(text_list[l-1])
+        body_light.append(text_list[l])
+        if l != len(text_list) - 1:
+            body_light.append(text_list[l+1])
+    body_light_dedoup = []
+    for b in body_light:
+        if b not in body_light_dedoup:
+            body_light_dedoup.append(b)
+    return '.'.join(body_light_dedoup)
+
+
+EDGE_CASES = [
+    ("", "climate"),
+    ("No keyword here. Nothing at all", "climate"),
+    ("Climate first. Then more. And the end", "climate"),
+    ("Start. Middle. The CLIMATE at the end", "climate"),
+    ("A. Climate. B. C. Change. D", "climate+change"),
+    ("Same. Climate. Same. Climate. Same", "climate"),
+    ("wellness goals here. just wellness. just goals", "wellness goals"),
+    ("Climate change.. empty sentences. .", "climate+change"),
+]
+
+
+@pytest.mark.parametrize('text, keyword', EDGE_CASES)
+def test_window_of_one_matches_legacy(text, keyword):
+    assert sentences_around_keyword(text, keyword) == legacy_sentences_around_keyword(text, keyword)
+    assert Model.return_sentences_around_keyword(text, keyword) == legacy_sentences_around_keyword(text, keyword)
+
+
+@pytest.mark.parametrize('n_jobs', [1, 2])
+def test_sentences_around_keywords_match_legacy(reddit_frame, n_jobs):
+    data = reddit_frame.dropna(subset=['body'])
+    shortened = sentences_around_keywords(data['body'], data['keyword'], n_jobs=n_jobs, chunksize=150)
+    expected = [legacy_sentences_around_keyword(text, keyword) for text, keyword in zip(data['body'], data['keyword'])]
+    assert shortened.index.equals(data.index)
+    assert shortened.tolist() == expected
+
+
+def test_wider_window_keeps_more_sentences():
+    text = "s0. s1. s2 climate. s3. s4. s5"
+    assert sentences_around_keyword(text, 'climate', window=0) == " s2 climate"
+    assert sentences_around_keyword(text, 'climate', window=2) == "s0. s1. s2 climate. s3. s4"
+    assert sentences_around_keyword(text, 'climate', window=10) == text
+
+
+def test_transform_data_shortens_reddit_bodies(reddit_frame):
+    model = Model(reddit_frame, 'body', data_source='reddit')
+    expected = reddit_frame.dropna(subset=['body'])
+    expected = pd.Series([legacy_sentences_around_keyword(text, keyword) for text, keyword in zip(expected['body'], expected['keyword'])],
+                         index=expected.index)
+    expected = reddit_frame['title'] + '.' + expected
+    assert model.data['body'].tolist() == expected.loc[model.data.index].tolist()
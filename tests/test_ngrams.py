@@ -0,0 +1,71 @@
+from collections import Counter
+
+import pytest
+
+from ideo_topic_modeler.ngrams import NgramModel
+
+
+STOPWORDS = ['the', 'a', 'and', 'of', 'to', 'in', 'is', 'it', 'that', 'for', 'on', 'with', 'The']
+
+
+def legacy_ngrams_text(series, n, stopwords):
+    """NgramModel.run as it was before the n-gram engine: one string of all the n-grams, built by concatenation."""
+    ngrams_text = ""
+    for val in series.dropna():
+        tokens = str(val).split()
+        if n == 1:
+            tokens_clean = []
+            for i in range(len(tokens)):
+                tokens[i] = tokens[i].lower()
+                if tokens[i] not in stopwords:
+                    tokens_clean.append(tokens[i])
+            ngrams_text += " ".join(tokens_clean)+" "
+        else:
+            ngrams = []
+            for i in range(len(tokens)-n+1):
+                tokens_n = tokens[i:i+n]
+                if any([token_n in stopwords for token_n in tokens_n]) or any([token_n == ' ' for token_n in tokens_n]):
+                    pass
+                else:
+                    ngrams.append("_".join([token.lower() for token in tokens_n]))
+            ngrams_text += " ".join(ngrams)+" "
+    return ngrams_text
+
+
+@pytest.fixture(scope='module')
+def model(reddit_frame):
+    return NgramModel(reddit_frame, 'body', n=[1, 2, 3], use_nltk_stopwords=False, custom_stopwords=STOPWORDS,
+                      data_source='reddit')
+
+
+@pytest.mark.parametrize('n', [1, 2, 3])
+def test_counts_match_legacy_text(model, n):
+    counts = model.run(n_jobs=1)[n]
+    assert counts == Counter(legacy_ngrams_text(model.data['body'], n, STOPWORDS).split())
+
+
+@pytest.mark.parametrize('n', [1, 2, 3])
+def test_ngrams_text_matches_legacy_text(model, n):
+    assert model.ngrams_text(n) == legacy_ngrams_text(model.data['body'], n, STOPWORDS)
+
+
+def test_single_n_returns_its_counter(reddit_frame, model):
+    single = NgramModel(reddit_frame, 'body', n=2, use_nltk_stopwords=False, custom_stopwords=STOPWORDS, data_source='reddit')
+    assert single.run(n_jobs=1) == model.run(n_jobs=1)[2]
+
+
+def test_document_frequencies_sum_to_counts(model):
+    total = Counter()
+    for frequencies in model.document_frequencies(2):
+        total.update(frequencies)
+    assert total == model.run(n_jobs=1)[2]
+
+
+@pytest.mark.parametrize('chunksize', [7, 97, 10_000])
+def test_parallel_counts_match_serial_counts(model, chunksize):
+    serial = model.run(n_jobs=1)
+    parallel = model.run(n_jobs=2, chunksize=chunksize)
+    for n in [1, 2, 3]:
+        assert parallel[n] == serial[n]
+        #the partial counts are merged in order, so ties are ranked the same way
+        assert parallel[n].most_common(50) == serial[n].most_common(50)
@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ideo_topic_modeler import Model
+from ideo_topic_modeler.pipeline import ChunkReader, ChunkWriter, clean_chunks
+from ideo_topic_modeler.embeddings import EmbeddingEngine
+
+
+pytest.importorskip('bertopic')
+from ideo_topic_modeler.topics import TopicModel
+
+
+def fake_encode(self, corpus, batch_size=None, show_progress_bar=True):
+    """Deterministic stand-in for the sentence-transformers model: a few numbers describing each document."""
+    return np.array([[len(text), sum(map(ord, text)) % 997] + [text.count(letter) for letter in ' aeiourst'] for text in corpus],
+                    dtype=np.float32)
+
+
+@pytest.fixture(scope='module')
+def raw_path(reddit_frame, tmp_path_factory):
+    path = tmp_path_factory.mktemp('raw') / 'raw.json'
+    reddit_frame.to_json(path, orient='records', lines=True, date_format='iso')
+    return path
+
+
+def test_chunk_reader_and_writer_round_trip(raw_path, tmp_path):
+    expected = pd.read_json(raw_path, lines=True, dtype=False)
+    with ChunkWriter(tmp_path / 'copy.json') as writer:
+        for chunk in ChunkReader(raw_path, 300):
+            writer.write(chunk)
+
+    pd.testing.assert_frame_equal(pd.read_json(tmp_path / 'copy.json', lines=True, dtype=False), expected)
+
+
+def test_clean_chunks_keep_their_order(raw_path):
+    chunks = list(ChunkReader(raw_path, 250))
+    cleaned = list(clean_chunks(chunks, 'body', 'reddit', n_workers=2, queue_size=1))
+    assert [chunk.index.tolist() for chunk in cleaned] == [chunk.dropna(subset=['body']).index.tolist() for chunk in cleaned]
+    assert [chunk.index.min() for chunk in cleaned] == sorted(chunk.index.min() for chunk in cleaned)
+
+
+@pytest.mark.parametrize('near_duplicate_threshold', [None, 0.8])
+def test_pipelined_matches_sequential(raw_path, tmp_path, monkeypatch, near_duplicate_threshold):
+    monkeypatch.setattr(EmbeddingEngine, 'encode', fake_encode)
+
+    sequential = TopicModel.from_jsonl(raw_path, 'body', 'reddit', tmp_path / 'sequential.json', chunksize=300,
+                                       model_directory=tmp_path / 'sequential', near_duplicate_threshold=near_duplicate_threshold)
+    sequential.run()
+    pipelined = TopicModel.from_jsonl_pipelined(raw_path, 'body', 'reddit', tmp_path / 'pipelined.json', tmp_path / 'pipelined',
+                                                chunksize=300, clean_workers=2, queue_size=1,
+                                                near_duplicate_threshold=near_duplicate_threshold)
+
+    assert (tmp_path / 'pipelined.json').read_text() == (tmp_path / 'sequential.json').read_text()
+    np.testing.assert_array_equal(pipelined.embeddings, sequential.embeddings)
+    pd.testing.assert_series_equal(pipelined.near_duplicates, sequential.near_duplicates, check_dtype=False)
+
+
+def test_pipelined_raises_cleaning_errors(raw_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(EmbeddingEngine, 'encode', fake_encode)
+    with pytest.raises(ValueError, match='not a column'):
+        TopicModel.from_jsonl_pipelined(raw_path, 'missing', 'reddit', tmp_path / 'pipelined.json', tmp_path / 'pipelined',
+                                        chunksize=300)
+
+
+@pytest.fixture(scope='module')
+def streamed_model(raw_path, tmp_path_factory):
+    """A TopicModel streamed from raw_path with fake embeddings, fitted with the minibatch clustering and saved
+    with the timestamp 'test'."""
+    directory = tmp_path_factory.mktemp('streamed')
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(EmbeddingEngine, 'encode', fake_encode)
+        model = TopicModel.from_jsonl(raw_path, 'body', 'reddit', directory / 'cleaned.json', chunksize=300,
+                                      model_directory=directory / 'model')
+        model.run(clustering='minibatch', n_clusters=4)
+    return model
+
+
+def test_streamed_bundle_needs_enriched_data(streamed_model):
+    with pytest.raises(ValueError, match='enrich_data_and_save_them'):
+        streamed_model.save_bundle('test')
+
+
+def test_streamed_bundle_copies_the_enriched_data(streamed_model):
+    from ideo_topic_modeler.bundle import ModelBundle
+
+    streamed_model.enrich_data_and_save_them('test')
+    bundle = ModelBundle(streamed_model.save_bundle('test'))
+    bundle.verify()
+
+    expected = streamed_model.storage.read(streamed_model.data_filename)
+    assert bundle.row_count == len(expected) == len(streamed_model.embeddings)
+    pd.testing.assert_frame_equal(bundle.data(), expected)
+
+
+def test_streamed_search_keeps_the_order_of_the_results(streamed_model):
+    query = np.asarray(streamed_model.embeddings[123]) + 0.5
+    found = streamed_model.search(query, k=20)
+    indices, scores = streamed_model.search_index.query(query, k=20)
+
+    expected = streamed_model.storage.read(streamed_model.data_filename).iloc[indices[0]]
+    pd.testing.assert_frame_equal(found.drop(columns='score').reset_index(drop=True), expected.reset_index(drop=True))
+    np.testing.assert_array_equal(found['score'], scores[0])
+
+    #before the enriched data are written, the rows come from the cleaned data
+    streamed_model.data_filename, data_filename = None, streamed_model.data_filename
+    try:
+        found = streamed_model.search(query, k=20)
+    finally:
+        streamed_model.data_filename = data_filename
+    assert found['body_clean'].tolist() == expected['body_clean'].tolist()
+
+
+def test_streamed_clusters_need_the_data_in_memory(streamed_model):
+    with pytest.raises(ValueError, match='load_saved_model_and_data'):
+        streamed_model._compute_clusters(use_reduced_embeddings=True)
+
+
+def test_update_after_loading_a_streamed_model(raw_path, reddit_frame, tmp_path, monkeypatch):
+    monkeypatch.setattr(EmbeddingEngine, 'encode', fake_encode)
+    model = TopicModel.from_jsonl(raw_path, 'body', 'reddit', tmp_path / 'cleaned.json', chunksize=300,
+                                  model_directory=tmp_path / 'model')
+    model.run(clustering='minibatch', n_clusters=4)
+    model.enrich_data_and_save_them('test')
+    model.save_model('test')
+
+    new_data = reddit_frame.dropna(subset=['body']).head(50).copy()
+    new_data['body'] = new_data['body'] + ' and a few brand new words'
+    report = model.update(new_data, model_timestamp='test', refit=True)
+
+    assert model.corpus_path is None
+    assert report['refit'] and report['new_documents'] > 0
+    assert len(model.data) == len(model.embeddings) == len(model.storage.read(model.data_filename)) + report['new_documents']
+    assert not model.data['incremental'].any()
+
+
+def test_iter_data_prefers_the_data_in_memory(raw_path, tmp_path):
+    model = Model.from_jsonl(raw_path, 'body', 'reddit', tmp_path / 'cleaned.json', chunksize=300)
+    streamed = pd.concat(model.iter_data(100))
+    assert len(streamed) == sum(1 for _ in open(tmp_path / 'cleaned.json'))
+
+    model.data = streamed.head(10)
+    pd.testing.assert_frame_equal(pd.concat(model.iter_data(3)), streamed.head(10))
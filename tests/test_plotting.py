@@ -0,0 +1,53 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ideo_topic_modeler.plotting import binned_counts, stratified_sample
+
+
+def test_binned_counts_match_numpy():
+    values = np.random.default_rng(0).uniform(-1, 1, 10_000)
+    bins = binned_counts(values, bins=20, value_range=(-1, 1))
+
+    counts, edges = np.histogram(values, bins=20, range=(-1, 1))
+    np.testing.assert_array_equal(bins['count'], counts)
+    np.testing.assert_array_equal(bins['bin_start'], edges[:-1])
+    np.testing.assert_array_equal(bins['bin_end'], edges[1:])
+
+
+def test_sentiment_distribution_of_many_documents():
+    pytest.importorskip('altair')
+    from ideo_topic_modeler.sentiment import SentimentModel, SCORE_COLUMNS
+
+    model = SentimentModel(pd.DataFrame(), 'body')
+    scores = np.random.default_rng(1).uniform(-1, 1, (20_000, len(SCORE_COLUMNS)))
+    model.scores = pd.DataFrame(scores, columns=SCORE_COLUMNS)
+
+    #above altair's 5000 rows limit if the documents were sent one by one
+    chart = model.plot().to_dict()
+    assert sum(row['count'] for row in next(iter(chart['datasets'].values()))) == 20_000
+
+
+@pytest.mark.parametrize('n_small', [0, 30, 200])
+def test_stratified_sample_stays_within_the_budget(n_small):
+    #a few large topics and n_small topics of 3 documents
+    topics = np.concatenate([np.repeat([0, 1, 2], [6000, 3000, 1000]), np.repeat(np.arange(3, 3 + n_small), 3)])
+    data = pd.DataFrame({'topic': topics, 'value': np.arange(len(topics))})
+
+    sample = stratified_sample(data, max_points=100)
+    counts = sample['topic'].value_counts()
+
+    assert len(sample) <= 100
+    assert sample['value'].is_monotonic_increasing and sample.index.isin(data.index).all()
+    if n_small + 3 <= 100:
+        #every topic is visible, and the large ones keep their proportions
+        assert set(counts.index) == set(data['topic'])
+        assert counts[0] >= counts[1] >= counts[2] > 1
+    else:
+        #only the largest topics get a point
+        assert counts.to_dict() == {topic: 1 for topic in data['topic'].value_counts().index[:100]}
+
+
+def test_stratified_sample_keeps_small_data():
+    data = pd.DataFrame({'topic': [0, 1, 1], 'value': [1, 2, 3]})
+    pd.testing.assert_frame_equal(stratified_sample(data, max_points=3), data)
@@ -0,0 +1,79 @@
+import numpy as np
+import pytest
+
+import ideo_topic_modeler.search as search
+from ideo_topic_modeler.search import EmbeddingIndex
+from ideo_topic_modeler.topics import TopicModel
+
+from synthetic import make_embeddings
+
+
+METHODS = ['exact', pytest.param('hnsw', marks=pytest.mark.skipif(not search._use_hnswlib, reason="needs hnswlib"))]
+
+
+@pytest.fixture(scope='module')
+def embeddings():
+    return make_embeddings(3000, dim=32, n_topics=10, spread=1.0, seed=2)[0]
+
+
+def brute_force(embeddings, queries, k):
+    """The k most similar embeddings of each query by cosine similarity, over all the embeddings at once."""
+    normalized = embeddings / np.linalg.norm(embeddings, axis=1, keepdims=True)
+    scores = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ normalized.T
+    indices = np.argsort(-scores, axis=1, kind='stable')[:, :k]
+    return indices, np.take_along_axis(scores, indices, axis=1)
+
+
+def test_exact_search_matches_brute_force_across_blocks(embeddings, monkeypatch):
+    #small blocks, so the best neighbors are merged across many blocks
+    monkeypatch.setattr(search, '_BLOCK_ROWS', 128)
+    queries = embeddings[:20] + 0.01
+
+    indices, scores = EmbeddingIndex('exact').build(embeddings).query(queries, k=15)
+    expected_indices, expected_scores = brute_force(embeddings, queries, 15)
+
+    np.testing.assert_array_equal(indices, expected_indices)
+    np.testing.assert_allclose(scores, expected_scores, rtol=1e-5, atol=1e-6)
+
+
+@pytest.mark.skipif(not search._use_hnswlib, reason="needs hnswlib")
+def test_hnsw_recall(embeddings):
+    queries = embeddings[:100]
+    indices, _ = EmbeddingIndex('hnsw').build(embeddings).query(queries, k=10)
+    expected_indices, _ = brute_force(embeddings, queries, 10)
+
+    recall = np.mean([len(set(found) & set(expected)) / 10 for found, expected in zip(indices, expected_indices)])
+    assert recall >= 0.95
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_saved_index_gives_the_same_results(embeddings, tmp_path, method):
+    index = EmbeddingIndex(method).build(embeddings)
+    index.save(tmp_path / 'index')
+    loaded = EmbeddingIndex.load(tmp_path / 'index', embeddings)
+
+    for expected, found in zip(index.query(embeddings[:20], k=10), loaded.query(embeddings[:20], k=10)):
+        np.testing.assert_array_equal(found, expected)
+
+
+def test_loaded_index_must_match_embeddings(embeddings, tmp_path):
+    EmbeddingIndex('exact').build(embeddings).save(tmp_path / 'index')
+    with pytest.raises(ValueError):
+        EmbeddingIndex.load(tmp_path / 'index', embeddings[:10])
+
+
+@pytest.mark.parametrize('method', METHODS)
+def test_search_is_the_same_after_reload(fitted_model, reddit_frame, method):
+    fitted_model.build_index(method)
+    fitted_model.save_model('test')
+    query = np.asarray(fitted_model.embeddings[5])
+    expected = fitted_model.search(query, k=10)
+
+    reloaded = TopicModel(reddit_frame, 'body', 'reddit', fitted_model.model_directory)
+    reloaded.load_saved_model_and_data('test')
+    assert reloaded.search_index.method == method
+    found = reloaded.search(query, k=10)
+
+    #saved data files don't keep the index of the data, so the rows are compared by content
+    assert found['body_clean'].tolist() == expected['body_clean'].tolist()
+    np.testing.assert_allclose(found['score'], expected['score'], rtol=1e-6)
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+import ideo_topic_modeler.sentiment as sentiment
+from ideo_topic_modeler.sentiment import SentimentModel, SCORE_COLUMNS
+
+
+pytest.importorskip('vaderSentiment')
+
+
+def test_run_scores_every_document(reddit_frame):
+    model = SentimentModel(reddit_frame, 'body', data_source='reddit')
+    scores = model.run(chunksize=300)
+
+    assert scores.columns.tolist() == SCORE_COLUMNS
+    assert scores.index.equals(model.data.index)
+    assert scores['sentiment'].between(-1, 1).all()
+
+
+def test_run_shuts_the_scorer_pool_down(reddit_frame, monkeypatch):
+    shutdowns = []
+
+    class StubPool:
+        """Stands in for the process pool, without loading any transformers model."""
+        def __init__(self, **kwargs):
+            pass
+
+        def map(self, function, chunks, *args):
+            return [np.zeros((len(chunk), len(SCORE_COLUMNS)), dtype=np.float32) for chunk in chunks]
+
+        def shutdown(self):
+            shutdowns.append(True)
+
+    monkeypatch.setattr(sentiment, 'ProcessPoolExecutor', StubPool)
+    model = SentimentModel(reddit_frame.head(50), 'body', data_source='reddit', scorer='transformer', n_jobs=2)
+    model.run()
+
+    assert shutdowns == [True]
+    assert model.scorer._executor is None
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from ideo_topic_modeler.storage import STORAGES, filter_mask
+
+
+pytest.importorskip('pyarrow')
+
+
+@pytest.fixture
+def data(reddit_frame):
+    return reddit_frame.dropna(subset=['body']).reset_index(drop=True).assign(topic=lambda d: d.index % 7 - 1)
+
+
+@pytest.mark.parametrize('storage', STORAGES.values(), ids=STORAGES.keys())
+def test_chunked_write_reads_like_a_single_write(data, tmp_path, storage):
+    storage.write(data, tmp_path / f"single.{storage.extension}")
+    with storage.writer(tmp_path / f"chunked.{storage.extension}") as writer:
+        for start in range(0, len(data), 300):
+            writer.write(data.iloc[start:start + 300])
+
+    pd.testing.assert_frame_equal(storage.read(tmp_path / f"chunked.{storage.extension}"),
+                                  storage.read(tmp_path / f"single.{storage.extension}"))
+
+
+@pytest.mark.parametrize('storage', STORAGES.values(), ids=STORAGES.keys())
+def test_filters_and_columns(data, tmp_path, storage):
+    path = tmp_path / f"data.{storage.extension}"
+    storage.write(data, path)
+    filters = [('topic', 'in', [0, 3]), ('subreddit', '!=', 'climate')]
+
+    found = storage.read(path, columns=['topic', 'body'], filters=filters)
+
+    expected = data.loc[filter_mask(data, filters), ['topic', 'body']]
+    assert found['body'].tolist() == expected['body'].tolist()
+    assert found['topic'].tolist() == expected['topic'].tolist()
+
+
+def test_parquet_chunks_with_changing_types(tmp_path):
+    chunks = [pd.DataFrame({'count': [1, 2], 'missing': [None, None], 'text': ['a', 'b'], 'score': [0.5, 1.0]}),
+              pd.DataFrame({'count': [3.0, np.nan], 'missing': ['x', None], 'text': ['c', None], 'score': [1, 2]}),
+              pd.DataFrame({'count': [4, 5], 'missing': [None, None], 'text': [None, None], 'score': [3, np.nan]})]
+
+    storage = STORAGES['parquet']
+    with storage.writer(tmp_path / "data.parquet") as writer:
+        for chunk in chunks:
+            writer.write(chunk)
+    data = storage.read(tmp_path / "data.parquet")
+
+    np.testing.assert_array_equal(data['count'], [1, 2, 3, np.nan, 4, 5])
+    assert data['missing'].tolist() == [None, None, 'x', None, None, None]
+    assert data['text'].tolist() == ['a', 'b', 'c', None, None, None]
+    np.testing.assert_array_equal(data['score'], [0.5, 1, 1, 2, 3, np.nan])
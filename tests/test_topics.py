@@ -0,0 +1,125 @@
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+
+pytest.importorskip('bertopic')
+import ideo_topic_modeler.topics as topics
+from ideo_topic_modeler.topics import TopicModel
+
+
+@pytest.fixture
+def saved_model(fitted_model, reddit_frame, tmp_path):
+    """A copy of the saved files of fitted_model, and a TopicModel to load them into, so tests can change both."""
+    shutil.copytree(fitted_model.model_directory, tmp_path, dirs_exist_ok=True)
+    return TopicModel(reddit_frame.head(50), 'body', 'reddit', tmp_path)
+
+
+def _new_data(reddit_frame, n_known, n_new):
+    """Raw rows of documents already in the model, followed by rows of new documents."""
+    rows = reddit_frame.dropna(subset=['body'])
+    new = rows.iloc[n_known:n_known + n_new].copy()
+    #reddit bodies are shortened to the sentences around their keyword, the title is kept whole
+    new['title'] = [f"a new thing number {i} {title}" for i, title in enumerate(new['title'])]
+    return pd.concat([rows.iloc[:n_known], new], ignore_index=True)
+
+
+def test_update_assigns_new_documents_and_reports_drift(saved_model, reddit_frame):
+    saved_model.load_saved_model_and_data('test')
+    fitted = saved_model.data.copy()
+    #the new documents get the embeddings of the first fitted documents, so they belong to the same topics
+    saved_model._embed = lambda corpora: np.asarray(saved_model.embeddings[:sum(map(len, corpora))])
+
+    report = saved_model.update(_new_data(reddit_frame, 10, 40), refit=False)
+
+    assert report['new_documents'] == 40
+    assert report['fitted_outlier_rate'] == (fitted['topic'] == -1).mean()
+    assert report['incremental_outlier_rate'] == 0.0
+    assert report['incremental_share'] == pytest.approx(40 / (len(fitted) + 40))
+    assert not report['refit_recommended'] and not report['refit']
+
+    new = saved_model.data.iloc[len(fitted):]
+    assert new['incremental'].all() and not saved_model.data['incremental'].iloc[:len(fitted)].any()
+    np.testing.assert_array_equal(new['topic'], fitted['topic'].iloc[:40])
+    assert new['topic_name'].tolist() == fitted['topic_name'].iloc[:40].tolist()
+    assert new['probability'].between(0, 1).all()
+    assert len(saved_model.embeddings) == len(saved_model.data)
+
+
+def test_update_refits_when_too_many_documents_were_never_fitted(saved_model, reddit_frame):
+    saved_model.load_saved_model_and_data('test')
+    saved_model._embed = lambda corpora: np.asarray(saved_model.embeddings[:sum(map(len, corpora))])
+
+    report = saved_model.update(_new_data(reddit_frame, 0, 40), max_incremental_share=0.01)
+
+    assert report['refit_recommended'] and report['refit']
+    assert not saved_model.data['incremental'].any()
+    assert saved_model.data['topic'].nunique() == saved_model.n_clusters
+    assert saved_model.topic_info['Count'].sum() == len(saved_model.data) == len(saved_model.embeddings)
+
+
+def _words(topic_words):
+    """The (word, score) pairs of a topic, as lists like after a json round trip."""
+    return [[word, pytest.approx(score)] for word, score in topic_words]
+
+
+def test_topic_info_has_one_row_per_topic(saved_model):
+    saved_model.load_saved_model_and_data('test')
+    expected = saved_model.topic_model.get_topic_info()
+
+    topic_info = saved_model.topic_info
+    assert topic_info[['Topic', 'Count', 'Name']].to_dict('list') == expected[['Topic', 'Count', 'Name']].to_dict('list')
+    assert topic_info['Count'].sum() == len(saved_model.data)
+    for topic, words in zip(topic_info['Topic'], topic_info['tf_idf_words']):
+        assert words == _words(saved_model.topic_model.get_topic(topic))
+    assert 'tf_idf_words' not in saved_model.data.columns
+
+
+def test_legacy_data_with_words_in_every_row(saved_model):
+    directory = saved_model.model_directory
+    data = pd.read_parquet(directory / 'data_test.parquet')
+    saved_model.load_saved_model_and_data('test')
+    topic_model = saved_model.topic_model
+
+    #older models had no topics file, and the tf_idf words of its topic in every row of a json data file
+    (directory / 'topics_test.json').unlink()
+    (directory / 'data_test.parquet').unlink()
+    data.assign(tf_idf_words=data['topic'].map(topic_model.get_topic)).to_json(directory / 'data_test.json',
+                                                                                 orient='records', lines=True)
+
+    saved_model.load_saved_model_and_data('test')
+    assert saved_model.data.columns.tolist() == data.columns.tolist()
+    assert saved_model.topic_info['Topic'].tolist() == topic_model.get_topic_info()['Topic'].tolist()
+    for topic, words in zip(saved_model.topic_info['Topic'], saved_model.topic_info['tf_idf_words']):
+        assert _words(words) == _words(topic_model.get_topic(topic))
+
+
+def test_update_removes_near_duplicates_like_the_fit(fitted_model, reddit_frame, tmp_path):
+    shutil.copytree(fitted_model.model_directory, tmp_path, dirs_exist_ok=True)
+    model = TopicModel(reddit_frame.head(50), 'body', 'reddit', tmp_path, near_duplicate_threshold=0.8)
+    model.load_saved_model_and_data('test')
+    model._embed = lambda corpora: np.asarray(model.embeddings[:sum(map(len, corpora))])
+
+    new_data = _new_data(reddit_frame, 0, 2)
+    #a repost of the first new document, with one more word
+    new_data = pd.concat([new_data, new_data.iloc[[0]].assign(title=new_data['title'].iloc[0] + ' again')], ignore_index=True)
+
+    assert model.update(new_data, refit=False)['new_documents'] == 2
+
+
+def test_projection_hashes_the_embeddings_once(saved_model, monkeypatch):
+    saved_model.load_saved_model_and_data('test')
+    hashed = []
+    monkeypatch.setattr(topics, 'embeddings_hash', lambda embeddings: hashed.append(len(embeddings)) or 'ab' * 20)
+
+    saved_model._compute_clusters(use_reduced_embeddings=True)
+    saved_model._compute_clusters(use_reduced_embeddings=True)
+    assert len(hashed) == 1
+
+    #new embeddings are hashed again
+    saved_model.embeddings = np.array(saved_model.embeddings)
+    saved_model._compute_clusters(use_reduced_embeddings=True)
+    assert len(hashed) == 2
+    assert saved_model.data[['dim0', 'dim1']].notna().all().all()